@@ -0,0 +1,212 @@
+"""Measure the throughput of each processor on synthetic pages.
+
+Renders pages with ``synthetic.py`` (text in columns, tables, skew, noise
+at the given DPIs) into a fresh workspace, then runs the processors one
+after the other (each on the output of the previous step, as in a
+typical workflow) via their CLI, each in its own process. For each
+processor, record the wall-clock time, pages/s, lines/s (counting the
+text lines rendered on the input pages), peak RSS of the process, and
+the time spent in each stage (via the ``metrics`` parameter).
+
+Results are written as JSON (along with the versions of ocrd_tesserocr
+and Tesseract), so they can be compared across versions::
+
+    python benchmarks/bench_processors.py --output new.json --compare old.json
+
+Usage::
+
+    python benchmarks/bench_processors.py [--pages N] [--dpi DPI ...] [--output FILE]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from itertools import cycle
+
+from tesserocr import tesseract_version
+from ocrd import Resolver
+
+from ocrd_tesserocr.config import OCRD_TOOL
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import synthetic_page # pylint: disable=wrong-import-position
+
+# (processor, input fileGrp, output fileGrp, parameters) in workflow order:
+STEPS = [
+    ('crop', 'OCR-D-IMG', 'OCR-D-CROP', {}),
+    ('deskew', 'OCR-D-CROP', 'OCR-D-DESKEW', {'operation_level': 'page'}),
+    ('segment-region', 'OCR-D-DESKEW', 'OCR-D-SEG-BLOCK', {}),
+    ('binarize', 'OCR-D-SEG-BLOCK', 'OCR-D-BIN', {'operation_level': 'region'}),
+    ('segment-table', 'OCR-D-SEG-BLOCK', 'OCR-D-SEG-TABLE', {}),
+    ('segment-line', 'OCR-D-SEG-TABLE', 'OCR-D-SEG-LINE', {}),
+    ('segment-word', 'OCR-D-SEG-LINE', 'OCR-D-SEG-WORD', {}),
+    ('recognize', 'OCR-D-SEG-LINE', 'OCR-D-OCR-LINE', {'textequiv_level': 'word'}),
+    ('recognize', 'OCR-D-DESKEW', 'OCR-D-OCR-PAGE', {'segmentation_level': 'region',
+                                                     'textequiv_level': 'word'}),
+]
+
+# page variants to cycle through: (columns, table, skew, noise)
+VARIANTS = [(1, False, 0.0, 0.0), (2, True, 1.5, 0.001), (1, True, -0.8, 0.0), (3, False, 0.5, 0.003)]
+
+def make_workspace(directory, pages, dpis, size):
+    """Render ``pages`` pages (cycling through the variants and DPIs) into a new workspace.
+
+    Return the workspace and the number of text lines on each page.
+    """
+    workspace = Resolver().workspace_from_nothing(directory)
+    lines = []
+    variants = cycle(VARIANTS)
+    dpis = cycle(dpis)
+    for n in range(1, pages + 1):
+        (columns, table, skew, noise), dpi = next(variants), next(dpis)
+        image, page_lines = synthetic_page(size, dpi, columns, table, skew, noise, seed=n)
+        file_id = 'OCR-D-IMG_%04d' % n
+        local_filename = os.path.join('OCR-D-IMG', file_id + '.png')
+        os.makedirs(os.path.join(directory, 'OCR-D-IMG'), exist_ok=True)
+        image.save(os.path.join(directory, local_filename), dpi=(dpi, dpi))
+        workspace.add_file('OCR-D-IMG', ID=file_id, pageId='PHYS_%04d' % n,
+                           mimetype='image/png', local_filename=local_filename)
+        lines.append(page_lines)
+    workspace.save_mets()
+    return workspace, lines
+
+def run_step(directory, processor, input_file_grp, output_file_grp, parameter):
+    """Run ``processor`` via its CLI, and return its wall-clock time, peak RSS and metrics records."""
+    metrics = os.path.join(directory, output_file_grp + '.metrics.json')
+    parameter = dict(parameter, metrics=metrics)
+    start = time.perf_counter()
+    proc = subprocess.Popen(['ocrd-tesserocr-' + processor, '-m', 'mets.xml',
+                             '-I', input_file_grp, '-O', output_file_grp,
+                             '-p', json.dumps(parameter)],
+                            cwd=directory)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = status # (already reaped)
+    if not os.WIFEXITED(status) or os.WEXITSTATUS(status):
+        raise Exception("%s failed with status %d" % (processor, status))
+    with open(metrics, 'r') as f:
+        records = [json.loads(line) for line in f]
+    # (kB on Linux)
+    return seconds, rusage.ru_maxrss * 1024, records
+
+def selected_steps(output_file_grps=None):
+    """Get the output fileGrps of the steps to measure, and of all steps to run for them."""
+    if not output_file_grps:
+        output_file_grps = [step[2] for step in STEPS]
+    inputs = dict((step[2], step[1]) for step in STEPS)
+    needed = set()
+    for output_file_grp in output_file_grps:
+        if output_file_grp not in inputs:
+            raise Exception("no step with output fileGrp '%s'" % output_file_grp)
+        while output_file_grp in inputs:
+            needed.add(output_file_grp)
+            output_file_grp = inputs[output_file_grp]
+    return set(output_file_grps), needed
+
+def summarize(records):
+    """Sum up the stage times and segment counts of all page records."""
+    stages = dict()
+    counts = dict()
+    for record in records:
+        for name, stage in record['stages'].items():
+            total = stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key in total:
+                total[key] += stage[key]
+        for name, count in record['counts'].items():
+            counts[name] = counts.get(name, 0) + count
+    return stages, counts
+
+def compare(results, baseline):
+    """Print the change in pages/s and peak RSS for each step also in ``baseline``."""
+    old = dict((result['step'], result) for result in baseline['results'])
+    print("\ncompared to %s (Tesseract %s):" % (baseline['version'], baseline['tesseract']))
+    print("%-32s %10s %10s" % ('step', 'pages/s', 'peak RSS'))
+    for result in results:
+        if result['step'] not in old:
+            continue
+        before = old[result['step']]
+        print("%-32s %+9.1f%% %+9.1f%%" % (
+            result['step'],
+            100 * (result['pages_per_second'] / before['pages_per_second'] - 1),
+            100 * (result['peak_rss'] / before['peak_rss'] - 1)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--pages', type=int, default=4, help='number of pages to generate')
+    parser.add_argument('--dpi', type=int, nargs='+', default=[300],
+                        help='resolution(s) to render the pages at (cycled through)')
+    parser.add_argument('--size', default='a4', help='paper size of the pages')
+    parser.add_argument('--model', help='model for recognize (default: last installed)')
+    parser.add_argument('--parameter', default='{}',
+                        help='JSON object of parameters to add to every step (e.g. {"jobs": 2})')
+    parser.add_argument('--steps', help='comma-separated output fileGrps of the steps to measure '
+                        '(default: all; the steps they depend on get run, too)')
+    parser.add_argument('--workspace', help='directory to generate the workspace in '
+                        '(default: temporary, removed afterwards)')
+    parser.add_argument('--output', default='bench_processors.json', help='JSON file to write results to')
+    parser.add_argument('--compare', help='JSON file with results of an earlier run to compare to')
+    args = parser.parse_args()
+    common = json.loads(args.parameter)
+    directory = args.workspace or tempfile.mkdtemp(prefix='ocrd-tesserocr-bench-')
+    try:
+        _, lines = make_workspace(directory, args.pages, args.dpi, args.size)
+        results = []
+        print("%-32s %8s %10s %10s %10s" % ('step', 'seconds', 'pages/s', 'lines/s', 'peak RSS'))
+        measure, needed = selected_steps(args.steps.split(',') if args.steps else None)
+        for processor, input_file_grp, output_file_grp, parameter in STEPS:
+            if output_file_grp not in needed:
+                continue
+            parameter = dict(parameter, **common)
+            if processor == 'recognize' and args.model:
+                parameter['model'] = args.model
+            seconds, peak_rss, records = run_step(
+                directory, processor, input_file_grp, output_file_grp, parameter)
+            if output_file_grp not in measure:
+                continue
+            stages, counts = summarize(records)
+            result = {
+                'step': '%s (%s)' % (processor, output_file_grp),
+                'processor': processor,
+                'parameter': parameter,
+                'pages': len(records),
+                'lines': sum(lines),
+                'seconds': seconds,
+                'pages_per_second': len(records) / seconds,
+                'lines_per_second': sum(lines) / seconds,
+                'peak_rss': peak_rss,
+                'stages': stages,
+                'counts': counts,
+            }
+            results.append(result)
+            print("%-32s %8.2f %10.3f %10.1f %8.0fMB" % (
+                result['step'], seconds, result['pages_per_second'],
+                result['lines_per_second'], peak_rss / 2**20))
+    finally:
+        if not args.workspace:
+            shutil.rmtree(directory)
+    report = {
+        'version': OCRD_TOOL['version'],
+        'tesseract': tesseract_version().split('\n')[0],
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'pages': args.pages,
+        'dpi': args.dpi,
+        'size': args.size,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("results written to %s" % args.output)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare the cost of passing images to Tesseract via SetImage and set_image.
+
+``tessapi.SetImage`` encodes the PIL.Image to an in-memory file which
+Leptonica decodes again, whereas ``ocrd_tesserocr.image.set_image`` passes
+the raw pixel buffer. This measures the time per call (without any layout
+analysis or recognition) for line-sized and page-sized images in the
+usual modes (RGB, grayscale and binarized).
+
+Usage::
+
+    python benchmarks/bench_set_image.py [--repeat N]
+"""
+import argparse
+import timeit
+
+from PIL import Image, ImageDraw
+from tesserocr import PyTessBaseAPI
+
+from ocrd_tesserocr.config import TESSDATA_PREFIX
+from ocrd_tesserocr.image import set_image
+
+SIZES = [('line', (2000, 80)), ('page', (2500, 3500))]
+MODES = ['RGB', 'L', '1']
+
+def synthetic_image(size, mode):
+    """Draw some text-like noise (dark bars on light ground)."""
+    image = Image.new('L', size, 230)
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for y in range(10, height - 40, 60):
+        for x in range(20, width - 40, 37):
+            draw.rectangle([x, y, x + 25 + (x * y) % 9, y + 30], fill=30)
+    image.info['dpi'] = (300, 300)
+    return image.convert(mode)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of calls to average over for each image')
+    args = parser.parse_args()
+    print("%-5s %-4s %12s %12s %8s" % ('size', 'mode', 'SetImage', 'set_image', 'speedup'))
+    with PyTessBaseAPI(path=TESSDATA_PREFIX) as tessapi:
+        for name, size in SIZES:
+            for mode in MODES:
+                image = synthetic_image(size, mode)
+                encoded = min(timeit.repeat(lambda: tessapi.SetImage(image),
+                                            number=args.repeat, repeat=3)) / args.repeat
+                raw = min(timeit.repeat(lambda: set_image(tessapi, image),
+                                        number=args.repeat, repeat=3)) / args.repeat
+                print("%-5s %-4s %10.2fms %10.2fms %7.1fx" % (
+                    name, mode, encoded * 1000, raw * 1000, encoded / raw))
+
+if __name__ == '__main__':
+    main()
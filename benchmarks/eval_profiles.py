@@ -0,0 +1,132 @@
+"""Compare the accuracy and speed of recognize under Tesseract variable profiles.
+
+Runs ``ocrd-tesserocr-recognize`` on the segmentation of a ground-truth
+workspace once for each profile (the built-in ``profile`` values, and/or
+custom sets of variables from a JSON file), and compares the recognized
+text of each line with the ground truth (by line ID, on the same page).
+Reports the character and word error rate (CER/WER, i.e. edit distance
+over the length of the ground truth) along with lines/s (counting only
+the time spent on the pages, not loading the models).
+
+Custom profiles are given as a JSON object of names and variables, e.g.::
+
+    {"no_dict_correction": {"tessedit_enable_dict_correction": 0},
+     "nodawg_noise": {"load_system_dawg": 0, "textord_max_noise_size": 12}}
+
+Usage::
+
+    python benchmarks/eval_profiles.py --mets GT/mets.xml --gt-file-grp OCR-D-GT-PAGE \\
+        [--input-file-grp GRP] [--profiles default,fast] [--custom FILE] [--output FILE]
+
+Then deploy the best trade-off with ``-p '{"profile": "NAME"}'`` (or
+``-p '{"tesseract_variables": "FILE"}'``).
+"""
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import unicodedata
+
+from ocrd import Resolver
+from ocrd_modelfactory import page_from_file
+
+from ocrd_tesserocr import TesserocrRecognize
+from ocrd_tesserocr.recognize import VARIABLE_PROFILES
+
+def edit_distance(seq1, seq2):
+    """Levenshtein distance between two sequences (strings or lists of words)."""
+    if len(seq1) < len(seq2):
+        seq1, seq2 = seq2, seq1
+    previous = list(range(len(seq2) + 1))
+    for i, item1 in enumerate(seq1, 1):
+        current = [i]
+        for j, item2 in enumerate(seq2, 1):
+            current.append(min(previous[j] + 1, # deletion
+                               current[j - 1] + 1, # insertion
+                               previous[j - 1] + (item1 != item2))) # substitution
+        previous = current
+    return previous[-1]
+
+def line_texts(workspace, file_grp):
+    """Map (pageId, line ID) to the (NFC normalized) first TextEquiv of each TextLine in ``file_grp``."""
+    texts = dict()
+    for input_file in workspace.mets.find_files(fileGrp=file_grp):
+        page = page_from_file(workspace.download_file(input_file)).get_Page()
+        regions = list(page.get_TextRegion())
+        for table in page.get_TableRegion():
+            regions.extend(table.get_TextRegion())
+        for region in regions:
+            for line in region.get_TextLine():
+                textequivs = line.get_TextEquiv()
+                text = textequivs[0].Unicode if textequivs else ''
+                texts[input_file.pageId, line.id] = unicodedata.normalize('NFC', text or '')
+    return texts
+
+def evaluate(ground_truth, recognized):
+    """Sum up character and word errors of ``recognized`` over all lines of ``ground_truth``."""
+    result = {'lines': len(ground_truth), 'chars': 0, 'char_errors': 0, 'words': 0, 'word_errors': 0}
+    for key, gt_text in ground_truth.items():
+        text = recognized.get(key, '')
+        result['chars'] += len(gt_text)
+        result['char_errors'] += edit_distance(gt_text, text)
+        result['words'] += len(gt_text.split())
+        result['word_errors'] += edit_distance(gt_text.split(), text.split())
+    result['cer'] = result['char_errors'] / max(1, result['chars'])
+    result['wer'] = result['word_errors'] / max(1, result['words'])
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mets', required=True, help='METS of the ground-truth workspace')
+    parser.add_argument('--gt-file-grp', required=True, help='fileGrp with the ground-truth text of the lines')
+    parser.add_argument('--input-file-grp', help='fileGrp with the segmentation to recognize '
+                        '(with the same line IDs; default: the ground-truth fileGrp)')
+    parser.add_argument('--profiles', default=','.join(VARIABLE_PROFILES),
+                        help='comma-separated built-in profiles to run (default: all)')
+    parser.add_argument('--custom', help='JSON file of further profiles (names and their variables)')
+    parser.add_argument('--parameter', default='{"textequiv_level": "line"}',
+                        help='JSON object of parameters for recognize in every run (e.g. model)')
+    parser.add_argument('--output', default='eval_profiles.json', help='JSON file to write results to')
+    args = parser.parse_args()
+    common = json.loads(args.parameter)
+    runs = [(name, {'profile': name}) for name in args.profiles.split(',') if name]
+    if args.custom:
+        with open(args.custom, 'r') as f:
+            for name, variables in json.load(f).items():
+                runs.append((name, {'tesseract_variables': json.dumps(variables)}))
+    directory = tempfile.mkdtemp(prefix='ocrd-tesserocr-eval-')
+    try:
+        # (a copy, so the outputs do not end up in the ground-truth workspace)
+        workspace = Resolver().workspace_from_url(args.mets, dst_dir=directory)
+        ground_truth = line_texts(workspace, args.gt_file_grp)
+        results = []
+        print("%-20s %8s %8s %10s %8s" % ('profile', 'CER', 'WER', 'lines/s', 'speedup'))
+        for n, (name, parameter) in enumerate(runs):
+            output_file_grp = 'OCR-D-EVAL-%d' % n
+            metrics = os.path.join(directory, output_file_grp + '.metrics.json')
+            parameter = dict(common, metrics=metrics, **parameter)
+            TesserocrRecognize(
+                workspace,
+                input_file_grp=args.input_file_grp or args.gt_file_grp,
+                output_file_grp=output_file_grp,
+                parameter=parameter
+            ).process()
+            with open(metrics, 'r') as f:
+                seconds = sum(json.loads(line)['wall'] for line in f)
+            result = evaluate(ground_truth, line_texts(workspace, output_file_grp))
+            result.update(profile=name, parameter=parameter, seconds=seconds,
+                          lines_per_second=result['lines'] / seconds)
+            del result['parameter']['metrics']
+            results.append(result)
+            print("%-20s %7.2f%% %7.2f%% %10.1f %7.2fx" % (
+                name, 100 * result['cer'], 100 * result['wer'], result['lines_per_second'],
+                result['lines_per_second'] / results[0]['lines_per_second']))
+    finally:
+        shutil.rmtree(directory)
+    with open(args.output, 'w') as f:
+        json.dump({'mets': args.mets, 'gt_file_grp': args.gt_file_grp, 'results': results}, f, indent=2)
+    print("results written to %s" % args.output)
+
+if __name__ == '__main__':
+    main()
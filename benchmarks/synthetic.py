@@ -0,0 +1,151 @@
+"""Generate synthetic page images with a known layout for benchmarking.
+
+Pages get rendered with PIL only (no downloads): a heading, paragraphs
+of random words in one or more columns, optionally a ruled table, then
+rotated by some skew angle and sprinkled with speckle noise. Sizes are
+given in inches, so the same layout can be rendered at various DPIs.
+
+Usage::
+
+    python benchmarks/synthetic.py [--dpi N] [--skew DEG] ... OUTPUT.png
+"""
+import argparse
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+# paper sizes in inches:
+SIZES = {'a4': (8.27, 11.69), 'a5': (5.83, 8.27), 'letter': (8.5, 11.0)}
+
+FONT = 'DejaVuSerif.ttf'
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud '
+         'exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure '
+         'in reprehenderit voluptate velit esse cillum fugiat nulla pariatur excepteur sint '
+         'occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim id est '
+         'laborum Aufklärung Ausgang Menschen selbstverschuldeten Unmündigkeit Verstandes '
+         'Leitung eines anderen 1784 12. Sept.').split()
+
+def _font(size, font=FONT):
+    try:
+        return ImageFont.truetype(font, size)
+    except OSError:
+        # no TrueType font found: fixed-size bitmap font
+        return ImageFont.load_default()
+
+def _width(draw, text, font):
+    if hasattr(draw, 'textlength'):
+        return draw.textlength(text, font=font)
+    return draw.textsize(text, font=font)[0]
+
+def _text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words))
+
+def _paragraph(draw, rnd, font, x0, y0, x1, y1, line_height):
+    """Fill the box with left-aligned lines of random words; return (lines, bottom)."""
+    lines = 0
+    y = y0
+    for _ in range(rnd.randint(3, 8)):
+        if y + line_height > y1:
+            break
+        line = ''
+        while True:
+            word = rnd.choice(WORDS)
+            if _width(draw, line + ' ' + word, font) > x1 - x0:
+                break
+            line = (line + ' ' + word).strip()
+        draw.text((x0, y), line, fill=0, font=font)
+        lines += 1
+        y += line_height
+    return lines, y
+
+def _table(draw, rnd, font, x0, y0, x1, y1, line_height, rows, cols):
+    """Draw a ruled grid of ``rows`` x ``cols`` cells with a few words each; return lines."""
+    row_height = min((y1 - y0) // rows, 2 * line_height)
+    col_width = (x1 - x0) // cols
+    width = max(1, line_height // 15)
+    lines = 0
+    for row in range(rows + 1):
+        y = y0 + row * row_height
+        draw.line([(x0, y), (x0 + cols * col_width, y)], fill=0, width=width)
+    for col in range(cols + 1):
+        x = x0 + col * col_width
+        draw.line([(x, y0), (x, y0 + rows * row_height)], fill=0, width=width)
+    for row in range(rows):
+        for col in range(cols):
+            text = _text(rnd, rnd.randint(1, 3))
+            while len(text) > 1 and _width(draw, text, font) > col_width - 2 * line_height // 3:
+                text = text[:-1]
+            draw.text((x0 + col * col_width + line_height // 3,
+                       y0 + row * row_height + (row_height - line_height) // 2),
+                      text, fill=0, font=font)
+            lines += 1
+    return lines
+
+def synthetic_page(size='a4', dpi=300, columns=1, table=False, skew=0.0, noise=0.0,
+                   font_size=11, seed=0, font=FONT):
+    """Render a page, and return its (grayscale) image and number of text lines.
+
+    ``size`` is a paper name from ``SIZES`` or (width, height) in inches,
+    ``font_size`` in points, ``skew`` in degrees (counter-clockwise),
+    and ``noise`` the fraction of pixels to turn into speckles.
+    """
+    rnd = random.Random(seed)
+    width, height = SIZES[size] if isinstance(size, str) else size
+    width, height = int(width * dpi), int(height * dpi)
+    image = Image.new('L', (width, height), 235)
+    draw = ImageDraw.Draw(image)
+    margin = dpi * 3 // 4
+    body = _font(font_size * dpi // 72, font)
+    line_height = font_size * dpi // 72 * 7 // 5
+    lines = 0
+    # heading
+    heading = _font(font_size * 2 * dpi // 72, font)
+    draw.text((margin, margin), _text(rnd, 3).title(), fill=0, font=heading)
+    lines += 1
+    top = margin + 3 * line_height
+    bottom = height - margin
+    if table:
+        table_top = (top + bottom) // 2
+        lines += _table(draw, rnd, body, margin, table_top + line_height, width - margin, bottom,
+                        line_height, rows=rnd.randint(4, 8), cols=rnd.randint(2, 4))
+        bottom = table_top
+    # paragraphs in columns
+    gutter = dpi // 3
+    column_width = (width - 2 * margin - (columns - 1) * gutter) // columns
+    for column in range(columns):
+        x0 = margin + column * (column_width + gutter)
+        y = top
+        while y + line_height < bottom:
+            paragraph_lines, y = _paragraph(draw, rnd, body, x0, y, x0 + column_width, bottom, line_height)
+            lines += paragraph_lines
+            y += line_height
+    if skew:
+        image = image.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=235)
+    if noise:
+        pixels = image.load()
+        width, height = image.size
+        for _ in range(int(noise * width * height)):
+            pixels[rnd.randrange(width), rnd.randrange(height)] = rnd.choice([0, 60, 255])
+    image.info['dpi'] = (dpi, dpi)
+    return image, lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('output', help='image file to write')
+    parser.add_argument('--size', default='a4', choices=sorted(SIZES))
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--columns', type=int, default=1)
+    parser.add_argument('--table', action='store_true', help='add a ruled table below the text')
+    parser.add_argument('--skew', type=float, default=0.0, help='rotate by this many degrees')
+    parser.add_argument('--noise', type=float, default=0.0, help='fraction of speckled pixels')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    image, lines = synthetic_page(args.size, args.dpi, args.columns, args.table,
+                                  args.skew, args.noise, seed=args.seed)
+    image.save(args.output, dpi=(args.dpi, args.dpi))
+    print("%s: %dx%d pixels, %d lines" % (args.output, image.width, image.height, lines))
+
+if __name__ == '__main__':
+    main()
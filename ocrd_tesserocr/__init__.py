@@ -21,3 +21,5 @@ from .segment_region import TesserocrSegmentRegion
 from .crop import TesserocrCrop
 from .deskew import TesserocrDeskew
 from .binarize import TesserocrBinarize
+from .materialize import TesserocrMaterialize
+from .pipeline import TesserocrPipeline
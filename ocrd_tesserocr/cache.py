@@ -0,0 +1,101 @@
+from __future__ import absolute_import
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from ocrd_utils import getLogger
+
+LOG = getLogger('processor.TesserocrCache')
+
+class ResultCache(object):
+    """Recognition results stored on disk across runs (in an SQLite database).
+
+    Results are JSON-serialisable values under content-addressed keys
+    (see ``result_key``). When the total size of the stored values
+    exceeds ``max_size`` bytes, the least recently used ones get evicted.
+    Can be used by several threads (and processes) at the same time.
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (autocommit, wait for other processes writing to the same file)
+        self._db = sqlite3.connect(path, timeout=60,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+        self._size = self._db.execute('SELECT TOTAL(size) FROM results').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, key):
+        """Return the value stored under ``key`` (marking it as used), or None."""
+        with self._lock:
+            row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store ``value`` under ``key``, evicting old values as necessary."""
+        value = json.dumps(value)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                             (key, value, len(value), time.time()))
+            self._size += len(value)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        # (re-count, as other processes may have added or evicted as well)
+        self._size = self._db.execute('SELECT TOTAL(size) FROM results').fetchone()[0]
+        while self._size > 0.9 * self.max_size:
+            rows = self._db.execute('SELECT key, size FROM results ORDER BY used LIMIT 100').fetchall()
+            if not rows:
+                break
+            self._db.executemany('DELETE FROM results WHERE key = ?', [(key,) for key, _ in rows])
+            self._size -= sum(size for _, size in rows)
+        LOG.debug("Evicted old results from cache '%s'", self.path)
+
+    def close(self):
+        """Close the database, and log the number of hits and misses."""
+        LOG.info("Cache '%s': %d hits, %d misses", self.path, self.hits, self.misses)
+        self._db.close()
+
+def file_digest(path):
+    """Get the SHA-1 checksum of the file under ``path`` (as hex string)."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def result_key(config, image, rectangle=None):
+    """Get the cache key for recognising ``image`` (within ``rectangle``) under ``config``.
+
+    ``config`` is a JSON-serialisable description of everything (besides
+    the pixels) which influences the result, like model checksums, page
+    segmentation mode and variables.
+    """
+    digest = hashlib.sha1(json.dumps([config, image.mode, image.size,
+                                      str(image.info.get('dpi')), rectangle]).encode('utf-8'))
+    if rectangle:
+        image = image.crop(rectangle)
+    digest.update(image.tobytes())
+    return digest.hexdigest()
@@ -1,6 +1,11 @@
 import click
 
-from ocrd.decorators import ocrd_cli_options, ocrd_cli_wrap_processor
+from ocrd.decorators import (
+    ocrd_cli_options,
+    ocrd_cli_wrap_processor,
+    ocrd_loglevel,
+    parameter_option
+)
 from ocrd_tesserocr.recognize import TesserocrRecognize
 from ocrd_tesserocr.segment_region import TesserocrSegmentRegion
 from ocrd_tesserocr.segment_table import TesserocrSegmentTable
@@ -9,6 +14,9 @@ from ocrd_tesserocr.segment_word import TesserocrSegmentWord
 from ocrd_tesserocr.crop import TesserocrCrop
 from ocrd_tesserocr.deskew import TesserocrDeskew
 from ocrd_tesserocr.binarize import TesserocrBinarize
+from ocrd_tesserocr.materialize import TesserocrMaterialize
+from ocrd_tesserocr.pipeline import TesserocrPipeline
+from ocrd_tesserocr.server import DEFAULT_SOCKET, serve, submit
 
 @click.command()
 @ocrd_cli_options
@@ -35,6 +43,29 @@ def ocrd_tesserocr_segment_word(*args, **kwargs):
 def ocrd_tesserocr_recognize(*args, **kwargs):
     return ocrd_cli_wrap_processor(TesserocrRecognize, *args, **kwargs)
 
+@click.command()
+@click.option('-s', '--socket', 'socket_path', default=DEFAULT_SOCKET, help="UNIX socket to listen on")
+@click.option('--max-models', default=4, type=int, help="Maximum number of model configurations to keep loaded")
+@ocrd_loglevel
+def ocrd_tesserocr_recognize_server(socket_path, max_models, log_level=None): # pylint: disable=unused-argument
+    """Serve ocrd-tesserocr-recognize jobs, keeping Tesseract models loaded between them."""
+    serve(socket_path, max_models)
+
+@click.command()
+@click.option('-s', '--socket', 'socket_path', default=DEFAULT_SOCKET, help="UNIX socket of the server")
+@click.option('-m', '--mets', required=True, help="METS to process")
+@click.option('-w', '--working-dir', help="Working Directory")
+@click.option('-I', '--input-file-grp', required=True, help="File group(s) used as input.")
+@click.option('-O', '--output-file-grp', required=True, help="File group(s) used as output.")
+@click.option('-g', '--page-id', help="ID(s) of the pages to process")
+@parameter_option
+def ocrd_tesserocr_recognize_client(socket_path, **kwargs):
+    """Submit an ocrd-tesserocr-recognize job to a running server and wait for it."""
+    try:
+        submit(socket_path, **kwargs)
+    except Exception as err: # pylint: disable=broad-except
+        raise click.ClickException(str(err))
+
 @click.command()
 @ocrd_cli_options
 def ocrd_tesserocr_crop(*args, **kwargs):
@@ -49,3 +80,13 @@ def ocrd_tesserocr_deskew(*args, **kwargs):
 @ocrd_cli_options
 def ocrd_tesserocr_binarize(*args, **kwargs):
     return ocrd_cli_wrap_processor(TesserocrBinarize, *args, **kwargs)
+
+@click.command()
+@ocrd_cli_options
+def ocrd_tesserocr_materialize(*args, **kwargs):
+    return ocrd_cli_wrap_processor(TesserocrMaterialize, *args, **kwargs)
+
+@click.command()
+@ocrd_cli_options
+def ocrd_tesserocr_pipeline(*args, **kwargs):
+    return ocrd_cli_wrap_processor(TesserocrPipeline, *args, **kwargs)
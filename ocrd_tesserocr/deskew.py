@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 
-import os.path
 import math
+from contextlib import contextmanager
 from PIL import Image
 from tesserocr import (
     PyTessBaseAPI,
@@ -12,22 +12,22 @@ from tesserocr import (
 )
 
 from ocrd_utils import (
-    getLogger, concat_padded,
+    getLogger,
     rotate_image, transpose_image,
-    membername,
-    MIMETYPE_PAGE
+    membername
 )
-from ocrd_modelfactory import page_from_file
 from ocrd_models.ocrd_page import (
     MetadataItemType,
     LabelsType, LabelType,
     AlternativeImageType,
-    TextRegionType, PageType,
-    to_xml
+    TextRegionType, PageType
 )
 from ocrd import Processor
 
 from .config import TESSDATA_PREFIX, OCRD_TOOL
+from .executor import process_pages
+from .image import set_image
+from .metrics import stage, count
 
 TOOL = 'ocrd-tesserocr-deskew'
 LOG = getLogger('processor.TesserocrDeskew')
@@ -59,106 +59,130 @@ class TesserocrDeskew(Processor):
         and script (with both OSD and AnalyseLayout). Rotate the image
         accordingly, and annotate the angle, readingDirection and textlineOrder.
         
+        If ``page_osd`` is True (and ``operation_level`` is ``region``), then
+        run OSD only once on the page image, and use its orientation and
+        script for all regions, unless its orientation confidence is below
+        ``min_orientation_confidence`` (then run OSD on each region again).
+        Skew is still estimated for each region.
+        
+        Skew angles smaller than ``min_angle`` are ignored (i.e. annotated as 0).
+        
         Create a corresponding image file, and reference it as AlternativeImage
         in the element. Add the new image file to the workspace with the fileGrp USE
         given in the second position of the output fileGrp, or ``OCR-D-IMG-DESKEW``,
-        and an ID based on input file and input element.
+        and an ID based on input file and input element. (But if ``min_angle``
+        is positive and the element then needs no rotation at all, do not
+        create an image.)
+        
+        If ``write_images`` is False, then only annotate the angles, and leave it
+        to consumers to rotate the image on demand (as ``image_from_page`` and
+        ``image_from_segment`` do), or to ``ocrd-tesserocr-materialize``.
         
         Produce a new output file by serialising the resulting hierarchy.
         """
-        oplevel = self.parameter['operation_level']
-        
+        process_pages(self, self._setup, self._page_image, self._process_page, file_grp=self.page_grp)
+
+    @contextmanager
+    def _setup(self):
         with PyTessBaseAPI(
                 path=TESSDATA_PREFIX,
                 lang="osd", # osd required for legacy init!
                 oem=OEM.TESSERACT_LSTM_COMBINED, # legacy required for OSD!
                 psm=PSM.AUTO_OSD
         ) as tessapi:
-            for n, input_file in enumerate(self.input_files):
-                file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
-                page_id = input_file.pageId or input_file.ID
-                LOG.info("INPUT FILE %i / %s", n, page_id)
-                pcgts = page_from_file(self.workspace.download_file(input_file))
-                page = pcgts.get_Page()
-                
-                # add metadata about this operation and its runtime parameters:
-                metadata = pcgts.get_Metadata() # ensured by from_file()
-                metadata.add_MetadataItem(
-                    MetadataItemType(type_="processingStep",
-                                     name=self.ocrd_tool['steps'][0],
-                                     value=TOOL,
-                                     Labels=[LabelsType(
-                                         externalModel="ocrd-tool",
-                                         externalId="parameters",
-                                         Label=[LabelType(type_=name,
-                                                          value=self.parameter[name])
-                                                for name in self.parameter.keys()])]))
-                
-                page_image, page_xywh, page_image_info = self.workspace.image_from_page(
-                    page, page_id,
+            yield tessapi
+
+    def _page_image(self, page, page_id):
+        return self.workspace.image_from_page(
+            page, page_id,
+            # image must not have been rotated already,
+            # (we will overwrite @orientation anyway,)
+            # abort if no such image can be produced:
+            feature_filter='deskewed' if self.parameter['operation_level'] == 'page' else '')
+
+    def _process_page(self, tessapi, n, input_file, pcgts,
+                      page_image, page_xywh, page_image_info):
+        oplevel = self.parameter['operation_level']
+        file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
+        page_id = input_file.pageId or input_file.ID
+        page = pcgts.get_Page()
+        
+        # add metadata about this operation and its runtime parameters:
+        metadata = pcgts.get_Metadata() # ensured by from_file()
+        metadata.add_MetadataItem(
+            MetadataItemType(type_="processingStep",
+                             name=self.ocrd_tool['steps'][0],
+                             value=TOOL,
+                             Labels=[LabelsType(
+                                 externalModel="ocrd-tool",
+                                 externalId="parameters",
+                                 Label=[LabelType(type_=name,
+                                                  value=self.parameter[name])
+                                        for name in self.parameter.keys()])]))
+        
+        if self.parameter['dpi'] > 0:
+            dpi = self.parameter['dpi']
+            LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
+        elif page_image_info.resolution != 1:
+            dpi = page_image_info.resolution
+            if page_image_info.resolutionUnit == 'cm':
+                dpi = round(dpi * 2.54)
+            LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
+        else:
+            dpi = 0
+            LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
+        # (also reset when unknown, so the result does not depend
+        #  on which pages the instance has processed before)
+        tessapi.SetVariable('user_defined_dpi', str(dpi))
+        
+        LOG.info("Deskewing on '%s' level in page '%s'", oplevel, page_id)
+        
+        if oplevel == 'page':
+            self._process_segment(tessapi, page, page_image, page_xywh,
+                                  "page '%s'" % page_id, input_file.pageId,
+                                  file_id)
+        else:
+            regions = page.get_TextRegion() + page.get_TableRegion()
+            if not regions:
+                LOG.warning("Page '%s' contains no text regions", page_id)
+            page_osr = None
+            if self.parameter['page_osd'] and regions:
+                # regions of a page almost always share orientation and script
+                set_image(tessapi, page_image)
+                with stage('DetectOrientationScript'):
+                    page_osr = tessapi.DetectOrientationScript()
+                if page_osr and page_osr['orient_conf'] >= self.parameter['min_orientation_confidence']:
+                    LOG.info("reusing OSD result %d° clockwise with confidence %.0f and script \"%s\" "
+                             "of page '%s' for all regions", page_osr['orient_deg'],
+                             page_osr['orient_conf'], page_osr['script_name'], page_id)
+                else:
+                    LOG.info("no confident OSD result for page '%s', detecting on each region", page_id)
+                    page_osr = None
+            for region in regions:
+                region_image, region_xywh = self.workspace.image_from_segment(
+                    region, page_image, page_xywh,
                     # image must not have been rotated already,
                     # (we will overwrite @orientation anyway,)
                     # abort if no such image can be produced:
-                    feature_filter='deskewed' if oplevel == 'page' else '')
-                if self.parameter['dpi'] > 0:
-                    dpi = self.parameter['dpi']
-                    LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
-                elif page_image_info.resolution != 1:
-                    dpi = page_image_info.resolution
-                    if page_image_info.resolutionUnit == 'cm':
-                        dpi = round(dpi * 2.54)
-                    LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
-                else:
-                    dpi = 0
-                    LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
-                if dpi:
-                    tessapi.SetVariable('user_defined_dpi', str(dpi))
-                
-                LOG.info("Deskewing on '%s' level in page '%s'", oplevel, page_id)
-                
-                if oplevel == 'page':
-                    self._process_segment(tessapi, page, page_image, page_xywh,
-                                          "page '%s'" % page_id, input_file.pageId,
-                                          file_id)
-                else:
-                    regions = page.get_TextRegion() + page.get_TableRegion()
-                    if not regions:
-                        LOG.warning("Page '%s' contains no text regions", page_id)
-                    for region in regions:
-                        region_image, region_xywh = self.workspace.image_from_segment(
-                            region, page_image, page_xywh,
-                            # image must not have been rotated already,
-                            # (we will overwrite @orientation anyway,)
-                            # abort if no such image can be produced:
-                            feature_filter='deskewed')
-                        self._process_segment(tessapi, region, region_image, region_xywh,
-                                              "region '%s'" % region.id, input_file.pageId,
-                                              file_id + '_' + region.id)
-                
-                # Use input_file's basename for the new file -
-                # this way the files retain the same basenames:
-                file_id = input_file.ID.replace(self.input_file_grp, self.page_grp)
-                if file_id == input_file.ID:
-                    file_id = concat_padded(self.page_grp, n)
-                self.workspace.add_file(
-                    ID=file_id,
-                    file_grp=self.page_grp,
-                    pageId=input_file.pageId,
-                    mimetype=MIMETYPE_PAGE,
-                    local_filename=os.path.join(self.page_grp,
-                                                file_id + '.xml'),
-                    content=to_xml(pcgts))
-    
-    def _process_segment(self, tessapi, segment, image, xywh, where, page_id, file_id):
+                    feature_filter='deskewed')
+                self._process_segment(tessapi, region, region_image, region_xywh,
+                                      "region '%s'" % region.id, input_file.pageId,
+                                      file_id + '_' + region.id, osr=page_osr)
+
+    def _process_segment(self, tessapi, segment, image, xywh, where, page_id, file_id, osr=None):
         features = xywh['features'] # features already applied to image
         angle0 = xywh['angle'] # deskewing (w.r.t. top image) already applied to image
         angle = 0. # additional angle to be applied at current level
-        tessapi.SetImage(image)
+        set_image(tessapi, image)
         #tessapi.SetPageSegMode(PSM.AUTO_OSD)
         #
         # orientation/script
         #
-        osr = tessapi.DetectOrientationScript()
+        if osr is None:
+            with stage('DetectOrientationScript'):
+                osr = tessapi.DetectOrientationScript()
+        else:
+            LOG.debug('using OSD result of the page for %s', where)
         if osr:
             assert not math.isnan(osr['orient_conf']), \
                 "orientation detection failed (Tesseract probably compiled without legacy OEM, or osd model not installed)"
@@ -228,7 +252,8 @@ class TesserocrDeskew(Processor):
         #
         # orientation/skew
         #
-        layout = tessapi.AnalyseLayout()
+        with stage('AnalyseLayout'):
+            layout = tessapi.AnalyseLayout()
         if layout:
             orientation, writing_direction, textline_order, deskew_angle = layout.Orientation()
             # defined as 'how many radians does one have to rotate the block anti-clockwise'
@@ -239,6 +264,9 @@ class TesserocrDeskew(Processor):
                       membername(WritingDirection, writing_direction),
                       membername(TextlineOrder, textline_order),
                       deskew_angle)
+            if deskew_angle and abs(deskew_angle) < self.parameter['min_angle']:
+                LOG.info('ignoring skew of %.3f° below min_angle in %s', deskew_angle, where)
+                deskew_angle = 0.
             # defined as 'the amount of clockwise rotation to be applied to the input image'
             # i.e. the negative amount to be applied counter-clockwise for deskewing:
             # (as defined in Tesseract OrientationIdToValue):
@@ -255,7 +283,7 @@ class TesserocrDeskew(Processor):
                             angle2, angle, where)
             # For the orientation parts of the angle, rotate the image by transposition
             # (which is more accurate than the general method below):
-            if angle:
+            if angle and self.parameter['write_images']:
                 image = transpose_image(image, {
                     90: Image.ROTATE_90,
                     180: Image.ROTATE_180,
@@ -268,7 +296,7 @@ class TesserocrDeskew(Processor):
             # (These images can be queried via GetBinaryImage/GetImage, cf. segment_region)
             # Unfortunately, it does _not_ use expand=True, but chops off corners.
             # So we must do it here from the original image ourself:
-            if deskew_angle:
+            if deskew_angle and self.parameter['write_images']:
                 LOG.debug('About to rotate %s by %.2f° counter-clockwise', where, deskew_angle)
                 image = rotate_image(image, deskew_angle, fill='background', transparency=True)
                 features += ',deskewed'
@@ -294,6 +322,12 @@ class TesserocrDeskew(Processor):
             # if baseline:
             #     points = points_from_x0y0x1y1(list(baseline[0]) + list(baseline[1]))
             #     segment.add_Baseline(BaselineType(points=points))
+        if not self.parameter['write_images']:
+            return
+        if features == xywh['features'] and self.parameter['min_angle'] > 0:
+            LOG.info('not writing an image for %s, which needs no rotation', where)
+            count('unrotated')
+            return
         # update METS (add the image file):
         file_path = self.workspace.save_image_file(image,
                                     file_id,
@@ -0,0 +1,705 @@
+from __future__ import absolute_import
+
+import io
+import os.path
+import time
+import resource
+import threading
+import traceback
+from queue import Queue
+from functools import partial
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from multiprocessing.util import Finalize
+from multiprocessing.connection import wait
+
+from ocrd_utils import (
+    getLogger,
+    concat_padded,
+    parse_json_string_or_file,
+    MIMETYPE_PAGE,
+    MIME_TO_EXT,
+    MIME_TO_PIL
+)
+from ocrd_modelfactory import page_from_file
+from ocrd_models.ocrd_page import to_xml
+
+from .manifest import Manifest
+from .metrics import METRICS, stage
+
+LOG = getLogger('processor.TesserocrExecutor')
+
+# state of the current worker process (inherited via fork):
+_WORKER = dict()
+
+# maximum number of files waiting to be written in the background:
+WRITE_QUEUE_SIZE = 16
+
+# serialises access to the workspace between the threads of a run:
+# the METS (an lxml tree) must not be read while another thread modifies
+# it, and resolving files temporarily changes the (process-wide) working
+# directory (cf. ``pushd_popd``)
+WORKSPACE_LOCK = threading.RLock()
+
+def _encode_image(image, mimetype):
+    with stage('save_image_file'):
+        image_bytes = io.BytesIO()
+        image.save(image_bytes, format=MIME_TO_PIL[mimetype])
+        return image_bytes.getvalue()
+
+def _to_xml(pcgts):
+    with stage('to_xml'):
+        return to_xml(pcgts)
+
+class _TimedImages(object):
+    """Mixin for workspace stand-ins timing the image retrieval (see ``metrics``).
+
+    Holds ``WORKSPACE_LOCK`` while resolving images, because segments
+    may be processed by several threads at once (see ``pool``), and
+    pages may be loaded in a background thread meanwhile (see ``_prefetch``).
+    """
+
+    def image_from_page(self, *args, **kwargs):
+        with stage('image_from_page'), WORKSPACE_LOCK:
+            return self.workspace.image_from_page(*args, **kwargs)
+
+    def image_from_segment(self, *args, **kwargs):
+        with stage('image_from_segment'), WORKSPACE_LOCK:
+            return self.workspace.image_from_segment(*args, **kwargs)
+
+class DeferredWorkspace(_TimedImages):
+    """Stand-in for a workspace which records added files instead of adding them.
+
+    Delegates everything else to the actual workspace. This allows worker
+    processes to produce (PAGE and image) files which then get added to
+    the METS by the parent process alone.
+    """
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.files = list()
+
+    def __getattr__(self, name):
+        return getattr(self.workspace, name)
+
+    def add_file(self, file_grp, content=None, **kwargs):
+        """Record the arguments of a ``Workspace.add_file`` call."""
+        kwargs['file_grp'] = file_grp
+        kwargs['content'] = content
+        self.files.append(kwargs)
+
+    def save_image_file(self, image, file_id, file_grp,
+                        page_id=None, mimetype='image/png', force=True):
+        """Encode ``image`` and record it like ``Workspace.save_image_file``.
+
+        Return the (relative) path the file will be stored under.
+        """
+        file_path = os.path.join(file_grp, file_id + MIME_TO_EXT[mimetype])
+        self.add_file(ID=file_id,
+                      file_grp=file_grp,
+                      pageId=page_id,
+                      local_filename=file_path,
+                      mimetype=mimetype,
+                      content=_encode_image(image, mimetype),
+                      force=force)
+        return file_path
+
+class WriteBehindWorkspace(_TimedImages):
+    """Stand-in for a workspace which writes added files in the background.
+
+    Files get referenced in the METS right away (by the calling thread),
+    but their content gets serialised or encoded and written by a writer
+    thread. When ``WRITE_QUEUE_SIZE`` files are pending, adding another
+    one blocks until the writer has caught up.
+
+    Delegates everything else to the actual workspace. Call ``flush()``
+    (or ``close()``) before saving the METS.
+
+    Holds ``WORKSPACE_LOCK`` while adding files and downloading,
+    because pages may be loaded in a background thread meanwhile
+    (see ``_prefetch``).
+    """
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        # arguments of add_file calls (without content), for the manifest:
+        self.added = list()
+        self._queue = Queue(WRITE_QUEUE_SIZE)
+        self._error = None
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.workspace, name)
+
+    def add_file(self, file_grp, content=None, **kwargs):
+        """Reference a file like ``Workspace.add_file``, but write it later.
+
+        ``content`` may also be a function which returns the content
+        (to be called on the writer thread).
+        """
+        if self._error:
+            raise self._error
+        with WORKSPACE_LOCK:
+            ret = self.workspace.add_file(file_grp, **kwargs)
+        self.added.append(dict(kwargs, file_grp=file_grp))
+        if content is not None:
+            self._queue.put((kwargs['local_filename'], content))
+        return ret
+
+    def save_image_file(self, image, file_id, file_grp,
+                        page_id=None, mimetype='image/png', force=True):
+        """Reference ``image`` like ``Workspace.save_image_file``, but encode and write it later.
+
+        Return the (relative) path the file will be stored under.
+        """
+        file_path = os.path.join(file_grp, file_id + MIME_TO_EXT[mimetype])
+        self.add_file(ID=file_id,
+                      file_grp=file_grp,
+                      pageId=page_id,
+                      local_filename=file_path,
+                      mimetype=mimetype,
+                      content=partial(_encode_image, image, mimetype),
+                      force=force)
+        return file_path
+
+    def download_file(self, *args, **kwargs):
+        with WORKSPACE_LOCK:
+            return self.workspace.download_file(*args, **kwargs)
+
+    def call(self, func):
+        """Call ``func()`` on the writer thread once all pending files have been written.
+
+        (Unless writing has failed.)
+        """
+        self._queue.put((None, func))
+
+    def flush(self):
+        """Wait until all pending files have been written.
+
+        Re-raise the first error that occurred while writing.
+        """
+        written = threading.Event()
+        self._queue.put(written)
+        written.wait()
+        if self._error:
+            raise self._error
+
+    def _write(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            if self._error:
+                continue # just drain the queue
+            local_filename, content = item
+            try:
+                if local_filename is None:
+                    content()
+                    continue
+                if callable(content):
+                    content = content()
+                if isinstance(content, str):
+                    content = content.encode('utf-8')
+                with stage('write'):
+                    with open(os.path.join(self.workspace.directory, local_filename), 'wb') as f:
+                        f.write(content)
+            except Exception as err: # pylint: disable=broad-except
+                self._error = err
+
+    def close(self):
+        """Wait until all pending files have been written, and stop the writer.
+
+        Re-raise the first error that occurred while writing.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+class Checkpoint(object):
+    """Save the METS of a processor run periodically.
+
+    Every ``checkpoint_pages`` pages or ``checkpoint_seconds`` seconds
+    (parameters of the processor, whichever comes first, 0 meaning never),
+    persist the METS with all files added so far (see ``save_mets``).
+    """
+
+    def __init__(self, processor):
+        self.pages = processor.parameter.get('checkpoint_pages', 0)
+        self.seconds = processor.parameter.get('checkpoint_seconds', 0)
+        self.count = 0
+        self.last = time.time()
+
+    def __call__(self, workspace, writer=None):
+        """Count another page, and save the METS of ``workspace`` if due.
+
+        If ``writer`` is given, wait for its pending files first.
+        """
+        self.count += 1
+        if not (self.pages and self.count >= self.pages or
+                self.seconds and time.time() - self.last >= self.seconds):
+            return
+        if writer:
+            writer.flush()
+        LOG.info("Checkpoint: saving METS after %d pages", self.count)
+        with WORKSPACE_LOCK:
+            save_mets(workspace)
+        self.count = 0
+        self.last = time.time()
+
+def save_mets(workspace):
+    """Save the METS of ``workspace`` atomically.
+
+    Write to a temporary file next to it, and then rename that, so
+    a crash while saving never leaves behind a truncated METS.
+    """
+    path = workspace.mets_target
+    with open(path + '.tmp', 'wb') as f:
+        f.write(workspace.mets.to_xml(xmllint=True))
+    os.replace(path + '.tmp', path)
+
+def process_pages(processor, setup, page_image, process_page, file_grp=None, force=False):
+    """Run the per-page function of ``processor`` on all its input files.
+
+    Call ``setup()`` once to get a context manager for the Tesseract API
+    instance(s) to be shared by all pages (and kept warm across them).
+    For each input file, parse its PAGE, get the page image via
+    ``page_image(page, page_id)`` (i.e. image, coordinates and image info,
+    as in ``Workspace.image_from_page``), and pass everything to
+    ``process_page(tessapi, n, input_file, pcgts, *image)``, which
+    annotates the page in-place (and may add image files to the workspace).
+    Then serialise the result, and add it as a new PAGE file under
+    ``file_grp`` (or the processor's output fileGrp), with an ID derived
+    from that of the input file (and ``force`` overwriting existing files).
+
+    While Tesseract is busy with one page, parse and decode up to
+    ``prefetch`` (parameter of the processor) pages ahead in a
+    background thread, and serialise and write the files of the
+    previous pages in another (see ``WriteBehindWorkspace``).
+
+    If the processor's ``jobs`` parameter is larger than 1, then fork as
+    many worker processes, each calling ``setup()`` once and processing
+    a share of the pages. The files produced by the workers get recorded
+    and sent back, so all METS modifications happen in the parent process
+    (in the order of the input files).
+    
+    If the processor's ``incremental`` parameter is enabled, then skip
+    all pages for which an output file from the same inputs and
+    configuration already exists (see ``Manifest``), and replace
+    the outdated ones.
+
+    If the processor's ``page_timeout`` or ``page_memory`` parameter is
+    set, then run each page in a supervised worker process instead (see
+    ``_process_supervised``), so pathological pages cannot stall or crash
+    the whole run.
+
+    If the processor's ``checkpoint_pages`` or ``checkpoint_seconds``
+    parameter is set, then save the METS periodically (see ``Checkpoint``).
+    Together with ``incremental``, this allows resuming an interrupted run:
+    output files written after the last checkpoint get adopted from the
+    manifest (if they are complete), and only the rest is processed again.
+
+    If the processor's ``metrics`` or ``metrics_textfile`` parameter is set
+    (or the respective environment variable), then measure the time spent
+    in each stage of processing each page (see ``Metrics``), and write
+    one record per page, and a summary in the end.
+    """
+    METRICS.configure(processor)
+    try:
+        _process_pages(processor, setup, page_image, process_page, file_grp, force)
+    finally:
+        METRICS.close()
+
+def forks_workers(processor, tasks=None):
+    """Whether ``process_pages`` will run the pages of ``processor`` in forked worker processes.
+
+    (I.e. with ``jobs`` larger than 1, at least for more than one of
+    ``tasks`` if given, or in supervised mode.) Resources which do not
+    survive a fork (like threads) must then be set up in the workers.
+    """
+    jobs = processor.parameter['jobs']
+    if tasks is not None:
+        jobs = min(jobs, len(tasks))
+    return bool(jobs > 1 or
+                processor.parameter.get('page_timeout', 0) or
+                processor.parameter.get('page_memory', 0))
+
+def _process_pages(processor, setup, page_image, process_page, file_grp, force):
+    file_grp = file_grp or processor.output_file_grp
+    tasks = list(enumerate(processor.input_files))
+    checkpoint = Checkpoint(processor)
+    manifest = None
+    if processor.parameter.get('incremental'):
+        manifest = Manifest(processor, file_grp)
+        tasks, digests = _outdated(processor, manifest, tasks, file_grp)
+        force = True
+        if not tasks:
+            LOG.info("All pages are up to date in '%s'", file_grp)
+            return
+    def add_files(n, input_file, files, record=None, retried=False):
+        METRICS.emit(record)
+        if files is None:
+            # failed page: pass the input through unchanged
+            add_page_file(processor, n, input_file, page_from_file(input_file), file_grp, force)
+        else:
+            for kwargs in files:
+                processor.workspace.add_file(**kwargs)
+            # (results with page_retry_parameters are not up to date
+            #  with the parameters of the run, so process them again)
+            if manifest and not retried:
+                manifest.update(*digests[n], [
+                    dict((key, value) for key, value in kwargs.items()
+                         if key != 'content')
+                    for kwargs in files])
+        checkpoint(processor.workspace)
+    try:
+        jobs = min(processor.parameter['jobs'], len(tasks))
+        supervised = (processor.parameter.get('page_timeout', 0) or
+                      processor.parameter.get('page_memory', 0))
+        if forks_workers(processor, tasks):
+            _WORKER.update(processor=processor,
+                           setup=setup,
+                           page_image=page_image,
+                           process_page=process_page,
+                           tasks=tasks,
+                           file_grp=file_grp,
+                           force=force)
+            try:
+                # fork (instead of spawn) to inherit the processor and its workspace:
+                context = multiprocessing.get_context('fork')
+                if supervised:
+                    _process_supervised(processor, context, tasks, max(jobs, 1), add_files)
+                else:
+                    LOG.info("Processing %d pages in %d worker processes", len(tasks), jobs)
+                    with context.Pool(jobs, initializer=_init_worker) as pool:
+                        for (n, input_file), (files, record) in zip(
+                                tasks, pool.imap(_run_worker, range(len(tasks)))):
+                            add_files(n, input_file, files, record)
+                        pool.close()
+                        pool.join()
+            finally:
+                _WORKER.clear()
+        else:
+            writer = WriteBehindWorkspace(processor.workspace)
+            processor.workspace = writer
+            try:
+                with setup() as tessapi:
+                    for n, input_file, page in _prefetch(processor, page_image, tasks):
+                        writer.added = list()
+                        METRICS.emit(_process_file(processor, tessapi, process_page,
+                                                   n, input_file, page, file_grp, force))
+                        if manifest:
+                            # (record only once the files are on disk)
+                            writer.call(partial(manifest.update, *digests[n], writer.added))
+                        checkpoint(writer.workspace, writer)
+            finally:
+                processor.workspace = writer.workspace
+                writer.close()
+    finally:
+        if manifest:
+            manifest.save()
+
+class _Supervised(object):
+    """A worker process which runs one page at a time for the supervisor.
+
+    Gets forked with the state in ``_WORKER`` (and the parameters in
+    ``overrides`` replacing those of the processor), and sets up
+    Tesseract once. Then reports ready, receives indexes into the tasks,
+    and sends back the status and the files produced for each (see
+    ``_supervised_worker``).
+    """
+
+    def __init__(self, context, overrides=None):
+        self.overrides = overrides
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_supervised_worker,
+                                       args=(child, overrides),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.task = None
+        self.started = None
+
+    def submit(self, i):
+        self.task = i
+        self.started = time.time()
+        self.conn.send(i)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass # already dead
+        self.process.join()
+        self.conn.close()
+
+def _supervised_worker(conn, overrides):
+    processor = _WORKER['processor']
+    memory = processor.parameter.get('page_memory', 0)
+    if memory:
+        # (address space of the whole process, including models)
+        limit = int(memory * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if overrides:
+        # (only in this process)
+        processor.parameter.update(overrides)
+    _init_worker()
+    if 'error' in _WORKER:
+        conn.send(('error', str(_WORKER['error'])))
+        return
+    conn.send(('ready', None))
+    while True:
+        i = conn.recv()
+        if i is None:
+            break
+        try:
+            conn.send(('ok', _run_worker(i)))
+        except Exception: # pylint: disable=broad-except
+            conn.send(('failed', traceback.format_exc()))
+            break # (do not reuse, the instance may be in a bad state)
+
+def _process_supervised(processor, context, tasks, jobs, add_files):
+    """Process ``tasks`` in ``jobs`` supervised worker processes with a budget per page.
+
+    Kill each worker which takes more than ``page_timeout`` seconds for
+    a page, and limit the memory of each to ``page_memory`` MB
+    (parameters of the processor). A worker which exceeds its budget,
+    crashes or raises an exception gets replaced by a fresh one.
+    Retry the failed page once in a separate worker with the parameters
+    in ``page_retry_parameters`` (if any), e.g. with table detection
+    disabled. Pass pages which fail anyway through unchanged (logging
+    the failure).
+
+    Call ``add_files(n, input_file, files, record, retried)`` for each page
+    (in the order of ``tasks``), with ``files`` None for failed pages (and
+    ``record`` the page's metrics, ``retried`` whether the page succeeded
+    only with ``page_retry_parameters``).
+    """
+    timeout = processor.parameter.get('page_timeout', 0)
+    retry = parse_json_string_or_file(processor.parameter.get('page_retry_parameters', ''))
+    for name in retry:
+        if name not in processor.ocrd_tool['parameters']:
+            raise Exception("unknown parameter '%s' in page_retry_parameters" % name)
+    LOG.info("Processing %d pages in %d supervised worker processes", len(tasks), jobs)
+    queue = deque(range(len(tasks)))
+    retries = deque()
+    results = dict()
+    done = 0
+    workers = [_Supervised(context) for _ in range(jobs)]
+    retrier = None
+    try:
+        while done < len(tasks):
+            if retries and retrier is None:
+                retrier = _Supervised(context, retry)
+            for worker, pending in [(worker, queue) for worker in workers] + [(retrier, retries)]:
+                if worker and worker.ready and worker.task is None and pending:
+                    worker.submit(pending.popleft())
+            waiting = [worker for worker in workers + [retrier]
+                       if worker and (not worker.ready or worker.task is not None)]
+            running = [worker for worker in waiting if worker.task is not None]
+            now = time.time()
+            ready = wait([worker.conn for worker in waiting],
+                         max(0, min(worker.started + timeout - now for worker in running))
+                         if timeout and running else None)
+            now = time.time()
+            for worker in waiting:
+                if worker.conn in ready:
+                    try:
+                        status, result = worker.conn.recv()
+                    except EOFError:
+                        worker.process.join()
+                        status, result = 'failed', 'worker died with exit code %s (out of memory?)' % (
+                            worker.process.exitcode)
+                elif worker.task is not None and timeout and now - worker.started >= timeout:
+                    status, result = 'failed', 'timeout after %g seconds' % timeout
+                else:
+                    continue
+                if status == 'ready':
+                    worker.ready = True
+                    continue
+                if status == 'error':
+                    raise Exception("Tesseract setup failed in worker: %s" % result)
+                if not worker.ready:
+                    raise Exception("Worker failed during setup: %s" % result)
+                i = worker.task
+                worker.task = None
+                if status == 'ok':
+                    results[i] = result + (worker is retrier,)
+                    continue
+                _, input_file = tasks[i]
+                page_id = input_file.pageId or input_file.ID
+                worker.kill()
+                replacement = _Supervised(context, worker.overrides)
+                if worker is retrier:
+                    retrier = replacement
+                else:
+                    workers[workers.index(worker)] = replacement
+                if retry and worker.overrides is None:
+                    LOG.warning("Page '%s' failed: %s; retrying with %s", page_id, result, str(retry))
+                    retries.append(i)
+                else:
+                    LOG.error("Page '%s' failed: %s; passing it through unchanged", page_id, result)
+                    results[i] = (None, None, False)
+            while done in results:
+                n, input_file = tasks[done]
+                add_files(n, processor.workspace.download_file(input_file), *results.pop(done))
+                done += 1
+    finally:
+        for worker in workers + [retrier]:
+            if worker is None:
+                continue
+            if worker.task is None:
+                worker.close()
+            else:
+                worker.kill()
+
+def _outdated(processor, manifest, tasks, file_grp):
+    """Filter ``tasks`` for the pages whose output is missing or outdated according to ``manifest``.
+
+    Return the remaining tasks, and a dict mapping their indexes
+    to the output file ID and digest (for ``Manifest.update``).
+    """
+    outdated = list()
+    digests = dict()
+    for n, input_file in tasks:
+        input_file = processor.workspace.download_file(input_file)
+        file_id = page_file_id(processor, n, input_file, file_grp)
+        digest = manifest.digest(input_file)
+        if manifest.is_current(file_id, digest):
+            LOG.info("Skipping page '%s': output '%s' is up to date",
+                     input_file.pageId or input_file.ID, file_id)
+            continue
+        digests[n] = (file_id, digest)
+        outdated.append((n, input_file))
+    LOG.info("Processing %d of %d pages (the others are up to date)", len(outdated), len(tasks))
+    return outdated, digests
+
+def _load_page(page_image, input_file):
+    # input_file must have been downloaded already
+    with stage('page_from_file'):
+        pcgts = page_from_file(input_file)
+    return _load_image(pcgts, page_image(pcgts.get_Page(), input_file.pageId or input_file.ID))
+
+def _load_page_locked(page_image, input_file):
+    # (on the loader thread, while the main thread may modify the METS)
+    with stage('page_from_file'):
+        pcgts = page_from_file(input_file)
+    with WORKSPACE_LOCK:
+        image = page_image(pcgts.get_Page(), input_file.pageId or input_file.ID)
+    return _load_image(pcgts, image)
+
+def _load_image(pcgts, image):
+    # decode the page image right away (Image.open is lazy): this is
+    # the expensive part of loading, and lazy images must not be
+    # accessed from several threads at once (when cropping segments)
+    with stage('decode_image'):
+        image[0].load()
+    return (pcgts,) + tuple(image)
+
+def _prefetch(processor, page_image, tasks):
+    """Load the pages of ``tasks`` (index and input file) ahead of time.
+
+    Yield the index, input file and loaded page (i.e. PAGE object and
+    image tuple) for each, while loading the next ``prefetch`` pages
+    in a background thread.
+
+    (Files get downloaded on the calling thread, and the images get
+    resolved under ``WORKSPACE_LOCK``, so the page being processed
+    meanwhile can safely add files to the workspace.)
+    """
+    ahead = processor.parameter['prefetch']
+    if ahead < 1:
+        for n, input_file in tasks:
+            input_file = processor.workspace.download_file(input_file)
+            yield n, input_file, _load_page(page_image, input_file)
+        return
+    pending = deque()
+    with ThreadPoolExecutor(1) as loader:
+        for n, input_file in tasks:
+            # download in this thread, as it may modify the METS:
+            with WORKSPACE_LOCK:
+                input_file = processor.workspace.download_file(input_file)
+            pending.append((n, input_file, loader.submit(_load_page_locked, page_image, input_file)))
+            if len(pending) > ahead:
+                n, input_file, future = pending.popleft()
+                yield n, input_file, future.result()
+        while pending:
+            n, input_file, future = pending.popleft()
+            yield n, input_file, future.result()
+
+def _process_file(processor, tessapi, process_page, n, input_file, page, file_grp, force):
+    """Process and add the page, and return its metrics record (if enabled)."""
+    page_id = input_file.pageId or input_file.ID
+    LOG.info("INPUT FILE %i / %s", n, page_id)
+    process_page(tessapi, n, input_file, *page)
+    add_page_file(processor, n, input_file, page[0], file_grp, force)
+    return METRICS.page_done(page_id)
+
+def add_page_file(processor, n, input_file, pcgts, file_grp, force=False):
+    """Add ``pcgts`` as the PAGE result for ``input_file`` under ``file_grp``.
+
+    Serialise it on the writer thread if the processor's workspace is
+    a ``WriteBehindWorkspace`` (so ``pcgts`` must not change afterwards),
+    or right away otherwise.
+    """
+    file_id = page_file_id(processor, n, input_file, file_grp)
+    content = partial(_to_xml, pcgts)
+    if not isinstance(processor.workspace, WriteBehindWorkspace):
+        content = content()
+    processor.workspace.add_file(
+        force=force,
+        ID=file_id,
+        file_grp=file_grp,
+        pageId=input_file.pageId,
+        mimetype=MIMETYPE_PAGE,
+        local_filename=os.path.join(file_grp,
+                                    file_id + '.xml'),
+        content=content)
+
+def page_file_id(processor, n, input_file, file_grp):
+    """Get the ID of the PAGE output file for the ``n``-th input file."""
+    # Use input_file's basename for the new file -
+    # this way the files retain the same basenames:
+    file_id = input_file.ID.replace(processor.input_file_grp, file_grp)
+    if file_id == input_file.ID:
+        file_id = concat_padded(file_grp, n)
+    return file_id
+
+def _init_worker():
+    stack = _WORKER['stack'] = ExitStack()
+    try:
+        _WORKER['tessapi'] = stack.enter_context(_WORKER['setup']())
+    except Exception as err: # pylint: disable=broad-except
+        # do not let the pool respawn failing workers endlessly,
+        # but report to the parent with the first page instead:
+        _WORKER['error'] = err
+    # shut down Tesseract when the worker exits regularly:
+    Finalize(None, stack.close, exitpriority=10)
+
+def _run_worker(i):
+    if 'error' in _WORKER:
+        raise _WORKER['error']
+    processor = _WORKER['processor']
+    workspace = processor.workspace
+    processor.workspace = DeferredWorkspace(workspace)
+    try:
+        n, input_file = _WORKER['tasks'][i]
+        input_file = workspace.download_file(input_file)
+        page = _load_page(_WORKER['page_image'], input_file)
+        record = _process_file(processor, _WORKER['tessapi'], _WORKER['process_page'],
+                               n, input_file, page, _WORKER['file_grp'], _WORKER['force'])
+        return processor.workspace.files, record
+    finally:
+        processor.workspace = workspace
@@ -0,0 +1,195 @@
+from __future__ import absolute_import
+
+import math
+
+import numpy as np
+from PIL import Image
+
+from .metrics import stage
+
+# bytes per pixel for the raw buffer (0 means 1 bit per pixel):
+_MODE_BPP = {'1': 0, 'L': 1, 'RGB': 3, 'RGBA': 4}
+
+# minimum darkness below the background for a pixel to count as ink:
+BLANK_CONTRAST = 64
+# (approximate) number of pixels to sample for the ink density:
+BLANK_SAMPLE_SIZE = 250000
+# minimum fraction of ink pixels in a row or column to count as text extent:
+PROJECTION_THRESHOLD = 0.005
+# maximum fraction of ink pixels on the paper to still look like text:
+PROJECTION_MAX_INK = 0.25
+
+def set_image(tessapi, image):
+    """Set ``image`` as the current image of ``tessapi`` via its raw pixel buffer.
+
+    ``image`` can be a PIL.Image or a NumPy array (``uint8`` of shape
+    ``(height, width)``, ``(height, width, 3)`` or ``(height, width, 4)``,
+    or ``bool`` of shape ``(height, width)``, with True for white as in
+    PIL mode ``1``).
+
+    Unlike ``tessapi.SetImage``, which encodes the image to an in-memory
+    file that Leptonica decodes again, this passes the pixels to
+    ``SetImageBytes`` as they are (with 1, 8, 24 or 32 bits per pixel).
+    Other PIL modes get converted to RGB(A) first. If the image has
+    a resolution in its meta-data, pass it as source resolution, too.
+    """
+    with stage('SetImage'):
+        _set_image(tessapi, image)
+
+def _set_image(tessapi, image):
+    if isinstance(image, np.ndarray):
+        _set_array(tessapi, image)
+        return
+    if image.mode not in _MODE_BPP:
+        if image.mode in ('LA', 'PA', 'La', 'RGBa') or 'transparency' in image.info:
+            image = image.convert('RGBA')
+        else:
+            image = image.convert('RGB')
+    bpp = _MODE_BPP[image.mode]
+    width, height = image.size
+    if bpp:
+        bpl = bpp * width
+    else:
+        bpl = (width + 7) // 8 # rows are padded to full bytes
+    tessapi.SetImageBytes(image.tobytes(), width, height, bpp, bpl)
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] > 1:
+        tessapi.SetSourceResolution(int(round(dpi[0])))
+
+def is_blank(image, threshold):
+    """Whether less than ``threshold`` (a fraction) of the pixels of ``image`` are ink.
+
+    Count the pixels which are darker than the background (i.e. the median
+    brightness) by more than ``BLANK_CONTRAST``, sampling large images on
+    a regular grid of about ``BLANK_SAMPLE_SIZE`` pixels. Images without
+    pixels are blank, and nothing is blank if ``threshold`` is 0.
+    """
+    if not threshold:
+        return False
+    gray, _ = _sample_gray(image)
+    if not gray.size:
+        return True
+    background = int(np.median(gray))
+    ink = np.count_nonzero(gray < background - BLANK_CONTRAST)
+    return ink < threshold * gray.size
+
+def _sample_gray(image):
+    """Get the grayscale pixels of ``image`` on a regular grid of about ``BLANK_SAMPLE_SIZE`` pixels.
+
+    Return them as an array, along with the grid step. (Sample before
+    converting, so large images never get converted as a whole.)
+    """
+    step = max(1, int(math.sqrt(image.width * image.height / BLANK_SAMPLE_SIZE)))
+    if step > 1:
+        image = image.resize((-(-image.width // step), -(-image.height // step)), Image.NEAREST)
+    return np.asarray(image.convert('L')), step
+
+def projection_border(image, zoom=1):
+    """Find the extent of the text on ``image`` from its ink projection profiles.
+
+    First find the paper by skipping rows and columns at the edges which
+    are mostly darker than the background (scanner margins), then the
+    first and last rows and columns of the paper with at least
+    ``PROJECTION_THRESHOLD`` (a fraction) of ink pixels. Runs of such rows
+    or columns smaller than 25 pixels at 300 DPI (``zoom`` being 300 / DPI),
+    even after closing gaps of half that size, are ignored as noise.
+    Large images get sampled on a regular grid like in ``is_blank``.
+
+    Return the bounding box (left, top, right, bottom) and a description
+    of the paper found, or None and the reason if the page is ambiguous
+    (dark margins covering most of it, too much ink for text, no text,
+    or ink up to the edges of the paper).
+    """
+    gray, step = _sample_gray(image)
+    if not gray.size:
+        return None, "empty image"
+    height, width = gray.shape
+    background = int(np.median(gray[height // 4:height - height // 4, width // 4:width - width // 4]))
+    ink = gray < background - BLANK_CONTRAST
+    x0, x1 = _margins(ink.mean(axis=0))
+    y0, y1 = _margins(ink.mean(axis=1))
+    if x1 - x0 < width / 2 or y1 - y0 < height / 2:
+        return None, "dark margins cover more than half of the image"
+    paper = ink[y0:y1, x0:x1]
+    if paper.mean() > PROJECTION_MAX_INK:
+        return None, "too much ink for text (%d%%)" % (100 * paper.mean())
+    min_size = max(1, int(25 / zoom / step))
+    columns = _runs(paper.mean(axis=0) >= PROJECTION_THRESHOLD, min_size)
+    rows = _runs(paper.mean(axis=1) >= PROJECTION_THRESHOLD, min_size)
+    if not columns or not rows:
+        return None, "no text"
+    left, right = columns[0][0], columns[-1][1]
+    top, bottom = rows[0][0], rows[-1][1]
+    if right - left >= (x1 - x0) - 2 * min_size and bottom - top >= (y1 - y0) - 2 * min_size:
+        return None, "ink up to the edges of the paper"
+    return ((x0 + left) * step, (y0 + top) * step,
+            min(image.width, (x0 + right) * step), min(image.height, (y0 + bottom) * step)), \
+        "paper %d:%d,%d:%d" % (x0 * step, min(image.width, x1 * step),
+                               y0 * step, min(image.height, y1 * step))
+
+def _margins(dark):
+    """Get the start and end of ``dark`` (fractions) without the edges above one half."""
+    start, end = 0, len(dark)
+    while start < end and dark[start] > 0.5:
+        start += 1
+    while end > start and dark[end - 1] > 0.5:
+        end -= 1
+    return start, end
+
+def _runs(mask, min_size):
+    """Get the (start, end) of runs of True in ``mask`` of at least ``min_size``.
+
+    (Runs separated by gaps smaller than ``min_size / 2`` count as one.)
+    """
+    runs = []
+    for start, end in np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))).reshape(-1, 2):
+        if runs and start - runs[-1][1] < min_size / 2:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return [(start, end) for start, end in runs if end - start >= min_size]
+
+def downscale_image(image, coords, dpi, analysis_dpi):
+    """Reduce ``image`` (with its ``coords``) from ``dpi`` to ``analysis_dpi`` for layout analysis.
+
+    Resize by averaging (binary images become grayscale), and compose the
+    scaling into the transform of ``coords``, so ``coordinates_for_segment``
+    maps results on the small image back to the page. Return the image and
+    its coords, or the originals if ``dpi`` is unknown (0) or not above
+    ``analysis_dpi``.
+    """
+    if not analysis_dpi or not dpi or dpi <= analysis_dpi:
+        return image, coords
+    width = max(1, round(image.width * analysis_dpi / dpi))
+    height = max(1, round(image.height * analysis_dpi / dpi))
+    coords = dict(coords, transform=scale_coordinates(
+        coords['transform'], (width / image.width, height / image.height)))
+    with stage('downscale'):
+        if image.mode == '1':
+            image = image.convert('L')
+        image = image.resize((width, height), Image.BOX)
+    image.info['dpi'] = (analysis_dpi, analysis_dpi)
+    return image, coords
+
+def scale_coordinates(transform, factors):
+    """Compose an affine coordinate transformation with a scaling by ``factors`` (x, y)."""
+    scale = np.eye(3)
+    scale[0, 0] = factors[0]
+    scale[1, 1] = factors[1]
+    return np.dot(scale, transform)
+
+def _set_array(tessapi, array):
+    if array.dtype == np.bool_ and array.ndim == 2:
+        height, width = array.shape
+        array = np.packbits(array, axis=1)
+        bpp, bpl = 0, array.shape[1]
+    elif array.dtype == np.uint8 and (
+            array.ndim == 2 or
+            array.ndim == 3 and array.shape[2] in (3, 4)):
+        height, width = array.shape[:2]
+        bpp = 1 if array.ndim == 2 else array.shape[2]
+        bpl = bpp * width
+    else:
+        raise Exception("cannot pass array of type %s and shape %s to Tesseract" % (
+            array.dtype, str(array.shape)))
+    tessapi.SetImageBytes(np.ascontiguousarray(array).tobytes(), width, height, bpp, bpl)
@@ -0,0 +1,131 @@
+from __future__ import absolute_import
+
+import os
+import json
+import hashlib
+from lxml import etree
+
+from ocrd_utils import getLogger, MIMETYPE_PAGE
+
+from .cache import file_digest
+
+LOG = getLogger('processor.TesserocrManifest')
+
+MANIFEST_FILENAME = '.ocrd-tesserocr-manifest.json'
+
+# parameters which do not influence the results:
+EXECUTION_PARAMETERS = ['jobs', 'prefetch', 'threads', 'incremental', 'cache', 'cache_size',
+                        'checkpoint_pages', 'checkpoint_seconds', 'page_timeout', 'page_memory',
+                        'metrics', 'metrics_textfile']
+
+class Manifest(object):
+    """Digests of what each output file of a fileGrp has been produced from.
+
+    For each output file ID, keep a checksum of the input PAGE, its image,
+    the processor version and its (result-relevant) parameters, along with
+    all files added for that page (PAGE and images). Stored as JSON lines
+    next to the files of the fileGrp (appending an entry as soon as the
+    files of a page have been written), so a rerun can tell which outputs
+    are still up to date, even if they never made it into the METS.
+    """
+
+    def __init__(self, processor, file_grp):
+        self.workspace = processor.workspace
+        self.file_grp = file_grp
+        self.path = os.path.join(self.workspace.directory, file_grp, MANIFEST_FILENAME)
+        self.config = json.dumps([
+            processor.ocrd_tool['executable'], processor.version,
+            dict((name, value) for name, value in processor.parameter.items()
+                 if name not in EXECUTION_PARAMETERS)], sort_keys=True)
+        self.entries = dict()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry['ID']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue # incomplete last line (after a crash)
+
+    def digest(self, input_file):
+        """Get the checksum for processing ``input_file`` (which must be downloaded already)."""
+        digest = hashlib.sha1(self.config.encode('utf-8'))
+        for path in self._input_paths(input_file):
+            digest.update(file_digest(os.path.join(self.workspace.directory, path)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _input_paths(self, input_file):
+        """Get the local paths of ``input_file`` and of all images its PAGE refers to.
+
+        Besides the original image, this includes the AlternativeImage
+        files of the page and all of its segments. (Resolve local paths
+        relative to the workspace, and download only remote URLs, so
+        changes to local files always change the digest.)
+        """
+        yield input_file.local_filename
+        if input_file.mimetype != MIMETYPE_PAGE:
+            return
+        with open(os.path.join(self.workspace.directory, input_file.local_filename), 'rb') as f:
+            tree = etree.parse(f)
+        urls = tree.xpath('//*[local-name()="Page"]/@imageFilename')
+        urls += tree.xpath('//*[local-name()="AlternativeImage"]/@filename')
+        for url in sorted(set(urls), key=urls.index):
+            if os.path.exists(os.path.join(self.workspace.directory, url)):
+                # (never a downloaded copy, which would not change with the file)
+                yield url
+                continue
+            # (a generator in newer versions of core)
+            if '://' in url:
+                image_files = list(self.workspace.mets.find_files(url=url))
+            else:
+                # local file which has not been downloaded yet:
+                try:
+                    image_files = list(self.workspace.mets.find_files(local_filename=url))
+                except TypeError:
+                    # (older versions of core only match URLs, which are the local paths there)
+                    image_files = list(self.workspace.mets.find_files(url=url))
+                if not image_files:
+                    raise Exception("Image '%s' of '%s' does not exist" % (url, input_file.local_filename))
+            if image_files:
+                yield self.workspace.download_file(image_files[0]).local_filename
+            else:
+                yield self.workspace.download_url(url)
+
+    def is_current(self, file_id, digest):
+        """Whether the output file ``file_id`` has been produced with ``digest`` (and still exists).
+
+        If any of the files recorded for it are missing in the METS
+        (because the run which wrote them did not finish), but still
+        exist on disk, then adopt them into the METS.
+        """
+        entry = self.entries.get(file_id)
+        if not entry or entry['digest'] != digest:
+            return False
+        if not all(os.path.exists(os.path.join(self.workspace.directory, kwargs['local_filename']))
+                   for kwargs in entry['files']):
+            return False
+        for kwargs in entry['files']:
+            if not any(self.workspace.mets.find_files(ID=kwargs['ID'], fileGrp=kwargs['file_grp'])):
+                LOG.info("Adopting existing file '%s'", kwargs['local_filename'])
+                self.workspace.add_file(**dict(kwargs, force=True))
+        return True
+
+    def update(self, file_id, digest, files):
+        """Record that the output file ``file_id`` has been produced with ``digest``.
+
+        ``files`` is the list of keyword arguments to ``Workspace.add_file``
+        (without content) for all files added for this page. Call only after
+        these files have been written.
+        """
+        entry = {'ID': file_id, 'digest': digest, 'files': files}
+        self.entries[file_id] = entry
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def save(self):
+        """Rewrite the manifest (atomically) with only the latest entry for each file."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            for file_id in sorted(self.entries):
+                f.write(json.dumps(self.entries[file_id]) + '\n')
+        os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,152 @@
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+from tesserocr import PyTessBaseAPI
+
+from ocrd_utils import getLogger
+from ocrd_models.ocrd_page import (
+    MetadataItemType,
+    LabelsType, LabelType,
+    AlternativeImageType,
+    TextRegionType
+)
+from ocrd import Processor
+
+from .config import TESSDATA_PREFIX, OCRD_TOOL
+from .executor import process_pages
+from .image import set_image
+from .metrics import stage, count
+
+TOOL = 'ocrd-tesserocr-materialize'
+LOG = getLogger('processor.TesserocrMaterialize')
+FALLBACK_IMAGE_GRP = 'OCR-D-IMG-MATERIALIZED'
+
+class TesserocrMaterialize(Processor):
+
+    def __init__(self, *args, **kwargs):
+        kwargs['ocrd_tool'] = OCRD_TOOL['tools'][TOOL]
+        kwargs['version'] = OCRD_TOOL['version']
+        super(TesserocrMaterialize, self).__init__(*args, **kwargs)
+        if hasattr(self, 'output_file_grp'):
+            try:
+                self.page_grp, self.image_grp = self.output_file_grp.split(',')
+            except ValueError:
+                self.page_grp = self.output_file_grp
+                self.image_grp = FALLBACK_IMAGE_GRP
+                LOG.info("No output file group for images specified, falling back to '%s'", FALLBACK_IMAGE_GRP)
+
+    def process(self):
+        """Writes the images derived by annotated transforms on the workspace.
+
+        Open and deserialize PAGE input files and their respective images,
+        then iterate over the element hierarchy down to the requested level.
+
+        Derive the image of each segment from the original (or the best
+        AlternativeImage) by applying all annotated transforms, i.e. cropping
+        to the Border and segment coordinates, and rotating by @orientation
+        (as annotated by ``ocrd-tesserocr-crop`` or ``ocrd-tesserocr-deskew``
+        with ``write_images`` False). If ``binarize`` is True, then binarize
+        it with Tesseract, too.
+
+        Unless there already is an AlternativeImage with exactly the same
+        features (or nothing has to be applied at all), create an image file,
+        and reference it as AlternativeImage in the segment element. Add the
+        new image file to the workspace with the fileGrp USE given in the
+        second position of the output fileGrp, or ``OCR-D-IMG-MATERIALIZED``,
+        and an ID based on input file and input element.
+
+        Produce a new output file by serialising the resulting hierarchy.
+        """
+        process_pages(self, self._setup, self._page_image, self._process_page, file_grp=self.page_grp)
+
+    @contextmanager
+    def _setup(self):
+        if not self.parameter['binarize']:
+            # (no need to load a model just for cropping and rotating)
+            yield None
+            return
+        with PyTessBaseAPI(path=TESSDATA_PREFIX) as tessapi:
+            yield tessapi
+
+    def _page_image(self, page, page_id):
+        return self.workspace.image_from_page(page, page_id)
+
+    def _process_page(self, tessapi, n, input_file, pcgts,
+                      page_image, page_xywh, page_image_info):
+        oplevel = self.parameter['operation_level']
+        file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
+        page_id = input_file.pageId or input_file.ID
+        page = pcgts.get_Page()
+
+        # add metadata about this operation and its runtime parameters:
+        metadata = pcgts.get_Metadata() # ensured by from_file()
+        metadata.add_MetadataItem(
+            MetadataItemType(type_="processingStep",
+                             name=self.ocrd_tool['steps'][0],
+                             value=TOOL,
+                             Labels=[LabelsType(
+                                 externalModel="ocrd-tool",
+                                 externalId="parameters",
+                                 Label=[LabelType(type_=name,
+                                                  value=self.parameter[name])
+                                        for name in self.parameter.keys()])]))
+
+        LOG.info("Materializing images on '%s' level in page '%s'", oplevel, page_id)
+
+        if oplevel == 'page':
+            self._process_segment(tessapi, page, page_image, page_xywh,
+                                  "page '%s'" % page_id, input_file.pageId,
+                                  file_id)
+            return
+        regions = page.get_TextRegion() + page.get_TableRegion()
+        if not regions:
+            LOG.warning("Page '%s' contains no text regions", page_id)
+        for region in regions:
+            region_image, region_xywh = self.workspace.image_from_segment(
+                region, page_image, page_xywh)
+            if oplevel == 'region':
+                self._process_segment(tessapi, region, region_image, region_xywh,
+                                      "region '%s'" % region.id, input_file.pageId,
+                                      file_id + '_' + region.id)
+            elif isinstance(region, TextRegionType):
+                lines = region.get_TextLine()
+                if not lines:
+                    LOG.warning("Page '%s' region '%s' contains no text lines",
+                                page_id, region.id)
+                for line in lines:
+                    line_image, line_xywh = self.workspace.image_from_segment(
+                        line, region_image, region_xywh)
+                    self._process_segment(tessapi, line, line_image, line_xywh,
+                                          "line '%s'" % line.id, input_file.pageId,
+                                          file_id + '_' + region.id + '_' + line.id)
+
+    def _process_segment(self, tessapi, segment, image, xywh, where, page_id, file_id):
+        features = xywh['features']
+        if self.parameter['binarize'] and 'binarized' not in features.split(','):
+            set_image(tessapi, image)
+            with stage('threshold'):
+                image = tessapi.GetThresholdedImage()
+            if not image:
+                LOG.error('Cannot binarize %s', where)
+                return
+            features += ',binarized'
+        if not features.strip(','):
+            LOG.info('Nothing to materialize for %s', where)
+            return
+        for alternative_image in segment.get_AlternativeImage():
+            if _features(alternative_image.get_comments()) == _features(features):
+                LOG.info('Image for %s already exists: %s', where,
+                         alternative_image.get_filename())
+                return
+        # update METS (add the image file):
+        file_path = self.workspace.save_image_file(image,
+                                    file_id,
+                                    page_id=page_id,
+                                    file_grp=self.image_grp)
+        # update PAGE (reference the image file):
+        segment.add_AlternativeImage(AlternativeImageType(
+            filename=file_path, comments=features))
+        count('images')
+
+def _features(comments):
+    return set(feature for feature in (comments or '').split(',') if feature)
@@ -0,0 +1,166 @@
+from __future__ import absolute_import
+
+import os
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+from ocrd_utils import getLogger
+
+LOG = getLogger('processor.TesserocrMetrics')
+
+# environment variables enabling metrics (unless the parameters do):
+METRICS_ENV = 'OCRD_TESSEROCR_METRICS'
+TEXTFILE_ENV = 'OCRD_TESSEROCR_METRICS_TEXTFILE'
+
+@contextmanager
+def _nothing():
+    yield
+
+class Metrics(object):
+    """Timings, segment counts and peak memory of a processor run, per page.
+
+    While enabled, ``stage(name)`` measures the wall-clock and CPU time
+    (of the calling thread) spent in a stage like ``Recognize`` or
+    ``to_xml``, and ``count(name)`` counts segments, both for the current
+    page record (from any thread). ``page_done(page_id)`` finishes that
+    record (adding the page's total wall-clock and CPU time of the process,
+    and its peak RSS), and starts the next one. (So work in background
+    threads gets attributed to the page during which it finishes.)
+
+    Finished records get appended as JSON lines to ``path`` by ``emit``
+    (in the parent process only, receiving records from workers), and
+    summed up for the Prometheus textfile ``textfile`` written by ``close``.
+
+    When disabled, ``stage`` and ``count`` do (almost) nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def configure(self, processor):
+        """Enable if the ``metrics`` or ``metrics_textfile`` parameters of ``processor`` (or env vars) are set."""
+        self.path = processor.parameter.get('metrics') or os.environ.get(METRICS_ENV)
+        self.textfile = processor.parameter.get('metrics_textfile') or os.environ.get(TEXTFILE_ENV)
+        self.enabled = bool(self.path or self.textfile)
+        if not self.enabled:
+            return
+        self.processor = processor.ocrd_tool['executable']
+        self.totals = {'pages': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_rss': 0,
+                       'stages': dict(), 'counts': dict()}
+        self._start()
+
+    def _start(self):
+        self.page = {'stages': dict(), 'counts': dict()}
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def stage(self, name):
+        """Get a context manager timing the stage ``name`` for the current page."""
+        if not self.enabled:
+            return _nothing()
+        return self._timer(name)
+
+    @contextmanager
+    def _timer(self, name):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            with self._lock:
+                total = self.page['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+                total['wall'] += wall
+                total['cpu'] += cpu
+                total['calls'] += 1
+
+    def count(self, name, n=1):
+        """Count ``n`` more of ``name`` (e.g. lines) for the current page."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.page['counts'][name] = self.page['counts'].get(name, 0) + n
+
+    def page_done(self, page_id):
+        """Finish the record of the current page, and return it (or None if disabled)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            record = dict(self.page,
+                          processor=self.processor,
+                          page_id=page_id,
+                          pid=os.getpid(),
+                          wall=time.perf_counter() - self._wall,
+                          cpu=time.process_time() - self._cpu,
+                          # (kB on Linux)
+                          peak_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+            self._start()
+        return record
+
+    def emit(self, record):
+        """Write ``record`` as a JSON line and add it to the totals."""
+        if not self.enabled or record is None:
+            return
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        totals = self.totals
+        totals['pages'] += 1
+        totals['wall'] += record['wall']
+        totals['cpu'] += record['cpu']
+        totals['peak_rss'] = max(totals['peak_rss'], record['peak_rss'])
+        for name, stage in record['stages'].items():
+            total = totals['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key in total:
+                total[key] += stage[key]
+        for name, count in record['counts'].items():
+            totals['counts'][name] = totals['counts'].get(name, 0) + count
+
+    def close(self):
+        """Write the totals to the Prometheus textfile (atomically), and disable."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if not self.textfile:
+            return
+        label = 'processor="%s"' % self.processor
+        totals = self.totals
+        lines = ['# TYPE ocrd_tesserocr_pages_total counter',
+                 'ocrd_tesserocr_pages_total{%s} %d' % (label, totals['pages']),
+                 '# TYPE ocrd_tesserocr_page_seconds_total counter',
+                 'ocrd_tesserocr_page_seconds_total{%s,clock="wall"} %f' % (label, totals['wall']),
+                 'ocrd_tesserocr_page_seconds_total{%s,clock="cpu"} %f' % (label, totals['cpu']),
+                 '# TYPE ocrd_tesserocr_stage_seconds_total counter']
+        for name, stage in sorted(totals['stages'].items()):
+            for clock in ['wall', 'cpu']:
+                lines.append('ocrd_tesserocr_stage_seconds_total{%s,stage="%s",clock="%s"} %f' % (
+                    label, name, clock, stage[clock]))
+        lines.append('# TYPE ocrd_tesserocr_stage_calls_total counter')
+        for name, stage in sorted(totals['stages'].items()):
+            lines.append('ocrd_tesserocr_stage_calls_total{%s,stage="%s"} %d' % (
+                label, name, stage['calls']))
+        lines.append('# TYPE ocrd_tesserocr_segments_total counter')
+        for name, count in sorted(totals['counts'].items()):
+            lines.append('ocrd_tesserocr_segments_total{%s,kind="%s"} %d' % (label, name, count))
+        lines.extend(['# TYPE ocrd_tesserocr_peak_rss_bytes gauge',
+                      'ocrd_tesserocr_peak_rss_bytes{%s} %d' % (label, totals['peak_rss'])])
+        with open(self.textfile + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(self.textfile + '.tmp', self.textfile)
+        LOG.info("Wrote metrics of %d pages to '%s'", totals['pages'], self.textfile)
+
+# metrics of the current run (in this process):
+METRICS = Metrics()
+
+def stage(name):
+    """Get a context manager timing the stage ``name`` (see ``Metrics.stage``)."""
+    return METRICS.stage(name)
+
+def count(name, n=1):
+    """Count ``n`` more of ``name`` (see ``Metrics.count``)."""
+    METRICS.count(name, n)
@@ -0,0 +1,290 @@
+from __future__ import absolute_import
+
+import os.path
+from copy import copy, deepcopy
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from ocrd_utils import (
+    getLogger,
+    parse_json_string_or_file,
+    MIME_TO_EXT
+)
+from ocrd import Processor, Workspace
+
+from .config import OCRD_TOOL
+from .executor import process_pages, add_page_file, WORKSPACE_LOCK
+from .metrics import stage
+from .crop import TesserocrCrop
+from .deskew import TesserocrDeskew
+from .binarize import TesserocrBinarize
+from .segment_region import TesserocrSegmentRegion
+from .segment_table import TesserocrSegmentTable
+from .segment_line import TesserocrSegmentLine
+from .segment_word import TesserocrSegmentWord
+from .recognize import TesserocrRecognize
+
+TOOL = 'ocrd-tesserocr-pipeline'
+LOG = getLogger('processor.TesserocrPipeline')
+
+STEPS = OrderedDict([
+    ('crop', TesserocrCrop),
+    ('deskew', TesserocrDeskew),
+    ('binarize', TesserocrBinarize),
+    ('segment-region', TesserocrSegmentRegion),
+    ('segment-table', TesserocrSegmentTable),
+    ('segment-line', TesserocrSegmentLine),
+    ('segment-word', TesserocrSegmentWord),
+    ('recognize', TesserocrRecognize),
+])
+
+# features of AlternativeImages which Workspace.image_from_page and
+# image_from_segment apply by themselves (from Border and @orientation):
+AUTO_FEATURES = {'cropped', 'deskewed', 'rotated-90', 'rotated-180', 'rotated-270'}
+
+class StageWorkspace(Workspace):
+    """Workspace of a pipeline stage, which keeps page and derived images in memory.
+
+    Images saved by the stage get kept in the pipeline (to be used by later
+    stages instead of decoding them again), and only get added to the actual
+    workspace if their fileGrp is to be written. Page images get reused by
+    later stages, too, as long as the page's image annotation (Border,
+    @orientation and AlternativeImages) does not change. Shares the METS
+    with the workspace of the pipeline.
+    """
+
+    def __init__(self, pipeline):
+        workspace = pipeline.workspace
+        super(StageWorkspace, self).__init__(
+            workspace.resolver, workspace.directory,
+            mets=workspace.mets,
+            mets_basename=os.path.basename(workspace.mets_target),
+            baseurl=workspace.baseurl)
+        self.pipeline = pipeline
+
+    def save_image_file(self, image, file_id, file_grp,
+                        page_id=None, mimetype='image/png', force=True):
+        """Keep ``image`` in memory, and add it to the pipeline's workspace if ``file_grp`` is written.
+
+        Return the (relative) path the file is (or would be) stored under.
+        """
+        if file_grp in self.pipeline.image_grps:
+            file_path = self.pipeline.workspace.save_image_file(
+                image, file_id, file_grp,
+                page_id=page_id, mimetype=mimetype, force=force)
+        else:
+            file_path = os.path.join(file_grp, file_id + MIME_TO_EXT[mimetype])
+            self.pipeline.unwritten.add(file_path)
+        self.pipeline.images[file_path] = image
+        return file_path
+
+    def image_from_page(self, page, page_id, **kwargs):
+        """Like ``Workspace.image_from_page``, but with images from memory where possible.
+
+        Reuse the result for the same page annotation and arguments, and
+        serve images saved by earlier stages from memory (see ``_kept_image``).
+        """
+        with stage('image_from_page'), WORKSPACE_LOCK:
+            page, kept = self._without_kept_images(page, kwargs)
+            border = page.get_Border()
+            key = (page_id, page.get_imageFilename(),
+                   border.get_Coords().get_points() if border else None,
+                   page.get_orientation(),
+                   tuple((image.get_filename(), image.get_comments())
+                         for image in page.get_AlternativeImage()),
+                   tuple(sorted(kwargs.items())))
+            if key not in self.pipeline.page_images:
+                self.pipeline.page_images[key] = super(StageWorkspace, self).image_from_page(
+                    page, page_id, **kwargs)
+            page_image, page_coords, page_image_info = self.pipeline.page_images[key]
+            # (stages may modify it)
+            page_coords = dict(page_coords)
+            if kept:
+                page_image, page_coords = self._kept_image(kept, page_coords)
+            return page_image, page_coords, page_image_info
+
+    def image_from_segment(self, segment, parent_image, parent_coords, **kwargs):
+        """Like ``Workspace.image_from_segment``, but with images saved by earlier stages from memory."""
+        with stage('image_from_segment'), WORKSPACE_LOCK:
+            segment, kept = self._without_kept_images(segment, kwargs)
+            segment_image, segment_coords = super(StageWorkspace, self).image_from_segment(
+                segment, parent_image, parent_coords, **kwargs)
+            if kept:
+                segment_image, segment_coords = self._kept_image(kept, segment_coords)
+            return segment_image, segment_coords
+
+    def _without_kept_images(self, segment, kwargs):
+        """Hide the AlternativeImages of ``segment`` which are kept in memory.
+
+        Return a shallow copy of ``segment`` without them (or ``segment``
+        itself if there are none), along with the one among them which
+        ``Workspace.image_from_page`` or ``image_from_segment`` would choose
+        for ``kwargs`` (or None if it would choose another one).
+        """
+        images = segment.get_AlternativeImage()
+        others = [image for image in images if image.get_filename() not in self.pipeline.images]
+        if len(others) == len(images):
+            return segment, None
+        best = _best_image(images, **kwargs)
+        segment = copy(segment)
+        segment.set_AlternativeImage(others)
+        if best is None or best.get_filename() not in self.pipeline.images:
+            best = None
+        return segment, best
+
+    def _kept_image(self, alternative_image, coords):
+        """Get the image of ``alternative_image`` from memory.
+
+        ``coords`` must be the result of ``Workspace.image_from_page`` or
+        ``image_from_segment`` without it, which applies Border and @orientation
+        (and thus gives the coordinate transform for the kept image, too).
+        """
+        features = alternative_image.get_comments() or ''
+        applied = set(features.split(',')) & AUTO_FEATURES
+        expected = set(coords['features'].split(',')) & AUTO_FEATURES
+        if applied != expected:
+            raise Exception("AlternativeImage '%s' (%s) does not match the current Border and @orientation (%s),"
+                            " and cannot be derived anew, because it has not been written"
+                            " (add the step which produced it to file_grps)" % (
+                                alternative_image.get_filename(), ','.join(sorted(applied)) or 'none',
+                                ','.join(sorted(expected)) or 'none'))
+        return self.pipeline.images[alternative_image.get_filename()], dict(coords, features=features)
+
+def _best_image(images, feature_selector='', feature_filter='', filename='', **_):
+    """Choose among AlternativeImages like ``Workspace.image_from_page`` and ``image_from_segment`` do.
+
+    (I.e. the last one with all selected and none of the filtered features,
+    and the most features other than ``AUTO_FEATURES``.)
+    """
+    best = None
+    best_features = set()
+    for image in images:
+        if filename and filename != image.get_filename():
+            continue
+        features = set((image.get_comments() or '').split(','))
+        if (all(feature in features for feature in feature_selector.split(',') if feature) and
+            not any(feature in features for feature in feature_filter.split(',') if feature) and
+            len(features - AUTO_FEATURES) >= len(best_features - AUTO_FEATURES)):
+            best = image
+            best_features = features
+    return best
+
+class TesserocrPipeline(Processor):
+
+    def __init__(self, *args, **kwargs):
+        kwargs['ocrd_tool'] = OCRD_TOOL['tools'][TOOL]
+        kwargs['version'] = OCRD_TOOL['version']
+        super(TesserocrPipeline, self).__init__(*args, **kwargs)
+        # derived images of the current page (by path):
+        self.images = dict()
+        # paths of derived images which are not written:
+        self.unwritten = set()
+        # page images of the current (and prefetched) pages (by page ID, annotation and arguments):
+        # (not in ``images``, which gets cleared while the next pages are prefetched)
+        self.page_images = dict()
+
+    def process(self):
+        """Run several Tesseract processors on the workspace in one pass.
+
+        Set up the processors for each of the ``steps`` (in that order),
+        with their respective parameters from ``step_parameters``, and
+        load their Tesseract instances once for all pages. (Each step
+        keeps its own instance, because steps need differently
+        initialised ones, e.g. OSD for deskewing, or the ``model``
+        for recognition.)
+
+        Open and deserialise PAGE input files and their respective images,
+        then pass the same PAGE hierarchy through all steps in memory.
+        Keep derived images (like cropped or deskewed page images) in memory
+        for the later steps, too, and decode the original image only once
+        per change of the page's Border or @orientation.
+
+        For the steps configured in ``file_grps``, also produce files with
+        the intermediate result in the respective fileGrp (PAGE, and image
+        in the second position for steps which derive images).
+
+        Produce new output files by serialising the final hierarchy,
+        referencing only those derived images which have been written.
+        """
+        self._setup_stages()
+        process_pages(self, self._setup, self._page_image, self._process_page,
+                      file_grp=_page_grp(self.stages[-1][1]))
+
+    def _setup_stages(self):
+        steps = [step.strip() for step in self.parameter['steps'].split(',') if step.strip()]
+        if not steps:
+            raise Exception("no steps configured")
+        for step in steps:
+            if step not in STEPS:
+                raise Exception("unknown step '%s' (must be one of %s)" % (step, ', '.join(STEPS)))
+        if len(set(steps)) < len(steps):
+            raise Exception("steps must not repeat")
+        step_parameters = parse_json_string_or_file(self.parameter['step_parameters'])
+        file_grps = parse_json_string_or_file(self.parameter['file_grps'])
+        for step in list(step_parameters) + list(file_grps):
+            if step not in steps:
+                raise Exception("step '%s' configured but not in steps" % step)
+        self.stages = list()
+        self.image_grps = set()
+        for step in steps:
+            if step == steps[-1]:
+                output_file_grp = self.output_file_grp
+            else:
+                # (placeholder names for unwritten results)
+                output_file_grp = file_grps.get(step, '%s-%s,%s-%s-IMG' % (
+                    self.output_file_grp.split(',')[0], step.upper(),
+                    self.output_file_grp.split(',')[0], step.upper()))
+            step_processor = STEPS[step](
+                StageWorkspace(self),
+                parameter=dict(step_parameters.get(step, {})),
+                input_file_grp=self.input_file_grp,
+                output_file_grp=output_file_grp,
+                page_id=self.page_id)
+            if hasattr(step_processor, 'image_grp') and (step == steps[-1] or step in file_grps):
+                self.image_grps.add(step_processor.image_grp)
+            self.stages.append((step, step_processor, step != steps[-1] and step in file_grps))
+
+    @contextmanager
+    def _setup(self):
+        with ExitStack() as stack:
+            yield [stack.enter_context(step_processor._setup())
+                   for _, step_processor, _ in self.stages]
+
+    def _page_image(self, page, page_id):
+        return self.stages[0][1]._page_image(page, page_id)
+
+    def _process_page(self, tessapis, n, input_file, pcgts, *page_image):
+        page_id = input_file.pageId or input_file.ID
+        self.images.clear()
+        self.unwritten.clear()
+        for i, ((step, step_processor, written), tessapi) in enumerate(zip(self.stages, tessapis)):
+            if i:
+                # derive the image from the result of the previous step:
+                page_image = step_processor._page_image(pcgts.get_Page(), page_id)
+            LOG.info("Running step '%s' on page '%s'", step, page_id)
+            step_processor._process_page(tessapi, n, input_file, pcgts, *page_image)
+            if written:
+                intermediate = deepcopy(pcgts)
+                self._strip_images(intermediate.get_Page())
+                add_page_file(self, n, input_file, intermediate, _page_grp(step_processor))
+        self._strip_images(pcgts.get_Page())
+        self.images.clear()
+        with WORKSPACE_LOCK:
+            # (the next pages may be loaded meanwhile)
+            for key in [key for key in self.page_images if key[0] == page_id]:
+                del self.page_images[key]
+
+    def _strip_images(self, segment):
+        """Remove references to unwritten images from ``segment`` and its descendants."""
+        images = segment.get_AlternativeImage()
+        if images:
+            segment.set_AlternativeImage([image for image in images
+                                          if image.get_filename() not in self.unwritten])
+        for value in vars(segment).values():
+            if isinstance(value, list):
+                for child in value:
+                    if hasattr(child, 'AlternativeImage'):
+                        self._strip_images(child)
+
+def _page_grp(step_processor):
+    return getattr(step_processor, 'page_grp', step_processor.output_file_grp)
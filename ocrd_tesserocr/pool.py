@@ -0,0 +1,68 @@
+from __future__ import absolute_import
+
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+
+class ApiPool(object):
+    """A fixed set of identically configured Tesseract API instances.
+
+    Hands out one instance per task to a pool of worker threads, so
+    independent segments (lines, regions etc.) can be recognized
+    concurrently. (tesserocr releases the GIL during recognition,
+    but each instance must only be used by one thread at a time.)
+
+    Each instance may come with a list of ``cascades`` instances (e.g.
+    with other models), which are exclusive to the thread using it.
+    """
+
+    def __init__(self, tessapis, cascades=None):
+        self.tessapis = list(tessapis)
+        # further instances for each instance (by id):
+        self.cascades = dict()
+        for tessapi, cascade in zip(self.tessapis, cascades or []):
+            self.cascades[id(tessapi)] = list(cascade)
+        self._idle = Queue()
+        for tessapi in self.tessapis:
+            self._idle.put(tessapi)
+        if len(self.tessapis) > 1:
+            self._executor = ThreadPoolExecutor(len(self.tessapis))
+        else:
+            self._executor = None
+
+    def __len__(self):
+        return len(self.tessapis)
+
+    def SetVariable(self, name, value):
+        """Set a Tesseract variable on all instances (including cascades)."""
+        for tessapi in self.tessapis:
+            tessapi.SetVariable(name, value)
+            for other in self.cascades.get(id(tessapi), []):
+                other.SetVariable(name, value)
+
+    def map(self, func, tasks):
+        """Call ``func(tessapi, *task)`` for each tuple in ``tasks``.
+
+        Run concurrently if there is more than one instance,
+        each call using an instance of its own. Return the list
+        of results in the order of ``tasks`` (regardless of the
+        order of completion), and re-raise the first exception.
+        """
+        if not self._executor:
+            return [func(self.tessapis[0], *task) for task in tasks]
+        def run(task):
+            tessapi = self._idle.get()
+            try:
+                return func(tessapi, *task)
+            finally:
+                self._idle.put(tessapi)
+        return list(self._executor.map(run, tasks))
+
+    def cascade(self, tessapi):
+        """Get the further instances which come with ``tessapi``."""
+        return self.cascades.get(id(tessapi), [])
+
+    def close(self):
+        """Stop the worker threads (but leave the instances alive)."""
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
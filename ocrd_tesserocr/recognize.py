@@ -1,26 +1,32 @@
 from __future__ import absolute_import
 import os.path
 import itertools
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
 
 from tesserocr import (
-    RIL, PSM,
-    PyTessBaseAPI, get_languages)
+    RIL, PSM, PT,
+    PyTessBaseAPI, get_languages,
+    tesseract_version)
 
 from ocrd_utils import (
     getLogger,
-    concat_padded,
     points_from_polygon,
     polygon_from_x0y0x1y1,
     coordinates_for_segment,
-    MIMETYPE_PAGE
+    coordinates_of_segment,
+    parse_json_string_or_file,
+    membername
 )
 from ocrd_models.ocrd_page import (
     CoordsType,
+    TextRegionType, TextLineType,
+    ImageRegionType, MathsRegionType,
+    SeparatorRegionType, NoiseRegionType,
     GlyphType, WordType,
     LabelType, LabelsType,
     MetadataItemType,
-    TextEquivType, TextStyleType,
-    to_xml)
+    TextEquivType, TextStyleType)
 from ocrd_models.ocrd_page_generateds import (
     TableRegionType,
     TextTypeSimpleType,
@@ -34,23 +40,72 @@ from ocrd_models.ocrd_page_generateds import (
     UnorderedGroupIndexedType,
     ReadingOrderType
 )
-from ocrd_modelfactory import page_from_file
 from ocrd import Processor
 
 from .config import TESSDATA_PREFIX, OCRD_TOOL
+from .pool import ApiPool
+from .executor import process_pages, forks_workers
+from .image import set_image, is_blank
+from .cache import ResultCache, result_key, file_digest
+from .metrics import stage, count
 
 TOOL = 'ocrd-tesserocr-recognize'
 LOG = getLogger('processor.TesserocrRecognize')
 
 CHOICE_THRESHOLD_NUM = 6 # maximum number of choices to query and annotate
 CHOICE_THRESHOLD_CONF = 0.2 # maximum score drop from best choice to query and annotate
+# populate GetChoiceIterator() with LSTM models, too:
+CHOICE_VARIABLES = [("lstm_choice_mode", "2"), # aggregate symbols
+                    ("lstm_choice_iterations", "15")] # squeeze out more best paths
+# named sets of Tesseract variables trading accuracy for speed (parameter ``profile``),
+# to be evaluated against ground truth with benchmarks/eval_profiles.py:
+VARIABLE_PROFILES = OrderedDict([
+    ('default', []),
+    # no dictionaries in the LSTM beam search (only loadable at init):
+    ('no_dictionary', [("load_system_dawg", "0"),
+                       ("load_freq_dawg", "0")]),
+    # no correction of words by character bigrams:
+    ('no_bigram', [("tessedit_enable_bigram_correction", "0")]),
+    # no removal of small blobs during layout analysis:
+    ('no_noise_removal', [("enable_noise_removal", "0")]),
+    # all of the above, and no punctuation/number/unambiguous-word dictionaries either:
+    ('fast', [("load_system_dawg", "0"),
+              ("load_freq_dawg", "0"),
+              ("load_punc_dawg", "0"),
+              ("load_number_dawg", "0"),
+              ("load_unambig_dawg", "0"),
+              ("load_bigram_dawg", "0"),
+              ("tessedit_enable_bigram_correction", "0"),
+              ("enable_noise_removal", "0")]),
+])
+
+# suffixes of the PageType accessors for all kinds of regions:
+REGION_TYPES = ['Advert', 'Chart', 'Chem', 'Custom', 'Graphic', 'Image', 'LineDrawing',
+                'Maths', 'Music', 'Noise', 'Separator', 'Table', 'Text', 'Unknown']
 
 class TesserocrRecognize(Processor):
 
     def __init__(self, *args, **kwargs):
         kwargs['ocrd_tool'] = OCRD_TOOL['tools'][TOOL]
         kwargs['version'] = OCRD_TOOL['version']
+        # Tesseract instances kept alive across runs (e.g. by the server):
+        self.api_cache = kwargs.pop('api_cache', None)
         super(TesserocrRecognize, self).__init__(*args, **kwargs)
+        # image (and rectangle) currently set in each Tesseract instance
+        # (for ``rectangles`` and ``cache``):
+        self._images = dict()
+        self._rectangles = dict()
+        # results of earlier runs (while set up):
+        self._cache = None
+        self._cache_config = None
+        # pool of instances (while set up, for ``model_cascade``):
+        self._pool = None
+        # pools for the models of ``model_routing`` (loaded on first use),
+        # and the model of each of their instances (by id):
+        self._routing = dict()
+        self._routed_pools = dict()
+        self._routed_models = dict()
+        self._routed_stack = None
 
     def process(self):
         """Perform OCR recognition with Tesseract on the workspace.
@@ -62,10 +117,53 @@ class TesserocrRecognize(Processor):
         (remove any existing segmentation below the line level, and)
         create new segmentation below the line level if necessary.
         
+        If ``segmentation_level`` is ``region``, then instead remove any
+        existing segmentation, and recognise the whole page image at once.
+        Walk the result from the block level down to the ``textequiv_level``,
+        adding regions (with a new ReadingOrder) and, as appropriate, lines,
+        words and glyphs, each with coordinates and TextEquiv from the same
+        Tesseract pass.
+        
         Set up Tesseract to recognise each segment's image (either from
         AlternativeImage or cropping the bounding box rectangle and masking
         it from the polygon outline) with the appropriate mode and ``model``.
         
+        If ``rectangles`` is enabled, then instead of cropping a new image
+        for each segment, address segments within their parent's image
+        via SetRectangle whenever they are axis-aligned rectangles without
+        images of their own (setting the parent image only once).
+        
+        If ``cache`` is set, then look up the results for each segment
+        in that database first (by image content, model checksums, page
+        segmentation mode and variables), skipping Tesseract if found,
+        or store them there afterwards.
+        
+        If ``threads`` is larger than 1, then set up as many identical
+        Tesseract instances, and recognise the lines (or regions) of each
+        page concurrently. (The results are the same as in a serial run.)
+        
+        If ``textequiv_level`` is ``glyph`` and ``adaptive_choices`` is set,
+        then recognise without glyph alternatives first, and only recognise
+        words with a confidence below ``adaptive_choices`` again in
+        Tesseract's (expensive) LSTM choice mode to annotate alternatives.
+        (Confident words only get their best glyph. With ``segmentation_level``
+        ``region``, no words get alternatives then.)
+        
+        If ``model_cascade`` is set (instead of ``model``), then load an
+        instance for each of its (comma-separated) models, and recognise
+        each segment with the first one. As long as the confidence stays
+        below ``cascade_threshold``, recognise it again with the next one,
+        keeping the result with the highest confidence. (This does not
+        apply to ``segmentation_level=region``, which uses the first model.)
+        
+        If ``model_routing`` maps the ``primaryScript`` or ``primaryLanguage``
+        of a line (or else, its region) to some model, then recognise it with
+        an instance of that model instead (loading them on first use, and
+        keeping them for the whole run). This allows mixed-script pages
+        (e.g. with script detected by ``ocrd-tesserocr-deskew``) without
+        a slow combined model. (This does not apply to ``segmentation_level=region``
+        either.)
+        
         Put text and confidence results into the TextEquiv at ``textequiv_level``,
         removing any existing TextEquiv.
         
@@ -76,248 +174,641 @@ class TesserocrRecognize(Processor):
         
         Produce new output files by serialising the resulting hierarchy.
         """
-        LOG.debug("TESSDATA: %s, installed Tesseract models: %s", *get_languages())
-        maxlevel = self.parameter['textequiv_level']
-        model = get_languages()[1][-1] # last installed model
-        if 'model' in self.parameter:
+        model = self._model()
+        process_pages(self, lambda: self._setup(model), self._page_image, self._process_page)
+
+    def _model(self):
+        """Determine the configured (or last installed) model, and check it is installed.
+        
+        For ``model_cascade``, return all its models (separated by comma).
+        """
+        tessdata, models = get_languages()
+        LOG.debug("TESSDATA: %s, installed Tesseract models: %s", tessdata, models)
+        model = models[-1] # last installed model
+        if self.parameter['model_cascade']:
+            if 'model' in self.parameter:
+                raise Exception("model and model_cascade are mutually exclusive")
+            model = ','.join(cascade_model.strip()
+                             for cascade_model in self.parameter['model_cascade'].split(','))
+        elif 'model' in self.parameter:
             model = self.parameter['model']
-            for sub_model in model.split('+'):
-                if sub_model not in get_languages()[1]:
+        if model != models[-1]:
+            for sub_model in model.replace(',', '+').split('+'):
+                if sub_model not in models:
                     raise Exception("configured model " + sub_model + " is not installed")
+        LOG.info("Using model '%s' in %s for recognition at the %s level",
+                 model, tessdata, self.parameter['textequiv_level'])
+        return model
+
+    def _model_routing(self):
+        """Parse ``model_routing``, and check all its models are installed."""
+        _, models = get_languages()
+        routing = parse_json_string_or_file(self.parameter['model_routing'])
+        for key, model in routing.items():
+            if not isinstance(model, str) or ',' in model:
+                raise Exception("model_routing for '%s' must be a single model (or combined with +)" % key)
+            for sub_model in model.split('+'):
+                if sub_model not in models:
+                    raise Exception("routed model " + sub_model + " is not installed")
+        if routing:
+            LOG.info("Routing to models by script or language: %s", str(routing))
+        return routing
+
+    @contextmanager
+    def _setup(self, model=None):
+        if model is None:
+            model = self._model()
+        with ExitStack() as stack:
+            if self.api_cache is not None and not forks_workers(self):
+                # reuse warm instances with the same configuration from earlier runs
+                # (not in forked workers, which would each load their own anyway,
+                #  and where the threads of a cached pool do not exist):
+                key = (model, tuple(self._variables()), self.parameter['threads'])
+                pool = stack.enter_context(self.api_cache.get(key, lambda: self._setup_pool(model)))
+            else:
+                pool = stack.enter_context(self._setup_pool(model))
+            self._pool = pool
+            stack.callback(setattr, self, '_pool', None)
+            self._routing = self._model_routing()
+            self._routed_stack = stack.enter_context(ExitStack())
+            stack.callback(self._routed_pools.clear)
+            stack.callback(self._routed_models.clear)
+            if self.parameter['cache']:
+                self._cache = stack.enter_context(ResultCache(
+                    self.parameter['cache'], self.parameter['cache_size'] * 1024 * 1024))
+                stack.callback(setattr, self, '_cache', None)
+                self._cache_config = [
+                    tesseract_version(), model, _model_digests(model),
+                    self._variables(), self.parameter['textequiv_level'],
+                    self.parameter['adaptive_choices']]
+                if ',' in model:
+                    self._cache_config.append(self.parameter['cascade_threshold'])
+            yield pool
+
+    @contextmanager
+    def _setup_pool(self, model):
+        models = model.split(',')
+        # (some of these only take effect when loading the model:)
+        init_variables = dict(self._profile_variables())
+        with ExitStack() as stack:
+            threads = range(self.parameter['threads'])
+            pool = ApiPool([stack.enter_context(PyTessBaseAPI(path=TESSDATA_PREFIX, lang=models[0],
+                                                              variables=init_variables))
+                            for _ in threads],
+                           # the later models of model_cascade, for each thread:
+                           [[stack.enter_context(PyTessBaseAPI(path=TESSDATA_PREFIX, lang=later,
+                                                               variables=init_variables))
+                             for later in models[1:]]
+                            for _ in threads])
+            stack.callback(pool.close)
+            for name in init_variables:
+                if pool.tessapis[0].GetVariableAsString(name) is None:
+                    raise Exception("unknown Tesseract variable '%s'" % name)
+            for name, value in self._variables():
+                pool.SetVariable(name, value)
+            yield pool
+
+    def _routed_pool(self, pool, model):
+        """Get the pool of instances for ``model`` (loading it on first use), or ``pool`` if None.
+
+        (Copy the page's DPI setting from ``pool``.)
+        """
+        if model is None:
+            return pool
+        if model not in self._routed_pools:
+            LOG.info("Loading routed model '%s'", model)
+            routed = self._routed_stack.enter_context(self._setup_pool(model))
+            # (key cached results by the model files, not just their name:)
+            routed_model = [model, _model_digests(model)] if self._cache is not None else model
+            for tessapi in routed.tessapis:
+                self._routed_models[id(tessapi)] = routed_model
+            self._routed_pools[model] = routed
+        routed = self._routed_pools[model]
+        routed.SetVariable('user_defined_dpi', pool.tessapis[0].GetVariableAsString('user_defined_dpi'))
+        return routed
+
+    def _route(self, *segments):
+        """Get the model for the first of ``segments`` whose script or language is in ``model_routing``.
+
+        Try both the full value (e.g. ``Latf - Latin (Fraktur variant)``)
+        and the code (e.g. ``Latf``). Return None if there is no match.
+        """
+        for segment in segments:
+            for value in [segment.get_primaryScript(), segment.get_primaryLanguage()]:
+                if not value:
+                    continue
+                for key in [value, value.split(' - ')[0]]:
+                    if key in self._routing:
+                        return self._routing[key]
+        return None
+
+    def _variables(self):
+        """List the Tesseract variables (name, value) implied by the parameters."""
+        variables = list()
+        if self.parameter['textequiv_level'] == 'glyph' and not self.parameter['adaptive_choices']:
+            variables.extend(CHOICE_VARIABLES)
+        # TODO: maybe warn/raise when illegal combinations or characters not in the model unicharset?
+        if self.parameter['char_whitelist']:
+            variables.append(("tessedit_char_whitelist", self.parameter['char_whitelist']))
+        if self.parameter['char_blacklist']:
+            variables.append(("tessedit_char_blacklist", self.parameter['char_blacklist']))
+        if self.parameter['char_unblacklist']:
+            variables.append(("tessedit_char_unblacklist", self.parameter['char_unblacklist']))
+        # last, so they can override the above:
+        variables.extend(self._profile_variables())
+        return variables
+
+    def _profile_variables(self):
+        """List the Tesseract variables (name, value) of ``profile`` and ``tesseract_variables``."""
+        variables = list(VARIABLE_PROFILES[self.parameter['profile']])
+        custom = parse_json_string_or_file(self.parameter['tesseract_variables'])
+        variables.extend((name, str(value)) for name, value in sorted(custom.items()))
+        return variables
+
+    def _page_image(self, page, page_id):
+        return self.workspace.image_from_page(page, page_id)
+
+    def _process_page(self, pool, n, input_file, pcgts,
+                      page_image, page_xywh, page_image_info):
+        page_id = input_file.pageId or input_file.ID
+        page = pcgts.get_Page()
         
-        with PyTessBaseAPI(path=TESSDATA_PREFIX, lang=model) as tessapi:
-            LOG.info("Using model '%s' in %s for recognition at the %s level",
-                     model, get_languages()[0], maxlevel)
-            if maxlevel == 'glyph':
-                # populate GetChoiceIterator() with LSTM models, too:
-                tessapi.SetVariable("lstm_choice_mode", "2") # aggregate symbols
-                tessapi.SetVariable("lstm_choice_iterations", "15") # squeeze out more best paths
-            # TODO: maybe warn/raise when illegal combinations or characters not in the model unicharset?
-            if self.parameter['char_whitelist']:
-                tessapi.SetVariable("tessedit_char_whitelist", self.parameter['char_whitelist'])
-            if self.parameter['char_blacklist']:
-                tessapi.SetVariable("tessedit_char_blacklist", self.parameter['char_blacklist'])
-            if self.parameter['char_unblacklist']:
-                tessapi.SetVariable("tessedit_char_unblacklist", self.parameter['char_unblacklist'])
-            # todo: determine relevancy of these variables:
-            # tessapi.SetVariable("tessedit_single_match", "0")
-            #
-            # tessedit_load_sublangs
-            # tessedit_preserve_min_wd_len 2
-            # tessedit_prefer_joined_punct 0
-            # tessedit_write_rep_codes 0
-            # tessedit_parallelize 0
-            # tessedit_zero_rejection 0
-            # tessedit_zero_kelvin_rejection 0
-            # tessedit_reject_mode 0
-            # tessedit_use_reject_spaces 1
-            # tessedit_fix_fuzzy_spaces 1
-            # tessedit_char_blacklist
-            # tessedit_char_whitelist
-            # chs_leading_punct ('`"
-            # chs_trailing_punct1 ).,;:?!
-            # chs_trailing_punct2 )'`"
-            # numeric_punctuation .,
-            # unrecognised_char |
-            # ok_repeated_ch_non_alphanum_wds -?*=
-            # conflict_set_I_l_1 Il1[]
-            # preserve_interword_spaces 0
-            # tessedit_enable_dict_correction 0
-            # tessedit_enable_bigram_correction 1
-            # stopper_smallword_size 2
-            # wordrec_max_join_chunks 4
-            # suspect_space_level 100
-            # suspect_short_words 2
-            # language_model_ngram_on 0
-            # language_model_ngram_order 8
-            # language_model_min_compound_length 3
-            # language_model_penalty_non_freq_dict_word 0.1
-            # language_model_penalty_non_dict_word 0.15
-            # language_model_penalty_punc 0.2
-            # language_model_penalty_case 0.1
-            # language_model_penalty_script 0.5
-            # language_model_penalty_chartype 0.3
-            # language_model_penalty_spacing 0.05
-            # textord_max_noise_size 7
-            # enable_noise_removal 1
-            # classify_bln_numeric_mode 0
-            # lstm_use_matrix 1
-            # user_words_file
-            # user_patterns_file
-            for (n, input_file) in enumerate(self.input_files):
-                page_id = input_file.pageId or input_file.ID
-                LOG.info("INPUT FILE %i / %s", n, page_id)
-                pcgts = page_from_file(self.workspace.download_file(input_file))
-                page = pcgts.get_Page()
-                
-                # add metadata about this operation and its runtime parameters:
-                metadata = pcgts.get_Metadata() # ensured by from_file()
-                metadata.add_MetadataItem(
-                    MetadataItemType(type_="processingStep",
-                                     name=self.ocrd_tool['steps'][0],
-                                     value=TOOL,
-                                     Labels=[LabelsType(
-                                         externalModel="ocrd-tool",
-                                         externalId="parameters",
-                                         Label=[LabelType(type_=name,
-                                                          value=self.parameter[name])
-                                                for name in self.parameter.keys()])]))
-                page_image, page_xywh, page_image_info = self.workspace.image_from_page(
-                    page, page_id)
-                if self.parameter['dpi'] > 0:
-                    dpi = self.parameter['dpi']
-                    LOG.info("Page '%s' images will use %d DPI from paramter override", page_id, dpi)
-                elif page_image_info.resolution != 1:
-                    dpi = page_image_info.resolution
-                    if page_image_info.resolutionUnit == 'cm':
-                        dpi = round(dpi * 2.54)
-                    LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
-                else:
-                    dpi = 0
-                    LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
-                if dpi:
-                    tessapi.SetVariable('user_defined_dpi', str(dpi))
-                
-                LOG.info("Processing page '%s'", page_id)
-                regions = itertools.chain.from_iterable(
-                    [page.get_TextRegion()] +
-                    [subregion.get_TextRegion() for subregion in page.get_TableRegion()])
-                if not regions:
-                    LOG.warning("Page '%s' contains no text regions", page_id)
+        # add metadata about this operation and its runtime parameters:
+        metadata = pcgts.get_Metadata() # ensured by from_file()
+        metadata.add_MetadataItem(
+            MetadataItemType(type_="processingStep",
+                             name=self.ocrd_tool['steps'][0],
+                             value=TOOL,
+                             Labels=[LabelsType(
+                                 externalModel="ocrd-tool",
+                                 externalId="parameters",
+                                 Label=[LabelType(type_=name,
+                                                  value=self.parameter[name])
+                                        for name in self.parameter.keys()])]))
+        if self.parameter['dpi'] > 0:
+            dpi = self.parameter['dpi']
+            LOG.info("Page '%s' images will use %d DPI from paramter override", page_id, dpi)
+        elif page_image_info.resolution != 1:
+            dpi = page_image_info.resolution
+            if page_image_info.resolutionUnit == 'cm':
+                dpi = round(dpi * 2.54)
+            LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
+        else:
+            dpi = 0
+            LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
+        # (also reset when unknown, so the result does not depend
+        #  on which pages the instance has processed before)
+        pool.SetVariable('user_defined_dpi', str(dpi))
+        
+        LOG.info("Processing page '%s'", page_id)
+        if self._cache:
+            hits, misses = self._cache.hits, self._cache.misses
+        if self.parameter['segmentation_level'] == 'region':
+            page_remove_regions(page)
+            # one pass over the whole page (i.e. one instance of the pool):
+            pool.map(self._process_page_layout, [(page, page_image, page_xywh)])
+        else:
+            regions = itertools.chain.from_iterable(
+                [page.get_TextRegion()] +
+                [subregion.get_TextRegion() for subregion in page.get_TableRegion()])
+            if not regions:
+                LOG.warning("Page '%s' contains no text regions", page_id)
+            else:
+                self._process_regions(pool, regions, page_image, page_xywh)
+        if self._cache:
+            LOG.info("Page '%s' used %d cached results (and %d cache misses)", page_id,
+                     self._cache.hits - hits, self._cache.misses - misses)
+        with stage('update_textequiv'):
+            page_update_higher_textequiv_levels(self.parameter['textequiv_level'], pcgts)
+
+    def _process_page_layout(self, tessapi, page, page_image, page_xywh):
+        if is_blank(page_image, self.parameter['blank_threshold']):
+            LOG.info("Page is blank, not recognizing")
+            count('blank')
+            return
+        set_image(tessapi, page_image) # is already cropped to Border
+        self._images[id(tessapi)] = page_image
+        self._rectangles[id(tessapi)] = None
+        tessapi.SetPageSegMode(PSM.AUTO)
+        LOG.debug("Recognizing text in page")
+        with stage('Recognize'):
+            tessapi.Recognize()
+        with stage('decode'):
+            self._decode_page_layout(tessapi.GetIterator(), page, page_image, page_xywh)
+
+    def _decode_page_layout(self, result_it, page, page_image, page_xywh):
+        og = OrderedGroupType(id="reading-order")
+        index = 0
+        while result_it and not result_it.Empty(RIL.BLOCK):
+            ID = "region%04d" % index
+            bbox = result_it.BoundingBox(RIL.BLOCK)
+            # convert to absolute coordinates:
+            polygon = coordinates_for_segment(polygon_from_x0y0x1y1(bbox),
+                                              page_image, page_xywh)
+            coords = CoordsType(points_from_polygon(polygon))
+            block_type = result_it.BlockType()
+            LOG.debug("Decoding %s block '%s'", membername(PT, block_type), ID)
+            if block_type in [PT.FLOWING_TEXT,
+                              PT.HEADING_TEXT,
+                              PT.PULLOUT_TEXT,
+                              PT.CAPTION_TEXT,
+                              # (as a TextRegion, because it has been
+                              #  recognized as a single text block here)
+                              PT.TABLE,
+                              PT.VERTICAL_TEXT]:
+                region = TextRegionType(id=ID, Coords=coords, type_={
+                    PT.HEADING_TEXT: TextTypeSimpleType.HEADING,
+                    PT.PULLOUT_TEXT: TextTypeSimpleType.FLOATING,
+                    PT.CAPTION_TEXT: TextTypeSimpleType.CAPTION
+                }.get(block_type, TextTypeSimpleType.PARAGRAPH))
+                page.add_TextRegion(region)
+                og.add_RegionRefIndexed(RegionRefIndexedType(regionRef=ID, index=index))
+                if self.parameter['textequiv_level'] == 'region':
+                    region.add_TextEquiv(TextEquivType(
+                        Unicode=result_it.GetUTF8Text(RIL.BLOCK).rstrip("\n\f"),
+                        conf=result_it.Confidence(RIL.BLOCK)/100))
                 else:
-                    self._process_regions(tessapi, regions, page_image, page_xywh)
-                page_update_higher_textequiv_levels(maxlevel, pcgts)
-                
-                # Use input_file's basename for the new file -
-                # this way the files retain the same basenames:
-                file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)
-                if file_id == input_file.ID:
-                    file_id = concat_padded(self.output_file_grp, n)
-                self.workspace.add_file(
-                    ID=file_id,
-                    file_grp=self.output_file_grp,
-                    pageId=input_file.pageId,
-                    mimetype=MIMETYPE_PAGE,
-                    local_filename=os.path.join(self.output_file_grp,
-                                                file_id + '.xml'),
-                    content=to_xml(pcgts))
-
-    def _process_regions(self, tessapi, regions, page_image, page_xywh):
+                    self._process_lines_in_region(result_it, region, page_xywh)
+            elif block_type in [PT.FLOWING_IMAGE,
+                                PT.HEADING_IMAGE,
+                                PT.PULLOUT_IMAGE]:
+                page.add_ImageRegion(ImageRegionType(id=ID, Coords=coords))
+                og.add_RegionRefIndexed(RegionRefIndexedType(regionRef=ID, index=index))
+            elif block_type in [PT.INLINE_EQUATION,
+                                PT.EQUATION]:
+                page.add_MathsRegion(MathsRegionType(id=ID, Coords=coords))
+                og.add_RegionRefIndexed(RegionRefIndexedType(regionRef=ID, index=index))
+            elif block_type in [PT.HORZ_LINE,
+                                PT.VERT_LINE]:
+                page.add_SeparatorRegion(SeparatorRegionType(id=ID, Coords=coords))
+            else:
+                page.add_NoiseRegion(NoiseRegionType(id=ID, Coords=coords))
+            index += 1
+            result_it.Next(RIL.BLOCK)
+        if og.get_RegionRefIndexed():
+            # (schema forbids empty OrderedGroup)
+            page.set_ReadingOrder(ReadingOrderType(OrderedGroup=og))
+        else:
+            LOG.warning("No text in page")
+
+    def _process_lines_in_region(self, result_it, region, page_xywh):
+        if result_it.Empty(RIL.TEXTLINE):
+            LOG.warning("No text in region '%s'", region.id)
+            return
+        # iterate until IsAtFinalElement(RIL.BLOCK, RIL.TEXTLINE):
+        line_no = 0
+        while result_it and not result_it.Empty(RIL.TEXTLINE):
+            line_id = '%s_line%04d' % (region.id, line_no)
+            LOG.debug("Decoding text in line '%s'", line_id)
+            bbox = result_it.BoundingBox(RIL.TEXTLINE)
+            # convert to absolute coordinates:
+            polygon = coordinates_for_segment(polygon_from_x0y0x1y1(bbox),
+                                              None, page_xywh)
+            line = TextLineType(id=line_id, Coords=CoordsType(points_from_polygon(polygon)))
+            region.add_TextLine(line)
+            if self.parameter['textequiv_level'] == 'line':
+                line.add_TextEquiv(TextEquivType(
+                    Unicode=result_it.GetUTF8Text(RIL.TEXTLINE).rstrip("\n"),
+                    conf=result_it.Confidence(RIL.TEXTLINE)/100))
+            else:
+                # (leaves the iterator at the last word of the line)
+                self._process_words_in_line(result_it, line, page_xywh)
+            if result_it.IsAtFinalElement(RIL.BLOCK, RIL.TEXTLINE):
+                break
+            else:
+                line_no += 1
+                result_it.Next(RIL.TEXTLINE)
+
+    def _process_regions(self, pool, regions, page_image, page_xywh):
+        # collect independent tasks (with their parent images) first,
+        # then distribute them over the pool of Tesseract instances:
+        # (grouped by routed model, None for the default)
+        # decode the parent images here, because lazily opened images
+        # must not be accessed by several threads at once (e.g. when
+        # they all set the same page image for ``rectangles``)
+        page_image.load()
+        region_tasks = OrderedDict()
+        line_tasks = OrderedDict()
         for region in regions:
-            region_image, region_xywh = self.workspace.image_from_segment(
-                region, page_image, page_xywh)
             if self.parameter['textequiv_level'] == 'region':
-                tessapi.SetImage(region_image)
-                tessapi.SetPageSegMode(PSM.SINGLE_BLOCK)
-                #if region.get_primaryScript() not in tessapi.GetLoadedLanguages()...
-                LOG.debug("Recognizing text in region '%s'", region.id)
-                region_text = tessapi.GetUTF8Text().rstrip("\n\f")
-                region_conf = tessapi.MeanTextConf()/100.0 # iterator scores are arithmetic averages, too
-                if region.get_TextEquiv():
-                    LOG.warning("Region '%s' already contained text results", region.id)
-                    region.set_TextEquiv([])
-                # todo: consider SetParagraphSeparator
-                region.add_TextEquiv(TextEquivType(Unicode=region_text, conf=region_conf))
+                region_tasks.setdefault(self._route(region), []).append(
+                    (region, page_image, page_xywh))
                 continue # next region (to avoid indentation below)
             ## line, word, or glyph level:
+            region_image, region_xywh = self.workspace.image_from_segment(
+                region, page_image, page_xywh)
+            region_image.load()
             textlines = region.get_TextLine()
             if not textlines:
                 LOG.warning("Region '%s' contains no text lines", region.id)
             else:
-                self._process_lines(tessapi, textlines, region_image, region_xywh)
-
-    def _process_lines(self, tessapi, textlines, region_image, region_xywh):
-        for line in textlines:
-            if self.parameter['overwrite_words']:
-                line.set_Word([])
-            line_image, line_xywh = self.workspace.image_from_segment(
-                line, region_image, region_xywh)
-            # todo: Tesseract works better if the line images have a 5px margin everywhere
-            tessapi.SetImage(line_image)
-            if self.parameter['raw_lines']:
-                tessapi.SetPageSegMode(PSM.RAW_LINE)
-            else:
-                tessapi.SetPageSegMode(PSM.SINGLE_LINE)
-            #if line.get_primaryScript() not in tessapi.GetLoadedLanguages()...
-            LOG.debug("Recognizing text in line '%s'", line.id)
-            if self.parameter['textequiv_level'] == 'line':
-                line_text = tessapi.GetUTF8Text().rstrip("\n\f")
-                line_conf = tessapi.MeanTextConf()/100.0 # iterator scores are arithmetic averages, too
-                if line.get_TextEquiv():
-                    LOG.warning("Line '%s' already contained text results", line.id)
-                    line.set_TextEquiv([])
-                # todo: consider BlankBeforeWord, SetLineSeparator
-                line.add_TextEquiv(TextEquivType(Unicode=line_text, conf=line_conf))
-                continue # next line (to avoid indentation below)
-            ## word, or glyph level:
-            words = line.get_Word()
-            if words:
-                ## external word layout:
-                LOG.warning("Line '%s' contains words already, recognition might be suboptimal", line.id)
-                self._process_existing_words(tessapi, words, line_image, line_xywh)
+                for line in textlines:
+                    line_tasks.setdefault(self._route(line, region), []).append(
+                        (line, region_image, region_xywh))
+        # each task only modifies its own segment, so the results
+        # do not depend on the order in which they get processed:
+        for model, tasks in region_tasks.items():
+            self._routed_pool(pool, model).map(self._process_region, tasks)
+        for model, tasks in line_tasks.items():
+            self._routed_pool(pool, model).map(self._process_line, tasks)
+
+    def _process_region(self, tessapi, region, page_image, page_xywh):
+        self._set_segment_image(tessapi, region, page_image, page_xywh)
+        tessapi.SetPageSegMode(PSM.SINGLE_BLOCK)
+        LOG.debug("Recognizing text in region '%s'", region.id)
+        count('regions')
+        if id(tessapi) in self._routed_models:
+            count('routed')
+        if self._is_blank(tessapi):
+            LOG.info("Region '%s' is blank, not recognizing", region.id)
+            count('blank')
+            region_text, region_conf = '', 1.0
+        else:
+            region_text, region_conf = self._recognize(tessapi, self._recognize_text)
+        if region.get_TextEquiv():
+            LOG.warning("Region '%s' already contained text results", region.id)
+            region.set_TextEquiv([])
+        # todo: consider SetParagraphSeparator
+        region.add_TextEquiv(TextEquivType(Unicode=region_text, conf=region_conf))
+
+    def _process_line(self, tessapi, line, region_image, region_xywh):
+        if self.parameter['overwrite_words']:
+            line.set_Word([])
+        line_image, line_xywh = self._set_segment_image(
+            tessapi, line, region_image, region_xywh)
+        # todo: Tesseract works better if the line images have a 5px margin everywhere
+        if self.parameter['raw_lines']:
+            tessapi.SetPageSegMode(PSM.RAW_LINE)
+        else:
+            tessapi.SetPageSegMode(PSM.SINGLE_LINE)
+        LOG.debug("Recognizing text in line '%s'", line.id)
+        count('lines')
+        if id(tessapi) in self._routed_models:
+            count('routed')
+        blank = self._is_blank(tessapi)
+        if blank:
+            LOG.info("Line '%s' is blank, not recognizing", line.id)
+            count('blank')
+        if self.parameter['textequiv_level'] == 'line':
+            if blank:
+                line_text, line_conf = '', 1.0
             else:
-                ## internal word and glyph layout:
-                tessapi.Recognize()
-                self._process_words_in_line(tessapi.GetIterator(), line, line_xywh)
+                line_text, line_conf = self._recognize(tessapi, self._recognize_text)
+            if line.get_TextEquiv():
+                LOG.warning("Line '%s' already contained text results", line.id)
+                line.set_TextEquiv([])
+            # todo: consider BlankBeforeWord, SetLineSeparator
+            line.add_TextEquiv(TextEquivType(Unicode=line_text, conf=line_conf))
+            return
+        ## word, or glyph level:
+        words = line.get_Word()
+        if words:
+            ## external word layout:
+            LOG.warning("Line '%s' contains words already, recognition might be suboptimal", line.id)
+            self._process_existing_words(tessapi, words, line_image, line_xywh)
+        elif not blank:
+            ## internal word and glyph layout:
+            def recognize_words(tessapi):
+                with stage('Recognize'):
+                    tessapi.Recognize()
+                with stage('decode'):
+                    words = self._decode_words_in_line(tessapi.GetIterator(), line.id)
+                if self.parameter['textequiv_level'] == 'glyph' and self.parameter['adaptive_choices']:
+                    self._recognize_uncertain_words(tessapi, words, line.id)
+                return words
+            self._annotate_words(line, self._recognize(tessapi, recognize_words), line_xywh)
+
+    def _recognize_uncertain_words(self, tessapi, words, line_id):
+        """Recognise the words below ``adaptive_choices`` confidence again, with glyph alternatives.
+        
+        Restrict ``tessapi`` to the bounding box of each such word (within
+        the current image), and replace its glyphs (and text) with the result
+        in LSTM choice mode. Restore the previous mode and rectangle afterwards.
+        """
+        uncertain = [(word_no, word) for word_no, word in enumerate(words)
+                     if word['conf'] < self.parameter['adaptive_choices']]
+        if not uncertain:
+            return
+        LOG.debug("Recognizing %d of %d words in line '%s' with glyph alternatives",
+                  len(uncertain), len(words), line_id)
+        mode = tessapi.GetPageSegMode()
+        with choice_mode(tessapi):
+            tessapi.SetPageSegMode(PSM.SINGLE_WORD)
+            for word_no, word in uncertain:
+                left, top, right, bottom = word['bbox']
+                tessapi.SetRectangle(left, top, right - left, bottom - top)
+                with stage('Recognize'):
+                    tessapi.Recognize()
+                result_it = tessapi.GetIterator()
+                if not result_it or result_it.Empty(RIL.WORD):
+                    continue # keep the result without alternatives
+                with stage('decode'):
+                    word['text'] = result_it.GetUTF8Text(RIL.WORD)
+                    word['conf'] = result_it.Confidence(RIL.WORD)/100
+                    word['glyphs'] = self._decode_glyphs_in_word(
+                        result_it, '%s_word%04d' % (line_id, word_no))
+        tessapi.SetPageSegMode(mode)
+        image = self._images[id(tessapi)]
+        left, top, right, bottom = self._rectangles.get(id(tessapi)) or (0, 0, image.width, image.height)
+        tessapi.SetRectangle(left, top, right - left, bottom - top)
+
+    @staticmethod
+    def _recognize_text(tessapi):
+        with stage('Recognize'):
+            text = tessapi.GetUTF8Text().rstrip("\n\f")
+            conf = tessapi.MeanTextConf()/100.0 # iterator scores are arithmetic averages, too
+        return text, conf
+
+    def _recognize(self, tessapi, recognize):
+        """Get the result of ``recognize(tessapi)`` for the current image and mode of ``tessapi``.
+        
+        If ``cache`` is enabled, then look it up there first (skipping
+        Tesseract altogether on a hit), or store it there afterwards.
+        (The result must be JSON-serialisable.)
+        """
+        if self._cache is None:
+            return self._recognize_cascade(tessapi, recognize)
+        key = result_key(self._cache_config + [
+            self._routed_models.get(id(tessapi)),
+            tessapi.GetPageSegMode(),
+            tessapi.GetVariableAsString('user_defined_dpi')],
+                         self._images[id(tessapi)],
+                         self._rectangles.get(id(tessapi)))
+        result = self._cache.get(key)
+        if result is None:
+            result = self._recognize_cascade(tessapi, recognize)
+            self._cache.put(key, result)
+        return result
+
+    def _recognize_cascade(self, tessapi, recognize):
+        """Get the result of ``recognize(tessapi)``, falling back to the later models of ``model_cascade``.
+        
+        While the confidence of the best result so far is below ``cascade_threshold``,
+        set up the instance of the next model like ``tessapi`` (image, rectangle and
+        mode) and recognise again. Return the result with the highest confidence.
+        """
+        result = recognize(tessapi)
+        cascade = self._pool.cascade(tessapi) if self._pool else []
+        if not cascade:
+            return result
+        conf = result_conf(result)
+        for other in cascade:
+            if conf >= self.parameter['cascade_threshold']:
+                break
+            image = self._images[id(tessapi)]
+            rectangle = self._rectangles.get(id(tessapi))
+            if not rectangle or self._images.get(id(other)) is not image:
+                set_image(other, image)
+                self._images[id(other)] = image
+            self._rectangles[id(other)] = rectangle
+            if rectangle:
+                left, top, right, bottom = rectangle
+                other.SetRectangle(left, top, right - left, bottom - top)
+            other.SetPageSegMode(tessapi.GetPageSegMode())
+            other_result = recognize(other)
+            other_conf = result_conf(other_result)
+            LOG.debug("Cascade: confidence %.3f instead of %.3f", other_conf, conf)
+            count('cascade')
+            if other_conf > conf:
+                result, conf = other_result, other_conf
+        return result
+
+    def _set_segment_image(self, tessapi, segment, parent_image, parent_xywh):
+        """Set up ``tessapi`` to recognise ``segment`` within its parent.
+        
+        Unless ``rectangles`` is enabled and the segment is an axis-aligned
+        rectangle without AlternativeImage or @orientation, crop (and mask)
+        the segment's image from ``parent_image`` and set it.
+        Otherwise, set ``parent_image`` (unless it already is), and restrict
+        recognition to the segment's bounding box in there.
+        
+        Return the image and coordinate dict which the results (and the
+        segments below) will be relative to.
+        """
+        if self.parameter['rectangles']:
+            bbox = self._segment_rectangle(segment, parent_image, parent_xywh)
+            if bbox:
+                if self._images.get(id(tessapi)) is not parent_image:
+                    set_image(tessapi, parent_image)
+                    self._images[id(tessapi)] = parent_image
+                left, top, right, bottom = bbox
+                tessapi.SetRectangle(left, top, right - left, bottom - top)
+                self._rectangles[id(tessapi)] = bbox
+                return parent_image, parent_xywh
+        segment_image, segment_xywh = self.workspace.image_from_segment(
+            segment, parent_image, parent_xywh)
+        set_image(tessapi, segment_image)
+        self._images[id(tessapi)] = segment_image
+        self._rectangles[id(tessapi)] = None
+        return segment_image, segment_xywh
+
+    def _is_blank(self, tessapi):
+        """Whether the current image (or rectangle) of ``tessapi`` is blank (see ``blank_threshold``)."""
+        if not self.parameter['blank_threshold']:
+            return False
+        image = self._images[id(tessapi)]
+        rectangle = self._rectangles.get(id(tessapi))
+        if rectangle:
+            image = image.crop(rectangle)
+        return is_blank(image, self.parameter['blank_threshold'])
+
+    @staticmethod
+    def _segment_rectangle(segment, parent_image, parent_xywh):
+        """Get the bounding box of ``segment`` relative to ``parent_image``,
+        if the image of the segment would merely be cropped from there
+        (and is within its bounds); otherwise return None."""
+        if segment.get_AlternativeImage() or getattr(segment, 'orientation', None):
+            return None
+        polygon = coordinates_of_segment(segment, parent_image, parent_xywh)
+        xs = set(x for x, _ in polygon)
+        ys = set(y for _, y in polygon)
+        if (len(xs) != 2 or len(ys) != 2 or
+            len(set((x, y) for x, y in polygon)) != 4):
+            return None # not an axis-aligned rectangle
+        left, right = min(xs), max(xs)
+        top, bottom = min(ys), max(ys)
+        if (left < 0 or top < 0 or
+            right > parent_image.width or
+            bottom > parent_image.height):
+            return None
+        return int(left), int(top), int(right), int(bottom)
 
     def _process_words_in_line(self, result_it, line, line_xywh):
+        self._annotate_words(line, self._decode_words_in_line(result_it, line.id), line_xywh)
+
+    def _decode_words_in_line(self, result_it, line_id):
+        """Get the words of the current line from ``result_it``.
+        
+        Return a list of dicts with the bounding box (relative to the
+        current image), text, confidence and font attributes of each word,
+        and its glyphs (unless ``textequiv_level`` is ``word``).
+        """
+        words = list()
         if not result_it or result_it.Empty(RIL.WORD):
-            LOG.warning("No text in line '%s'", line.id)
-            return
+            LOG.warning("No text in line '%s'", line_id)
+            return words
         # iterate until IsAtFinalElement(RIL.LINE, RIL.WORD):
-        word_no = 0
         while result_it and not result_it.Empty(RIL.WORD):
-            word_id = '%s_word%04d' % (line.id, word_no)
+            word_id = '%s_word%04d' % (line_id, len(words))
             LOG.debug("Decoding text in word '%s'", word_id)
-            bbox = result_it.BoundingBox(RIL.WORD)
+            word = {'bbox': list(result_it.BoundingBox(RIL.WORD)),
+                    'text': result_it.GetUTF8Text(RIL.WORD),
+                    'conf': result_it.Confidence(RIL.WORD)/100,
+                    # todo: determine if font attributes available for word level will work with LSTM models
+                    'style': result_it.WordFontAttributes()}
+            if self.parameter['textequiv_level'] != 'word':
+                # (with adaptive_choices, alternatives only come with a second pass)
+                word['glyphs'] = self._decode_glyphs_in_word(
+                    result_it, word_id, choices=not self.parameter['adaptive_choices'])
+            words.append(word)
+            if result_it.IsAtFinalElement(RIL.TEXTLINE, RIL.WORD):
+                break
+            else:
+                result_it.Next(RIL.WORD)
+        return words
+
+    def _annotate_words(self, line, words, line_xywh):
+        count('words', len(words))
+        for word_no, result in enumerate(words):
+            word_id = '%s_word%04d' % (line.id, word_no)
             # convert to absolute coordinates:
-            polygon = coordinates_for_segment(polygon_from_x0y0x1y1(bbox),
+            polygon = coordinates_for_segment(polygon_from_x0y0x1y1(result['bbox']),
                                               None, line_xywh)
             points = points_from_polygon(polygon)
             word = WordType(id=word_id, Coords=CoordsType(points))
             line.add_Word(word)
-            # todo: determine if font attributes available for word level will work with LSTM models
-            word_attributes = result_it.WordFontAttributes()
+            word_attributes = result['style']
             if word_attributes:
                 word_style = TextStyleType(
-                    fontSize=word_attributes['pointsize']
-                    if 'pointsize' in word_attributes else None,
-                    fontFamily=word_attributes['font_name']
-                    if 'font_name' in word_attributes else None,
-                    bold=word_attributes['bold']
-                    if 'bold' in word_attributes else None,
-                    italic=word_attributes['italic']
-                    if 'italic' in word_attributes else None,
-                    underlined=word_attributes['underlined']
-                    if 'underlined' in word_attributes else None,
-                    monospace=word_attributes['monospace']
-                    if 'monospace' in word_attributes else None,
-                    serif=word_attributes['serif']
-                    if 'serif' in word_attributes else None)
+                    fontSize=word_attributes.get('pointsize'),
+                    fontFamily=word_attributes.get('font_name'),
+                    bold=word_attributes.get('bold'),
+                    italic=word_attributes.get('italic'),
+                    underlined=word_attributes.get('underlined'),
+                    monospace=word_attributes.get('monospace'),
+                    serif=word_attributes.get('serif'))
                 word.set_TextStyle(word_style) # (or somewhere in custom attribute?)
             # add word annotation unconditionally (i.e. even for glyph level):
             word.add_TextEquiv(TextEquivType(
-                Unicode=result_it.GetUTF8Text(RIL.WORD),
-                conf=result_it.Confidence(RIL.WORD)/100))
-            if self.parameter['textequiv_level'] != 'word':
-                self._process_glyphs_in_word(result_it, word, line_xywh)
-            if result_it.IsAtFinalElement(RIL.TEXTLINE, RIL.WORD):
-                break
-            else:
-                word_no += 1
-                result_it.Next(RIL.WORD)
+                Unicode=result['text'],
+                conf=result['conf']))
+            if 'glyphs' in result:
+                self._annotate_glyphs(word, result['glyphs'], line_xywh)
 
     def _process_existing_words(self, tessapi, words, line_image, line_xywh):
         for word in words:
-            word_image, word_xywh = self.workspace.image_from_segment(
-                word, line_image, line_xywh)
-            tessapi.SetImage(word_image)
+            word_image, word_xywh = self._set_segment_image(
+                tessapi, word, line_image, line_xywh)
             tessapi.SetPageSegMode(PSM.SINGLE_WORD)
             if self.parameter['textequiv_level'] == 'word':
                 LOG.debug("Recognizing text in word '%s'", word.id)
-                word_text = tessapi.GetUTF8Text().rstrip("\n\f")
-                word_conf = tessapi.AllWordConfidences()
-                word_conf = word_conf[0]/100.0 if word_conf else 0.0
+                def recognize_word(tessapi):
+                    with stage('Recognize'):
+                        word_text = tessapi.GetUTF8Text().rstrip("\n\f")
+                        word_conf = tessapi.AllWordConfidences()
+                    word_conf = word_conf[0]/100.0 if word_conf else 0.0
+                    return word_text, word_conf
+                word_text, word_conf = self._recognize(tessapi, recognize_word)
                 if word.get_TextEquiv():
                     LOG.warning("Word '%s' already contained text results", word.id)
                     word.set_TextEquiv([])
@@ -332,72 +823,149 @@ class TesserocrRecognize(Processor):
                 self._process_existing_glyphs(tessapi, glyphs, word_image, word_xywh)
             else:
                 ## internal glyph layout:
-                tessapi.Recognize()
-                self._process_glyphs_in_word(tessapi.GetIterator(), word, word_xywh)
+                def recognize_glyphs(tessapi, word_id=word.id):
+                    with choice_mode(tessapi, self.parameter['adaptive_choices']):
+                        with stage('Recognize'):
+                            tessapi.Recognize()
+                        with stage('decode'):
+                            return self._decode_glyphs_in_word(tessapi.GetIterator(), word_id)
+                self._annotate_glyphs(word, self._recognize(tessapi, recognize_glyphs), word_xywh)
 
     def _process_existing_glyphs(self, tessapi, glyphs, word_image, word_xywh):
         for glyph in glyphs:
-            glyph_image, _ = self.workspace.image_from_segment(
-                glyph, word_image, word_xywh)
-            tessapi.SetImage(glyph_image)
+            self._set_segment_image(tessapi, glyph, word_image, word_xywh)
             tessapi.SetPageSegMode(PSM.SINGLE_CHAR)
             LOG.debug("Recognizing text in glyph '%s'", glyph.id)
             if glyph.get_TextEquiv():
                 LOG.warning("Glyph '%s' already contained text results", glyph.id)
                 glyph.set_TextEquiv([])
-            #glyph_text = tessapi.GetUTF8Text().rstrip("\n\f")
-            glyph_conf = tessapi.AllWordConfidences()
-            glyph_conf = glyph_conf[0]/100.0 if glyph_conf else 1.0
-            #LOG.debug('best glyph: "%s" [%f]', glyph_text, glyph_conf)
-            result_it = tessapi.GetIterator()
-            if not result_it or result_it.Empty(RIL.SYMBOL):
+            def recognize_choices(tessapi):
+                with choice_mode(tessapi, self.parameter['adaptive_choices']):
+                    return self._recognize_choices(tessapi)
+            choices = self._recognize(tessapi, recognize_choices)
+            if choices is None:
                 LOG.error("No text in glyph '%s'", glyph.id)
                 continue
-            choice_it = result_it.GetChoiceIterator()
-            for (choice_no, choice) in enumerate(choice_it):
-                alternative_text = choice.GetUTF8Text()
-                alternative_conf = choice.Confidence()/100
-                #LOG.debug('alternative glyph: "%s" [%f]', alternative_text, alternative_conf)
-                if (glyph_conf - alternative_conf > CHOICE_THRESHOLD_CONF or
-                    choice_no > CHOICE_THRESHOLD_NUM):
-                    break
+            for choice_no, (alternative_text, alternative_conf) in enumerate(choices):
                 # todo: consider SymbolIsSuperscript (TextStyle), SymbolIsDropcap (RelationType) etc
                 glyph.add_TextEquiv(TextEquivType(index=choice_no, Unicode=alternative_text, conf=alternative_conf))
+
+    @staticmethod
+    def _recognize_choices(tessapi):
+        #glyph_text = tessapi.GetUTF8Text().rstrip("\n\f")
+        with stage('Recognize'):
+            glyph_conf = tessapi.AllWordConfidences()
+        glyph_conf = glyph_conf[0]/100.0 if glyph_conf else 1.0
+        #LOG.debug('best glyph: "%s" [%f]', glyph_text, glyph_conf)
+        result_it = tessapi.GetIterator()
+        if not result_it or result_it.Empty(RIL.SYMBOL):
+            return None
+        with stage('decode'):
+            return glyph_choices(result_it, glyph_conf)
     
-    def _process_glyphs_in_word(self, result_it, word, word_xywh):
+    def _decode_glyphs_in_word(self, result_it, word_id, choices=True):
+        """Get the glyphs of the current word from ``result_it``.
+        
+        Return a list of dicts with the bounding box (relative to the
+        current image) and the text choices (with confidences) of each glyph
+        (or only the best one, unless ``choices``).
+        """
+        glyphs = list()
         if not result_it or result_it.Empty(RIL.SYMBOL):
-            LOG.debug("No glyph in word '%s'", word.id)
-            return
+            LOG.debug("No glyph in word '%s'", word_id)
+            return glyphs
         # iterate until IsAtFinalElement(RIL.WORD, RIL.SYMBOL):
-        glyph_no = 0
         while result_it and not result_it.Empty(RIL.SYMBOL):
-            glyph_id = '%s_glyph%04d' % (word.id, glyph_no)
+            glyph_id = '%s_glyph%04d' % (word_id, len(glyphs))
             LOG.debug("Decoding text in glyph '%s'", glyph_id)
-            #  glyph_text = result_it.GetUTF8Text(RIL.SYMBOL) # equals first choice?
             glyph_conf = result_it.Confidence(RIL.SYMBOL)/100 # equals first choice?
-            #LOG.debug('best glyph: "%s" [%f]', glyph_text, glyph_conf)
-            bbox = result_it.BoundingBox(RIL.SYMBOL)
+            glyphs.append({'bbox': list(result_it.BoundingBox(RIL.SYMBOL)),
+                           'choices': (glyph_choices(result_it, glyph_conf) if choices else
+                                       [(result_it.GetUTF8Text(RIL.SYMBOL), glyph_conf)])})
+            if result_it.IsAtFinalElement(RIL.WORD, RIL.SYMBOL):
+                break
+            else:
+                result_it.Next(RIL.SYMBOL)
+        return glyphs
+
+    def _annotate_glyphs(self, word, glyphs, word_xywh):
+        count('glyphs', len(glyphs))
+        for glyph_no, result in enumerate(glyphs):
+            glyph_id = '%s_glyph%04d' % (word.id, glyph_no)
             # convert to absolute coordinates:
-            polygon = coordinates_for_segment(polygon_from_x0y0x1y1(bbox),
+            polygon = coordinates_for_segment(polygon_from_x0y0x1y1(result['bbox']),
                                               None, word_xywh)
             points = points_from_polygon(polygon)
             glyph = GlyphType(id=glyph_id, Coords=CoordsType(points))
             word.add_Glyph(glyph)
-            choice_it = result_it.GetChoiceIterator()
-            for (choice_no, choice) in enumerate(choice_it):
-                alternative_text = choice.GetUTF8Text()
-                alternative_conf = choice.Confidence()/100
-                #LOG.debug('alternative glyph: "%s" [%f]', alternative_text, alternative_conf)
-                if (glyph_conf - alternative_conf > CHOICE_THRESHOLD_CONF or
-                    choice_no > CHOICE_THRESHOLD_NUM):
-                    break
+            for choice_no, (alternative_text, alternative_conf) in enumerate(result['choices']):
                 # todo: consider SymbolIsSuperscript (TextStyle), SymbolIsDropcap (RelationType) etc
                 glyph.add_TextEquiv(TextEquivType(index=choice_no, Unicode=alternative_text, conf=alternative_conf))
-            if result_it.IsAtFinalElement(RIL.WORD, RIL.SYMBOL):
-                break
-            else:
-                glyph_no += 1
-                result_it.Next(RIL.SYMBOL)
+
+def _model_digests(model):
+    """Get the checksums of the ``.traineddata`` files for each (sub-)model of ``model``."""
+    return [file_digest(os.path.join(TESSDATA_PREFIX, sub_model + '.traineddata'))
+            for sub_model in model.replace(',', '+').split('+')]
+
+def glyph_choices(result_it, glyph_conf):
+    """Get the text alternatives (with confidences) for the current symbol of ``result_it``.
+    
+    Stop after ``CHOICE_THRESHOLD_NUM`` choices, or when the confidence
+    drops by more than ``CHOICE_THRESHOLD_CONF`` below ``glyph_conf``.
+    """
+    choices = list()
+    for (choice_no, choice) in enumerate(result_it.GetChoiceIterator()):
+        alternative_text = choice.GetUTF8Text()
+        alternative_conf = choice.Confidence()/100
+        #LOG.debug('alternative glyph: "%s" [%f]', alternative_text, alternative_conf)
+        if (glyph_conf - alternative_conf > CHOICE_THRESHOLD_CONF or
+            choice_no > CHOICE_THRESHOLD_NUM):
+            break
+        choices.append((alternative_text, alternative_conf))
+    return choices
+
+def result_conf(result):
+    """Get the confidence of a recognition result (as cached, see ``TesserocrRecognize._recognize``).
+    
+    The result is either a pair of text and confidence, or a list of words,
+    of glyphs, or of glyph choices (pairs of text and confidence).
+    """
+    if not result:
+        return 0.0
+    if isinstance(result[0], str):
+        return result[1]
+    if isinstance(result[0], dict):
+        if 'choices' in result[0]:
+            confs = [glyph['choices'][0][1] if glyph['choices'] else 0.0
+                     for glyph in result]
+        else:
+            confs = [word['conf'] for word in result]
+        return sum(confs) / len(confs)
+    return result[0][1]
+
+@contextmanager
+def choice_mode(tessapi, enabled=True):
+    """Set ``tessapi`` to LSTM choice mode (``CHOICE_VARIABLES``) temporarily, if ``enabled``."""
+    if not enabled:
+        yield
+        return
+    previous = [(name, tessapi.GetVariableAsString(name)) for name, _ in CHOICE_VARIABLES]
+    for name, value in CHOICE_VARIABLES:
+        tessapi.SetVariable(name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous:
+            tessapi.SetVariable(name, value)
+
+def page_remove_regions(page):
+    """Remove all regions (and the ReadingOrder) from the page."""
+    if page.get_ReadingOrder() or any(
+            getattr(page, 'get_%sRegion' % name)() for name in REGION_TYPES):
+        LOG.info("removing existing regions")
+    for name in REGION_TYPES:
+        getattr(page, 'set_%sRegion' % name)([])
+    page.set_ReadingOrder(None)
 
 def page_element_unicode0(element):
     """Get Unicode string of the first text result."""
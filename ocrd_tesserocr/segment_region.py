@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 
-import os.path
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
 from tesserocr import (
     PyTessBaseAPI,
     PSM, RIL, PT
@@ -8,14 +11,11 @@ from tesserocr import (
 
 from ocrd_utils import (
     getLogger,
-    concat_padded,
     coordinates_for_segment,
     polygon_from_x0y0x1y1,
     points_from_polygon,
-    MIMETYPE_PAGE,
     membername
 )
-from ocrd_modelfactory import page_from_file
 from ocrd_models.ocrd_page import (
     MetadataItemType,
     LabelsType, LabelType,
@@ -27,8 +27,7 @@ from ocrd_models.ocrd_page import (
     ImageRegionType,
     MathsRegionType,
     SeparatorRegionType,
-    NoiseRegionType,
-    to_xml)
+    NoiseRegionType)
 from ocrd_models.ocrd_page_generateds import (
     TableRegionType,
     TextTypeSimpleType
@@ -36,9 +35,16 @@ from ocrd_models.ocrd_page_generateds import (
 from ocrd import Processor
 
 from .config import TESSDATA_PREFIX, OCRD_TOOL
+from .pool import ApiPool
+from .executor import process_pages
+from .image import set_image, is_blank, downscale_image
+from .metrics import stage, count
 
 TOOL = 'ocrd-tesserocr-segment-region'
 LOG = getLogger('processor.TesserocrSegmentRegion')
+# minimum intersection over union of the parts of two blocks within
+# the overlap of their tiles for them to be the same block:
+TILE_MERGE_IOU = 0.5
 
 class TesserocrSegmentRegion(Processor):
 
@@ -66,122 +72,186 @@ class TesserocrSegmentRegion(Processor):
         
         Produce a new output file by serialising the resulting hierarchy.
         """
-        overwrite_regions = self.parameter['overwrite_regions']
-        find_tables = self.parameter['find_tables']
-        
-        with PyTessBaseAPI(path=TESSDATA_PREFIX) as tessapi:
-            if find_tables:
-                tessapi.SetVariable("textord_tabfind_find_tables", "1") # (default)
+        process_pages(self, self._setup, self._page_image, self._process_page)
+
+    @contextmanager
+    def _setup(self):
+        with ExitStack() as stack:
+            # (more than one instance only helps analysing tiles concurrently)
+            pool = ApiPool([stack.enter_context(PyTessBaseAPI(path=TESSDATA_PREFIX))
+                            for _ in range(self.parameter['threads'] if self.parameter['tile_size'] else 1)])
+            stack.callback(pool.close)
+            if self.parameter['find_tables']:
+                pool.SetVariable("textord_tabfind_find_tables", "1") # (default)
                 # this should yield additional blocks within the table blocks
                 # from the page iterator, but does not in fact (yet?):
                 # (and it can run into assertion errors when the table structure
                 #  does not meet certain homogeneity expectations)
-                #tessapi.SetVariable("textord_tablefind_recognize_tables", "1")
+                #pool.SetVariable("textord_tablefind_recognize_tables", "1")
             else:
                 # disable table detection here, so tables will be
                 # analysed as independent text/line blocks:
-                tessapi.SetVariable("textord_tabfind_find_tables", "0")
-            for (n, input_file) in enumerate(self.input_files):
-                page_id = input_file.pageId or input_file.ID
-                LOG.info("INPUT FILE %i / %s", n, page_id)
-                pcgts = page_from_file(self.workspace.download_file(input_file))
-                page = pcgts.get_Page()
-                
-                # add metadata about this operation and its runtime parameters:
-                metadata = pcgts.get_Metadata() # ensured by from_file()
-                metadata.add_MetadataItem(
-                    MetadataItemType(type_="processingStep",
-                                     name=self.ocrd_tool['steps'][0],
-                                     value=TOOL,
-                                     Labels=[LabelsType(
-                                         externalModel="ocrd-tool",
-                                         externalId="parameters",
-                                         Label=[LabelType(type_=name,
-                                                          value=self.parameter[name])
-                                                for name in self.parameter.keys()])]))
+                pool.SetVariable("textord_tabfind_find_tables", "0")
+            yield pool
 
-                # delete or warn of existing regions:
-                if (page.get_AdvertRegion() or
-                    page.get_ChartRegion() or
-                    page.get_ChemRegion() or
-                    page.get_GraphicRegion() or
-                    page.get_ImageRegion() or
-                    page.get_LineDrawingRegion() or
-                    page.get_MathsRegion() or
-                    page.get_MusicRegion() or
-                    page.get_NoiseRegion() or
-                    page.get_SeparatorRegion() or
-                    page.get_TableRegion() or
-                    page.get_TextRegion() or
-                    page.get_UnknownRegion()):
-                    if overwrite_regions:
-                        LOG.info('removing existing TextRegions')
-                        page.set_TextRegion([])
-                        page.set_AdvertRegion([])
-                        page.set_ChartRegion([])
-                        page.set_ChemRegion([])
-                        page.set_GraphicRegion([])
-                        page.set_ImageRegion([])
-                        page.set_LineDrawingRegion([])
-                        page.set_MathsRegion([])
-                        page.set_MusicRegion([])
-                        page.set_NoiseRegion([])
-                        page.set_SeparatorRegion([])
-                        page.set_TableRegion([])
-                        page.set_UnknownRegion([])
-                    else:
-                        LOG.warning('keeping existing TextRegions')
-                if page.get_ReadingOrder():
-                    if overwrite_regions:
-                        LOG.info('overwriting existing ReadingOrder')
-                        # (cannot sustain old regionrefs)
-                        page.set_ReadingOrder(None)
-                    else:
-                        LOG.warning('keeping existing ReadingOrder')
-                
-                page_image, page_coords, page_image_info = self.workspace.image_from_page(
-                    page, page_id)
-                if self.parameter['dpi'] > 0:
-                    dpi = self.parameter['dpi']
-                    LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
-                elif page_image_info.resolution != 1:
-                    dpi = page_image_info.resolution
-                    if page_image_info.resolutionUnit == 'cm':
-                        dpi = round(dpi * 2.54)
-                    LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
-                else:
-                    dpi = 0
-                    LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
-                if dpi:
-                    tessapi.SetVariable('user_defined_dpi', str(dpi))
-                
-                LOG.info("Detecting regions in page '%s'", page_id)
-                tessapi.SetImage(page_image) # is already cropped to Border
-                tessapi.SetPageSegMode(PSM.SPARSE_TEXT if self.parameter['sparse_text'] else PSM.AUTO)
+    def _page_image(self, page, page_id):
+        return self.workspace.image_from_page(page, page_id)
+
+    def _process_page(self, pool, n, input_file, pcgts,
+                      page_image, page_coords, page_image_info):
+        overwrite_regions = self.parameter['overwrite_regions']
+        page_id = input_file.pageId or input_file.ID
+        page = pcgts.get_Page()
+        
+        # add metadata about this operation and its runtime parameters:
+        metadata = pcgts.get_Metadata() # ensured by from_file()
+        metadata.add_MetadataItem(
+            MetadataItemType(type_="processingStep",
+                             name=self.ocrd_tool['steps'][0],
+                             value=TOOL,
+                             Labels=[LabelsType(
+                                 externalModel="ocrd-tool",
+                                 externalId="parameters",
+                                 Label=[LabelType(type_=name,
+                                                  value=self.parameter[name])
+                                        for name in self.parameter.keys()])]))
+
+        # delete or warn of existing regions:
+        if (page.get_AdvertRegion() or
+            page.get_ChartRegion() or
+            page.get_ChemRegion() or
+            page.get_GraphicRegion() or
+            page.get_ImageRegion() or
+            page.get_LineDrawingRegion() or
+            page.get_MathsRegion() or
+            page.get_MusicRegion() or
+            page.get_NoiseRegion() or
+            page.get_SeparatorRegion() or
+            page.get_TableRegion() or
+            page.get_TextRegion() or
+            page.get_UnknownRegion()):
+            if overwrite_regions:
+                LOG.info('removing existing TextRegions')
+                page.set_TextRegion([])
+                page.set_AdvertRegion([])
+                page.set_ChartRegion([])
+                page.set_ChemRegion([])
+                page.set_GraphicRegion([])
+                page.set_ImageRegion([])
+                page.set_LineDrawingRegion([])
+                page.set_MathsRegion([])
+                page.set_MusicRegion([])
+                page.set_NoiseRegion([])
+                page.set_SeparatorRegion([])
+                page.set_TableRegion([])
+                page.set_UnknownRegion([])
+            else:
+                LOG.warning('keeping existing TextRegions')
+        if page.get_ReadingOrder():
+            if overwrite_regions:
+                LOG.info('overwriting existing ReadingOrder')
+                # (cannot sustain old regionrefs)
+                page.set_ReadingOrder(None)
+            else:
+                LOG.warning('keeping existing ReadingOrder')
+        
+        if self.parameter['dpi'] > 0:
+            dpi = self.parameter['dpi']
+            LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
+        elif page_image_info.resolution != 1:
+            dpi = page_image_info.resolution
+            if page_image_info.resolutionUnit == 'cm':
+                dpi = round(dpi * 2.54)
+            LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
+        else:
+            dpi = 0
+            LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
+        # (padding is in true pixels, i.e. at full resolution)
+        padding = self.parameter['padding']
+        analysis_dpi = self.parameter['analysis_dpi']
+        if analysis_dpi and dpi > analysis_dpi:
+            LOG.info("Page '%s' will be analysed at %d DPI", page_id, analysis_dpi)
+            # (results get mapped back to full resolution via page_coords)
+            page_image, page_coords = downscale_image(page_image, page_coords, dpi, analysis_dpi)
+            padding = round(padding * analysis_dpi / dpi)
+            dpi = analysis_dpi
+        # (also reset when unknown, so the result does not depend
+        #  on which pages the instance has processed before)
+        pool.SetVariable('user_defined_dpi', str(dpi))
+        
+        if is_blank(page_image, self.parameter['blank_threshold']):
+            LOG.info("Page '%s' is blank, not detecting regions", page_id)
+            count('blank')
+            return
+        
+        tile_size = self.parameter['tile_size']
+        tile_overlap = self.parameter['tile_overlap']
+        if tile_size and max(page_image.size) > tile_size:
+            if tile_overlap >= tile_size:
+                raise Exception("tile_overlap must be smaller than tile_size")
+            tiles = [(x, y, min(x + tile_size, page_image.width), min(y + tile_size, page_image.height))
+                     for y in tile_offsets(page_image.height, tile_size, tile_overlap)
+                     for x in tile_offsets(page_image.width, tile_size, tile_overlap)]
+            LOG.info("Detecting regions in page '%s' in %d tiles", page_id, len(tiles))
+            count('tiles', len(tiles))
+            # (decode before cropping the tiles in several threads at once)
+            page_image.load()
+            results = pool.map(lambda tessapi, *tile: self._analyse_tile(
+                tessapi, page_image, tile, padding), tiles)
+            with stage('merge'):
+                # (the order within each tile does not make a page-wide order)
+                blocks = sort_blocks(merge_tile_blocks(tiles, results))
+        else:
+            LOG.info("Detecting regions in page '%s'", page_id)
+            blocks = self._analyse_layout(pool.tessapis[0], page_image, # is already cropped to Border
+                                          padding=padding)
+        self._process_layout(blocks, page, page_image, page_coords, input_file.pageId)
+
+    def _analyse_tile(self, tessapi, page_image, tile, padding):
+        """Detect the blocks in the rectangle ``tile`` of ``page_image`` (unless blank)."""
+        image = page_image.crop(tile)
+        if is_blank(image, self.parameter['blank_threshold']):
+            count('blank')
+            return []
+        return self._analyse_layout(tessapi, image, tile[:2], padding)
 
-                # detect the region segments and types:
-                layout = tessapi.AnalyseLayout()
-                self._process_page(layout, page, page_image, page_coords, input_file.pageId)
-                
-                # Use input_file's basename for the new file -
-                # this way the files retain the same basenames:
-                file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)
-                if file_id == input_file.ID:
-                    file_id = concat_padded(self.output_file_grp, n)
-                self.workspace.add_file(
-                    ID=file_id,
-                    file_grp=self.output_file_grp,
-                    pageId=input_file.pageId,
-                    mimetype=MIMETYPE_PAGE,
-                    local_filename=os.path.join(self.output_file_grp,
-                                                file_id + '.xml'),
-                    content=to_xml(pcgts))
+    def _analyse_layout(self, tessapi, image, offset=(0, 0), padding=0):
+        """Detect the region segments and types of ``image``.
+
+        Return a list of (BlockType, bounding box, polygon) for each block
+        (bounding boxes extended by ``padding``), with coordinates relative
+        to the page image (``image`` being the part at ``offset`` within it).
+        """
+        set_image(tessapi, image)
+        tessapi.SetPageSegMode(PSM.SPARSE_TEXT if self.parameter['sparse_text'] else PSM.AUTO)
+        with stage('AnalyseLayout'):
+            it = tessapi.AnalyseLayout()
+        blocks = list()
+        x, y = offset
+        with stage('decode'):
+            # equivalent to GetComponentImages with raw_image=True,
+            # (which would also give raw coordinates),
+            # except we are also interested in the iterator's BlockType() here,
+            # and its BlockPolygon()
+            while it and not it.Empty(RIL.BLOCK):
+                # (padding will be passed to both BoundingBox and GetImage)
+                # (actually, Tesseract honours padding only on the left and bottom,
+                #  whereas right and top are increased less!)
+                x0, y0, x1, y1 = it.BoundingBox(RIL.BLOCK, padding=padding)
+                # sometimes these polygons are not planar, which causes
+                # PIL.ImageDraw.Draw.polygon (and likely others as well)
+                # to misbehave; however, PAGE coordinate semantics prohibit
+                # multi-path polygons!
+                # (probably a bug in Tesseract itself, cf. tesseract#2826):
+                if self.parameter['crop_polygons']:
+                    polygon = [(px + x, py + y) for px, py in it.BlockPolygon()]
+                else:
+                    polygon = None
+                blocks.append((it.BlockType(), (x0 + x, y0 + y, x1 + x, y1 + y), polygon))
+                it.Next(RIL.BLOCK)
+        return blocks
 
-    def _process_page(self, it, page, page_image, page_coords, page_id):
-        # equivalent to GetComponentImages with raw_image=True,
-        # (which would also give raw coordinates),
-        # except we are also interested in the iterator's BlockType() here,
-        # and its BlockPolygon()
+    def _process_layout(self, blocks, page, page_image, page_coords, page_id):
         index = 0
         ro = page.get_ReadingOrder()
         if not ro:
@@ -199,19 +269,8 @@ class TesserocrSegmentRegion(Processor):
             # new top-level group
             og = OrderedGroupType(id="reading-order")
             ro.set_OrderedGroup(og)
-        while it and not it.Empty(RIL.BLOCK):
-            # (padding will be passed to both BoundingBox and GetImage)
-            # (actually, Tesseract honours padding only on the left and bottom,
-            #  whereas right and top are increased less!)
-            bbox = it.BoundingBox(RIL.BLOCK, padding=self.parameter['padding'])
-            # sometimes these polygons are not planar, which causes
-            # PIL.ImageDraw.Draw.polygon (and likely others as well)
-            # to misbehave; however, PAGE coordinate semantics prohibit
-            # multi-path polygons!
-            # (probably a bug in Tesseract itself, cf. tesseract#2826):
-            if self.parameter['crop_polygons']:
-                polygon = it.BlockPolygon()
-            else:
+        for block_type, bbox, polygon in blocks:
+            if not polygon:
                 polygon = polygon_from_x0y0x1y1(bbox)
             polygon = coordinates_for_segment(polygon, page_image, page_coords)
             points = points_from_polygon(polygon)
@@ -233,7 +292,6 @@ class TesserocrSegmentRegion(Processor):
             #
             # region type switch
             #
-            block_type = it.BlockType()
             if block_type in [PT.FLOWING_TEXT,
                               PT.HEADING_TEXT,
                               PT.PULLOUT_TEXT,
@@ -284,13 +342,157 @@ class TesserocrSegmentRegion(Processor):
                 # undo appending in ReadingOrder
                 og.set_RegionRefIndexed(og.get_RegionRefIndexed()[:-1])
             LOG.info("Detected region '%s': %s (%s)", ID, points, membername(PT, block_type))
-            #
-            # iterator increment
-            #
             index += 1
-            it.Next(RIL.BLOCK)
+            count('regions')
         if (not og.get_RegionRefIndexed() and
             not og.get_OrderedGroupIndexed() and
             not og.get_UnorderedGroupIndexed()):
             # schema forbids empty OrderedGroup
             ro.set_OrderedGroup(None)
+
+def tile_offsets(length, size, overlap):
+    """Get the start positions of tiles of ``size`` which cover ``length`` with at least ``overlap``.
+
+    (Spread evenly, so the last tile ends at the edge.)
+    """
+    if length <= size:
+        return [0]
+    tiles = -(-(length - overlap) // (size - overlap))
+    return [round(i * (length - size) / (tiles - 1)) for i in range(tiles)]
+
+def block_kind(block_type):
+    """Get the kind of region a BlockType is annotated as (text, image, separator etc)."""
+    if block_type in [PT.FLOWING_TEXT, PT.HEADING_TEXT, PT.PULLOUT_TEXT,
+                      PT.CAPTION_TEXT, PT.VERTICAL_TEXT]:
+        return 'text'
+    if block_type in [PT.FLOWING_IMAGE, PT.HEADING_IMAGE, PT.PULLOUT_IMAGE]:
+        return 'image'
+    if block_type in [PT.HORZ_LINE, PT.VERT_LINE]:
+        return 'separator'
+    if block_type in [PT.INLINE_EQUATION, PT.EQUATION]:
+        return 'maths'
+    if block_type == PT.TABLE:
+        return 'table'
+    return 'noise'
+
+def _intersects(box1, box2):
+    return (box1[0] < box2[2] and box2[0] < box1[2] and
+            box1[1] < box2[3] and box2[1] < box1[3])
+
+def _intersection(box1, box2):
+    return (max(box1[0], box2[0]), max(box1[1], box2[1]),
+            min(box1[2], box2[2]), min(box1[3], box2[3]))
+
+def _area(box):
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+def _same_block(box1, box2, overlap):
+    """Whether the parts of ``box1`` and ``box2`` within ``overlap`` (mostly) coincide."""
+    part1 = _intersection(box1, overlap)
+    part2 = _intersection(box2, overlap)
+    common = _area(_intersection(part1, part2))
+    return common > 0 and common >= TILE_MERGE_IOU * (_area(part1) + _area(part2) - common)
+
+def _merge_polygons(polygons):
+    """Get the convex hull of the union of ``polygons`` (or None if that is degenerate)."""
+    hull = unary_union([Polygon(polygon).buffer(0) for polygon in polygons]).convex_hull
+    if hull.geom_type != 'Polygon':
+        LOG.warning("Cannot merge the polygons of a block across tiles, using its bounding box")
+        return None
+    return list(hull.exterior.coords[:-1])
+
+def merge_tile_blocks(tiles, results):
+    """Merge the blocks detected in overlapping ``tiles`` into one consistent set.
+
+    ``results`` has the list of (BlockType, bounding box, polygon) for
+    each tile (in page image coordinates). Blocks of the same kind from
+    different tiles whose parts within the overlap of the two tiles
+    coincide (by ``TILE_MERGE_IOU``) are the same block seen twice (or cut
+    at the edge of one of the tiles), so join them (transitively) into the
+    union of their bounding boxes (and the convex hull of their polygons,
+    if any), with the BlockType of the largest part. (Blocks which merely
+    touch, like two columns in one tile and a block spanning both in the
+    other, are kept apart.)
+
+    Return the merged blocks ordered by their first occurrence, i.e. by
+    the order of the tiles (row by row) and Tesseract's order within them.
+    (This interleaves the columns of the page at the seams; use
+    ``sort_blocks`` for the reading order.)
+    """
+    blocks = [(tile, block) for tile, tile_blocks in enumerate(results) for block in tile_blocks]
+    parent = list(range(len(blocks)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for i, (tile1, (type1, box1, _)) in enumerate(blocks):
+        for j in range(i):
+            tile2, (type2, box2, _) = blocks[j]
+            if (tile1 != tile2 and _intersects(tiles[tile1], tiles[tile2]) and
+                block_kind(type1) == block_kind(type2) and
+                _same_block(box1, box2, _intersection(tiles[tile1], tiles[tile2]))):
+                parent[find(i)] = find(j)
+    groups = OrderedDict()
+    for i, (_, block) in enumerate(blocks):
+        groups.setdefault(find(i), []).append(block)
+    merged = []
+    for group in groups.values():
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        boxes = [box for _, box, _ in group]
+        polygons = [polygon for _, _, polygon in group]
+        block_type = max(group, key=lambda block: _area(block[1]))[0]
+        merged.append((block_type,
+                       (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                        max(box[2] for box in boxes), max(box[3] for box in boxes)),
+                       _merge_polygons(polygons) if all(polygons) else None))
+    return merged
+
+def _columns(blocks):
+    """Split ``blocks`` into groups separated by vertical gaps, from left to right."""
+    groups = []
+    right = None
+    for block in sorted(blocks, key=lambda block: block[1][0]):
+        if right is None or block[1][0] >= right:
+            groups.append([])
+            right = block[1][2]
+        groups[-1].append(block)
+        right = max(right, block[1][2])
+    return groups
+
+def sort_blocks(blocks):
+    """Sort ``blocks`` (BlockType, bounding box, polygon) in reading order across the whole page.
+
+    Read columns (groups of blocks separated by vertical gaps) from left
+    to right, each from top to bottom. Blocks spanning several columns
+    (like headings, or a footer) are found by taking the widest blocks
+    out until the rest falls into columns; they split the page into
+    sections, which are read from top to bottom (and each by columns
+    again). If the blocks do not fall into columns at all, read them
+    from top to bottom.
+    """
+    if len(blocks) <= 1:
+        return list(blocks)
+    columns = _columns(blocks)
+    if len(columns) > 1:
+        return [block for column in columns for block in sort_blocks(column)]
+    rest = sorted(blocks, key=lambda block: block[1][2] - block[1][0])
+    spanning = []
+    while len(rest) > 1 and len(_columns(rest)) == 1:
+        spanning.append(rest.pop())
+    if len(rest) <= 1:
+        # a single column
+        return sorted(blocks, key=lambda block: (block[1][1], block[1][0]))
+    def center(block):
+        return (block[1][1] + block[1][3]) / 2
+    spanning.sort(key=center)
+    sections = [[] for _ in range(len(spanning) + 1)]
+    for block in rest:
+        sections[sum(center(other) < center(block) for other in spanning)].append(block)
+    ordered = sort_blocks(sections[0])
+    for block, section in zip(spanning, sections[1:]):
+        ordered.append(block)
+        ordered.extend(sort_blocks(section))
+    return ordered
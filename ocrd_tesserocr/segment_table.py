@@ -1,6 +1,6 @@
 from __future__ import absolute_import
 
-import os.path
+from contextlib import contextmanager
 from tesserocr import (
     PyTessBaseAPI,
     PSM, RIL, PT
@@ -8,20 +8,16 @@ from tesserocr import (
 
 from ocrd_utils import (
     getLogger,
-    concat_padded,
     coordinates_for_segment,
     polygon_from_x0y0x1y1,
     points_from_polygon,
-    MIMETYPE_PAGE,
     membername
 )
-from ocrd_modelfactory import page_from_file
 from ocrd_models.ocrd_page import (
     MetadataItemType,
     LabelsType, LabelType,
     CoordsType,
-    TextRegionType,
-    to_xml)
+    TextRegionType)
 from ocrd_models.ocrd_page_generateds import (
     TableRegionType,
     TextTypeSimpleType,
@@ -36,6 +32,9 @@ from ocrd_models.ocrd_page_generateds import (
 from ocrd import Processor
 
 from .config import TESSDATA_PREFIX, OCRD_TOOL
+from .executor import process_pages
+from .image import set_image
+from .metrics import stage, count
 from .recognize import page_get_reading_order
 
 TOOL = 'ocrd-tesserocr-segment-table'
@@ -63,131 +62,123 @@ class TesserocrSegmentTable(Processor):
         
         Produce a new output file by serialising the resulting hierarchy.
         """
-        overwrite_regions = self.parameter['overwrite_regions']
-        
+        process_pages(self, self._setup, self._page_image, self._process_page, force=True)
+
+    @contextmanager
+    def _setup(self):
         with PyTessBaseAPI(path=TESSDATA_PREFIX) as tessapi:
             # disable table detection here, so we won't get
             # tables inside tables, but try to analyse them as
             # independent text/line blocks:
             tessapi.SetVariable("textord_tabfind_find_tables", "0")
-            for (n, input_file) in enumerate(self.input_files):
-                page_id = input_file.pageId or input_file.ID
-                LOG.info("INPUT FILE %i / %s", n, page_id)
-                pcgts = page_from_file(self.workspace.download_file(input_file))
-                page = pcgts.get_Page()
-                
-                # add metadata about this operation and its runtime parameters:
-                metadata = pcgts.get_Metadata() # ensured by from_file()
-                metadata.add_MetadataItem(
-                    MetadataItemType(type_="processingStep",
-                                     name=self.ocrd_tool['steps'][0],
-                                     value=TOOL,
-                                     Labels=[LabelsType(
-                                         externalModel="ocrd-tool",
-                                         externalId="parameters",
-                                         Label=[LabelType(type_=name,
-                                                          value=self.parameter[name])
-                                                for name in self.parameter.keys()])]))
+            yield tessapi
 
-                page_image, page_coords, page_image_info = self.workspace.image_from_page(
-                    page, page_id)
-                if self.parameter['dpi'] > 0:
-                    dpi = self.parameter['dpi']
-                    LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
-                elif page_image_info.resolution != 1:
-                    dpi = page_image_info.resolution
-                    if page_image_info.resolutionUnit == 'cm':
-                        dpi = round(dpi * 2.54)
-                    LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
-                else:
-                    dpi = 0
-                    LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
-                if dpi:
-                    tessapi.SetVariable('user_defined_dpi', str(dpi))
+    def _page_image(self, page, page_id):
+        return self.workspace.image_from_page(page, page_id)
 
-                #
-                # prepare dict of reading order
-                reading_order = dict()
-                ro = page.get_ReadingOrder()
-                if not ro:
-                    LOG.warning("Page '%s' contains no ReadingOrder", page_id)
-                    rogroup = None
+    def _process_page(self, tessapi, n, input_file, pcgts,
+                      page_image, page_coords, page_image_info):
+        overwrite_regions = self.parameter['overwrite_regions']
+        page_id = input_file.pageId or input_file.ID
+        page = pcgts.get_Page()
+        
+        # add metadata about this operation and its runtime parameters:
+        metadata = pcgts.get_Metadata() # ensured by from_file()
+        metadata.add_MetadataItem(
+            MetadataItemType(type_="processingStep",
+                             name=self.ocrd_tool['steps'][0],
+                             value=TOOL,
+                             Labels=[LabelsType(
+                                 externalModel="ocrd-tool",
+                                 externalId="parameters",
+                                 Label=[LabelType(type_=name,
+                                                  value=self.parameter[name])
+                                        for name in self.parameter.keys()])]))
+
+        if self.parameter['dpi'] > 0:
+            dpi = self.parameter['dpi']
+            LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
+        elif page_image_info.resolution != 1:
+            dpi = page_image_info.resolution
+            if page_image_info.resolutionUnit == 'cm':
+                dpi = round(dpi * 2.54)
+            LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
+        else:
+            dpi = 0
+            LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
+        # (also reset when unknown, so the result does not depend
+        #  on which pages the instance has processed before)
+        tessapi.SetVariable('user_defined_dpi', str(dpi))
+
+        #
+        # prepare dict of reading order
+        reading_order = dict()
+        ro = page.get_ReadingOrder()
+        if not ro:
+            LOG.warning("Page '%s' contains no ReadingOrder", page_id)
+            rogroup = None
+        else:
+            rogroup = ro.get_OrderedGroup() or ro.get_UnorderedGroup()
+            page_get_reading_order(reading_order, rogroup)
+        #
+        # dive into regions
+        regions = page.get_TableRegion()
+        for region in regions:
+            # delete or warn of existing regions:
+            if region.get_TextRegion():
+                if overwrite_regions:
+                    LOG.info('removing existing TextRegions in block "%s" of page "%s"', region.id, page_id)
+                    for subregion in region.get_TextRegion():
+                        if subregion.id in reading_order:
+                            regionref = reading_order[subregion.id]
+                            # could be any of the 6 types above:
+                            regionrefs = rogroup.__getattribute__(regionref.__class__.__name__.replace('Type', ''))
+                            # remove in-place
+                            regionrefs.remove(regionref)
+                            # TODO: adjust index to make contiguous again?
+                    region.set_TextRegion([])
                 else:
-                    rogroup = ro.get_OrderedGroup() or ro.get_UnorderedGroup()
-                    page_get_reading_order(reading_order, rogroup)
-                #
-                # dive into regions
-                regions = page.get_TableRegion()
-                for region in regions:
-                    # delete or warn of existing regions:
-                    if region.get_TextRegion():
-                        if overwrite_regions:
-                            LOG.info('removing existing TextRegions in block "%s" of page "%s"', region.id, page_id)
-                            for subregion in region.get_TextRegion():
-                                if subregion.id in reading_order:
-                                    regionref = reading_order[subregion.id]
-                                    # could be any of the 6 types above:
-                                    regionrefs = rogroup.__getattribute__(regionref.__class__.__name__.replace('Type', ''))
-                                    # remove in-place
-                                    regionrefs.remove(regionref)
-                                    # TODO: adjust index to make contiguous again?
-                            region.set_TextRegion([])
-                        else:
-                            LOG.warning('keeping existing TextRegions in block "%s" of page "%s"', region.id, page_id)
-                    # get region image
-                    region_image, region_coords = self.workspace.image_from_segment(
-                        region, page_image, page_coords)
-                    tessapi.SetImage(region_image)
-                    LOG.info("Detecting table cells in region '%s'", region.id)
-                    #
-                    # detect the region segments:
-                    tessapi.SetPageSegMode(PSM.SPARSE_TEXT) # retrieve "cells"
-                    # TODO: we should XY-cut the sparse cells in regroup them into consistent cells
-                    layout = tessapi.AnalyseLayout()
-                    roelem = reading_order.get(region.id)
-                    if not roelem:
-                        LOG.warning("Page '%s' table region '%s' is not referenced in reading order (%s)",
-                                    page_id, region.id, "no target to add cells into")
-                    elif isinstance(roelem, (OrderedGroupType, OrderedGroupIndexedType)):
-                        LOG.warning("Page '%s' table region '%s' already has an ordered group (%s)",
-                                    page_id, region.id, "cells will be appended")
-                    elif isinstance(roelem, (UnorderedGroupType, UnorderedGroupIndexedType)):
-                        LOG.warning("Page '%s' table region '%s' already has an unordered group (%s)",
-                                    page_id, region.id, "cells will not be appended")
-                        roelem = None
-                    elif isinstance(roelem, RegionRefIndexedType):
-                        # replace regionref by group with same index and ref
-                        # (which can then take the cells as subregions)
-                        roelem2 = OrderedGroupIndexedType(id=region.id + '_order',
-                                                          index=roelem.index,
-                                                          regionRef=roelem.regionRef)
-                        roelem.parent_object_.add_OrderedGroupIndexed(roelem2)
-                        roelem.parent_object_.get_RegionRefIndexed().remove(roelem)
-                        roelem = roelem2
-                    elif isinstance(roelem, RegionRefType):
-                        # replace regionref by group with same ref
-                        # (which can then take the cells as subregions)
-                        roelem2 = OrderedGroupType(id=region.id + '_order',
-                                                   regionRef=roelem.regionRef)
-                        roelem.parent_object_.add_OrderedGroup(roelem2)
-                        roelem.parent_object_.get_RegionRef().remove(roelem)
-                        roelem = roelem2
-                    self._process_region(layout, region, roelem, region_image, region_coords)
-                    
-                # Use input_file's basename for the new file -
-                # this way the files retain the same basenames:
-                file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)
-                if file_id == input_file.ID:
-                    file_id = concat_padded(self.output_file_grp, n)
-                self.workspace.add_file(
-                    force=True,
-                    ID=file_id,
-                    file_grp=self.output_file_grp,
-                    pageId=input_file.pageId,
-                    mimetype=MIMETYPE_PAGE,
-                    local_filename=os.path.join(self.output_file_grp,
-                                                file_id + '.xml'),
-                    content=to_xml(pcgts))
+                    LOG.warning('keeping existing TextRegions in block "%s" of page "%s"', region.id, page_id)
+            # get region image
+            region_image, region_coords = self.workspace.image_from_segment(
+                region, page_image, page_coords)
+            set_image(tessapi, region_image)
+            LOG.info("Detecting table cells in region '%s'", region.id)
+            #
+            # detect the region segments:
+            tessapi.SetPageSegMode(PSM.SPARSE_TEXT) # retrieve "cells"
+            # TODO: we should XY-cut the sparse cells in regroup them into consistent cells
+            with stage('AnalyseLayout'):
+                layout = tessapi.AnalyseLayout()
+            roelem = reading_order.get(region.id)
+            if not roelem:
+                LOG.warning("Page '%s' table region '%s' is not referenced in reading order (%s)",
+                            page_id, region.id, "no target to add cells into")
+            elif isinstance(roelem, (OrderedGroupType, OrderedGroupIndexedType)):
+                LOG.warning("Page '%s' table region '%s' already has an ordered group (%s)",
+                            page_id, region.id, "cells will be appended")
+            elif isinstance(roelem, (UnorderedGroupType, UnorderedGroupIndexedType)):
+                LOG.warning("Page '%s' table region '%s' already has an unordered group (%s)",
+                            page_id, region.id, "cells will not be appended")
+                roelem = None
+            elif isinstance(roelem, RegionRefIndexedType):
+                # replace regionref by group with same index and ref
+                # (which can then take the cells as subregions)
+                roelem2 = OrderedGroupIndexedType(id=region.id + '_order',
+                                                  index=roelem.index,
+                                                  regionRef=roelem.regionRef)
+                roelem.parent_object_.add_OrderedGroupIndexed(roelem2)
+                roelem.parent_object_.get_RegionRefIndexed().remove(roelem)
+                roelem = roelem2
+            elif isinstance(roelem, RegionRefType):
+                # replace regionref by group with same ref
+                # (which can then take the cells as subregions)
+                roelem2 = OrderedGroupType(id=region.id + '_order',
+                                           regionRef=roelem.regionRef)
+                roelem.parent_object_.add_OrderedGroup(roelem2)
+                roelem.parent_object_.get_RegionRef().remove(roelem)
+                roelem = roelem2
+            self._process_region(layout, region, roelem, region_image, region_coords)
 
     def _process_region(self, it, region, rogroup, region_image, region_coords):
         # equivalent to GetComponentImages with raw_image=True,
@@ -232,6 +223,7 @@ class TesserocrSegmentTable(Processor):
                 continue
             LOG.info("Detected cell '%s': %s (%s)", ID, points, membername(PT, block_type))
             region.add_TextRegion(subregion)
+            count('regions')
             if rogroup:
                 rogroup.add_RegionRefIndexed(RegionRefIndexedType(regionRef=ID, index=index))
             #
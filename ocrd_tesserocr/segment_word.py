@@ -1,26 +1,26 @@
 from __future__ import absolute_import
 
-import os.path
+from contextlib import contextmanager
 from tesserocr import RIL, PyTessBaseAPI, PSM
 
 from ocrd import Processor
 from ocrd_utils import (
-    getLogger, concat_padded,
+    getLogger,
     polygon_from_xywh,
     points_from_polygon,
-    coordinates_for_segment,
-    MIMETYPE_PAGE
+    coordinates_for_segment
 )
-from ocrd_modelfactory import page_from_file
 from ocrd_models.ocrd_page import (
     CoordsType,
     LabelType, LabelsType,
     MetadataItemType,
     WordType,
-    to_xml,
 )
 
 from ocrd_tesserocr.config import TESSDATA_PREFIX, OCRD_TOOL
+from ocrd_tesserocr.executor import process_pages
+from ocrd_tesserocr.image import set_image
+from ocrd_tesserocr.metrics import stage, count
 
 TOOL = 'ocrd-tesserocr-segment-word'
 LOG = getLogger('processor.TesserocrSegmentWord')
@@ -45,78 +45,73 @@ class TesserocrSegmentWord(Processor):
         
         Produce a new output file by serialising the resulting hierarchy.
         """
-        overwrite_words = self.parameter['overwrite_words']
+        process_pages(self, self._setup, self._page_image, self._process_page)
 
+    @contextmanager
+    def _setup(self):
         with PyTessBaseAPI(
             psm=PSM.SINGLE_LINE,
             path=TESSDATA_PREFIX
         ) as tessapi:
-            for (n, input_file) in enumerate(self.input_files):
-                page_id = input_file.pageId or input_file.ID
-                LOG.info("INPUT FILE %i / %s", n, page_id)
-                pcgts = page_from_file(self.workspace.download_file(input_file))
-                page = pcgts.get_Page()
-                
-                # add metadata about this operation and its runtime parameters:
-                metadata = pcgts.get_Metadata() # ensured by from_file()
-                metadata.add_MetadataItem(
-                    MetadataItemType(type_="processingStep",
-                                     name=self.ocrd_tool['steps'][0],
-                                     value=TOOL,
-                                     Labels=[LabelsType(
-                                         externalModel="ocrd-tool",
-                                         externalId="parameters",
-                                         Label=[LabelType(type_=name,
-                                                          value=self.parameter[name])
-                                                for name in self.parameter.keys()])]))
-                page_image, page_coords, page_image_info = self.workspace.image_from_page(
-                    page, page_id)
-                if self.parameter['dpi'] > 0:
-                    dpi = self.parameter['dpi']
-                    LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
-                elif page_image_info.resolution != 1:
-                    dpi = page_image_info.resolution
-                    if page_image_info.resolutionUnit == 'cm':
-                        dpi = round(dpi * 2.54)
-                    LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
-                else:
-                    dpi = 0
-                    LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
-                if dpi:
-                    tessapi.SetVariable('user_defined_dpi', str(dpi))
-                
-                for region in page.get_TextRegion():
-                    region_image, region_coords = self.workspace.image_from_segment(
-                        region, page_image, page_coords)
-                    for line in region.get_TextLine():
-                        if line.get_Word():
-                            if overwrite_words:
-                                LOG.info('removing existing Words in line "%s"', line.id)
-                                line.set_Word([])
-                            else:
-                                LOG.warning('keeping existing Words in line "%s"', line.id)
-                        LOG.debug("Detecting words in line '%s'", line.id)
-                        line_image, line_coords = self.workspace.image_from_segment(
-                            line, region_image, region_coords)
-                        tessapi.SetImage(line_image)
-                        for word_no, component in enumerate(tessapi.GetComponentImages(RIL.WORD, True, raw_image=True)):
-                            word_id = '%s_word%04d' % (line.id, word_no)
-                            word_polygon = polygon_from_xywh(component[1])
-                            word_polygon = coordinates_for_segment(word_polygon, line_image, line_coords)
-                            word_points = points_from_polygon(word_polygon)
-                            line.add_Word(WordType(
-                                id=word_id, Coords=CoordsType(word_points)))
-                            
-                # Use input_file's basename for the new file -
-                # this way the files retain the same basenames:
-                file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)
-                if file_id == input_file.ID:
-                    file_id = concat_padded(self.output_file_grp, n)
-                self.workspace.add_file(
-                    ID=file_id,
-                    file_grp=self.output_file_grp,
-                    pageId=input_file.pageId,
-                    mimetype=MIMETYPE_PAGE,
-                    local_filename=os.path.join(self.output_file_grp,
-                                                file_id + '.xml'),
-                    content=to_xml(pcgts))
+            yield tessapi
+
+    def _page_image(self, page, page_id):
+        return self.workspace.image_from_page(page, page_id)
+
+    def _process_page(self, tessapi, n, input_file, pcgts,
+                      page_image, page_coords, page_image_info):
+        overwrite_words = self.parameter['overwrite_words']
+        page_id = input_file.pageId or input_file.ID
+        page = pcgts.get_Page()
+        
+        # add metadata about this operation and its runtime parameters:
+        metadata = pcgts.get_Metadata() # ensured by from_file()
+        metadata.add_MetadataItem(
+            MetadataItemType(type_="processingStep",
+                             name=self.ocrd_tool['steps'][0],
+                             value=TOOL,
+                             Labels=[LabelsType(
+                                 externalModel="ocrd-tool",
+                                 externalId="parameters",
+                                 Label=[LabelType(type_=name,
+                                                  value=self.parameter[name])
+                                        for name in self.parameter.keys()])]))
+        if self.parameter['dpi'] > 0:
+            dpi = self.parameter['dpi']
+            LOG.info("Page '%s' images will use %d DPI from parameter override", page_id, dpi)
+        elif page_image_info.resolution != 1:
+            dpi = page_image_info.resolution
+            if page_image_info.resolutionUnit == 'cm':
+                dpi = round(dpi * 2.54)
+            LOG.info("Page '%s' images will use %d DPI from image meta-data", page_id, dpi)
+        else:
+            dpi = 0
+            LOG.info("Page '%s' images will use DPI estimated from segmentation", page_id)
+        # (also reset when unknown, so the result does not depend
+        #  on which pages the instance has processed before)
+        tessapi.SetVariable('user_defined_dpi', str(dpi))
+        
+        for region in page.get_TextRegion():
+            region_image, region_coords = self.workspace.image_from_segment(
+                region, page_image, page_coords)
+            for line in region.get_TextLine():
+                if line.get_Word():
+                    if overwrite_words:
+                        LOG.info('removing existing Words in line "%s"', line.id)
+                        line.set_Word([])
+                    else:
+                        LOG.warning('keeping existing Words in line "%s"', line.id)
+                LOG.debug("Detecting words in line '%s'", line.id)
+                line_image, line_coords = self.workspace.image_from_segment(
+                    line, region_image, region_coords)
+                set_image(tessapi, line_image)
+                with stage('AnalyseLayout'):
+                    components = tessapi.GetComponentImages(RIL.WORD, True, raw_image=True)
+                for word_no, component in enumerate(components):
+                    word_id = '%s_word%04d' % (line.id, word_no)
+                    word_polygon = polygon_from_xywh(component[1])
+                    word_polygon = coordinates_for_segment(word_polygon, line_image, line_coords)
+                    word_points = points_from_polygon(word_polygon)
+                    count('words')
+                    line.add_Word(WordType(
+                        id=word_id, Coords=CoordsType(word_points)))
@@ -0,0 +1,164 @@
+from __future__ import absolute_import
+
+import os
+import json
+import socket
+import tempfile
+import socketserver
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from ocrd_utils import getLogger
+from ocrd_validators import WorkspaceValidator
+from ocrd import Resolver
+
+from .recognize import TesserocrRecognize
+
+LOG = getLogger('processor.TesserocrRecognizeServer')
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'ocrd-tesserocr-recognize.sock')
+
+class ApiCache(object):
+    """Tesseract API instances kept alive across processor runs.
+
+    Entries are keyed by their configuration (model, variables etc.),
+    and the least recently used one is shut down when more than
+    ``size`` configurations are loaded.
+    """
+
+    def __init__(self, size=4):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, setup):
+        """Return a context manager for the instance(s) cached under ``key``.
+
+        If there are none yet, enter ``setup()`` to create them. Leaving
+        the returned context does not shut them down (only eviction does).
+        """
+        @contextmanager
+        def cached():
+            if key in self.entries:
+                LOG.debug("Reusing Tesseract for %s", str(key))
+                self.entries.move_to_end(key)
+            else:
+                LOG.info("Loading Tesseract for %s", str(key))
+                stack = ExitStack()
+                self.entries[key] = (stack, stack.enter_context(setup()))
+                while len(self.entries) > self.size:
+                    _, (oldstack, _) = self.entries.popitem(last=False)
+                    oldstack.close()
+            yield self.entries[key][1]
+        return cached()
+
+    def close(self):
+        """Shut down all cached instances."""
+        while self.entries:
+            _, (stack, _) = self.entries.popitem()
+            stack.close()
+
+def recognize_workspace(api_cache, mets, input_file_grp, output_file_grp,
+                        page_id=None, parameter=None, working_dir=None):
+    """Run ``TesserocrRecognize`` on the workspace of ``mets`` like the CLI would.
+
+    Validate the fileGrps, process with instances from ``api_cache``,
+    add the agent and save the METS. Restore the current working directory
+    afterwards.
+    """
+    cwd = os.getcwd()
+    try:
+        workspace = Resolver().workspace_from_url(mets, working_dir)
+        report = WorkspaceValidator.check_file_grp(
+            workspace, input_file_grp,
+            # existing results get checked page by page in incremental mode:
+            None if (parameter or {}).get('incremental') else output_file_grp)
+        if not report.is_valid:
+            raise Exception("Invalid input/output file grps:\n\t%s" % '\n\t'.join(report.errors))
+        processor = TesserocrRecognize(
+            workspace,
+            page_id=page_id,
+            input_file_grp=input_file_grp,
+            output_file_grp=output_file_grp,
+            parameter=parameter or {},
+            api_cache=api_cache)
+        processor.process()
+        workspace.mets.add_agent(
+            name='%s v%s' % (processor.ocrd_tool['executable'], processor.version),
+            _type='OTHER',
+            othertype='SOFTWARE',
+            role='OTHER',
+            otherrole=processor.ocrd_tool['steps'][0])
+        workspace.save_mets()
+    finally:
+        os.chdir(cwd)
+
+class RecognizeHandler(socketserver.StreamRequestHandler):
+    """Run one job per connection.
+
+    The request is a single line of JSON with the keyword arguments
+    of ``recognize_workspace``; the response is a single line of JSON
+    with ``status`` (``ok`` or ``error``) and an error ``message``.
+    """
+
+    def handle(self):
+        try:
+            job = json.loads(self.rfile.readline().decode('utf-8'))
+            LOG.info("Processing '%s' from %s to %s", job.get('mets'),
+                     job.get('input_file_grp'), job.get('output_file_grp'))
+            recognize_workspace(self.server.api_cache, **job)
+            response = {'status': 'ok'}
+        except Exception as err: # pylint: disable=broad-except
+            LOG.exception("Job failed")
+            response = {'status': 'error', 'message': str(err)}
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+class RecognizeServer(socketserver.UnixStreamServer):
+    """Serve recognition jobs on a local UNIX socket, keeping models loaded.
+
+    Jobs are processed one at a time (in the order of connection),
+    because the cached instances cannot be shared between runs.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, max_models=4):
+        self.api_cache = ApiCache(max_models)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super(RecognizeServer, self).__init__(socket_path, RecognizeHandler)
+
+    def server_close(self):
+        super(RecognizeServer, self).server_close()
+        self.api_cache.close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+def serve(socket_path=DEFAULT_SOCKET, max_models=4):
+    """Run a ``RecognizeServer`` until interrupted."""
+    with RecognizeServer(socket_path, max_models) as server:
+        LOG.info("Listening on %s", socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            LOG.info("Shutting down")
+
+def submit(socket_path=DEFAULT_SOCKET, **job):
+    """Send a job to the server on ``socket_path`` and wait for it to finish.
+
+    Relative METS paths are resolved against the current directory first.
+    Raise an exception if the job failed.
+    """
+    mets = job.get('mets')
+    if mets and '://' not in mets:
+        job['mets'] = os.path.abspath(mets)
+    if job.get('working_dir'):
+        job['working_dir'] = os.path.abspath(job['working_dir'])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as stream:
+            stream.write((json.dumps(job) + '\n').encode('utf-8'))
+            stream.flush()
+            response = json.loads(stream.readline().decode('utf-8'))
+    if response['status'] != 'ok':
+        raise Exception("Recognition failed on server: %s" % response.get('message'))
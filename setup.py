@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 """
-Installs five executables:
+Installs these executables:
 
     - ocrd_tesserocr_recognize
+    - ocrd_tesserocr_recognize_server
+    - ocrd_tesserocr_recognize_client
     - ocrd_tesserocr_segment_region
     - ocrd_tesserocr_segment_table
     - ocrd_tesserocr_segment_line
@@ -10,6 +12,8 @@ Installs five executables:
     - ocrd_tesserocr_crop
     - ocrd_tesserocr_deskew
     - ocrd_tesserocr_binarize
+    - ocrd_tesserocr_materialize
+    - ocrd_tesserocr_pipeline
 """
 import codecs
 import json
@@ -36,6 +40,8 @@ setup(
     entry_points={
         'console_scripts': [
             'ocrd-tesserocr-recognize=ocrd_tesserocr.cli:ocrd_tesserocr_recognize',
+            'ocrd-tesserocr-recognize-server=ocrd_tesserocr.cli:ocrd_tesserocr_recognize_server',
+            'ocrd-tesserocr-recognize-client=ocrd_tesserocr.cli:ocrd_tesserocr_recognize_client',
             'ocrd-tesserocr-segment-region=ocrd_tesserocr.cli:ocrd_tesserocr_segment_region',
             'ocrd-tesserocr-segment-table=ocrd_tesserocr.cli:ocrd_tesserocr_segment_table',
             'ocrd-tesserocr-segment-line=ocrd_tesserocr.cli:ocrd_tesserocr_segment_line',
@@ -43,6 +49,8 @@ setup(
             'ocrd-tesserocr-crop=ocrd_tesserocr.cli:ocrd_tesserocr_crop',
             'ocrd-tesserocr-deskew=ocrd_tesserocr.cli:ocrd_tesserocr_deskew',
             'ocrd-tesserocr-binarize=ocrd_tesserocr.cli:ocrd_tesserocr_binarize',
+            'ocrd-tesserocr-materialize=ocrd_tesserocr.cli:ocrd_tesserocr_materialize',
+            'ocrd-tesserocr-pipeline=ocrd_tesserocr.cli:ocrd_tesserocr_pipeline',
         ]
     },
 )
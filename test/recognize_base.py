@@ -0,0 +1,58 @@
+import os
+import shutil
+
+from test.base import TestCase, assets
+
+from ocrd.resolver import Resolver
+from ocrd_modelfactory import page_from_file
+from ocrd_tesserocr import TesserocrSegmentWord
+from ocrd_tesserocr import TesserocrSegmentLine
+from ocrd_tesserocr import TesserocrSegmentRegion
+
+#METS_HEROLD_SMALL = assets.url_of('SBB0000F29300010000/data/mets_one_file.xml')
+# as long as #96 remains, we cannot use workspaces which have local relative files:
+METS_HEROLD_SMALL = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
+
+WORKSPACE_DIR = '/tmp/pyocrd-test-recognizer'
+
+LEVELS = ['page', 'region', 'line', 'word', 'glyph']
+
+class RecognizeTestCase(TestCase):
+    """Base for recognition tests, each on a fresh copy of the workspace in ``self.workspace``."""
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+        self.workspace = Resolver().workspace_from_url(METS_HEROLD_SMALL, dst_dir=WORKSPACE_DIR)
+
+def segment(workspace, words=False):
+    """Segment regions and lines (and words) as input for recognition."""
+    TesserocrSegmentRegion(
+        workspace,
+        input_file_grp="OCR-D-IMG",
+        output_file_grp="OCR-D-SEG-BLOCK"
+    ).process()
+    TesserocrSegmentLine(
+        workspace,
+        input_file_grp="OCR-D-SEG-BLOCK",
+        output_file_grp="OCR-D-SEG-LINE"
+    ).process()
+    if words:
+        TesserocrSegmentWord(
+            workspace,
+            input_file_grp="OCR-D-SEG-LINE",
+            output_file_grp="OCR-D-SEG-WORD"
+        ).process()
+
+def descendants(page, level):
+    """Get all text segments of ``level`` in ``page`` (in order)."""
+    found = [page]
+    for getter in ['get_TextRegion', 'get_TextLine', 'get_Word', 'get_Glyph'][:LEVELS.index(level)]:
+        found = [child for parent in found for child in getattr(parent, getter)()]
+    return found
+
+def segments(workspace, file_grp, level='word'):
+    """Get all text segments of ``level`` in the PAGE files of ``file_grp`` (in order)."""
+    for output_file in workspace.mets.find_files(fileGrp=file_grp):
+        yield from descendants(page_from_file(workspace.download_file(output_file)).get_Page(), level)
@@ -0,0 +1,38 @@
+import os
+import sqlite3
+
+from test.base import main
+from test.recognize_base import RecognizeTestCase, WORKSPACE_DIR, segment, segments
+
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeCache(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        segment(workspace)
+        cache = os.path.join(WORKSPACE_DIR, 'cache.sqlite')
+        results = []
+        sizes = []
+        for run in range(2):
+            output_file_grp = "OCR-D-OCR-TESS-%d" % run
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-LINE",
+                output_file_grp=output_file_grp,
+                parameter={'textequiv_level': 'glyph', 'cache': cache}
+            ).process()
+            results.append([(word.id, word.get_Coords().points,
+                             [glyph.get_TextEquiv()[0].Unicode for glyph in word.get_Glyph()])
+                            for word in segments(workspace, output_file_grp)])
+            with sqlite3.connect(cache) as db:
+                sizes.append(db.execute('SELECT COUNT(*) FROM results').fetchone()[0])
+        self.assertTrue(results[0])
+        self.assertEqual(results[0], results[1])
+        # the second run must not have added any results:
+        self.assertTrue(sizes[0])
+        self.assertEqual(sizes[0], sizes[1])
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import os
+import json
+import shutil
+
+from test.base import TestCase, main, assets
+
+from ocrd.resolver import Resolver
+from ocrd_modelfactory import page_from_file
+from ocrd_tesserocr import TesserocrSegmentRegion, TesserocrDeskew
+
+METS_KANT = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
+
+WORKSPACE_DIR = '/tmp/pyocrd-test-deskew-tesserocr'
+
+def deskew_regions(workspace, output_file_grp, parameter):
+    """Deskew the regions of OCR-D-SEG-BLOCK.
+
+    Return the primaryScript and orientation of each region, and the
+    number of OSD calls.
+    """
+    metrics = os.path.join(WORKSPACE_DIR, output_file_grp + '.metrics.json')
+    TesserocrDeskew(
+        workspace,
+        input_file_grp="OCR-D-SEG-BLOCK",
+        output_file_grp=output_file_grp + ',' + output_file_grp + '-IMG',
+        parameter=dict(parameter, operation_level='region', metrics=metrics)
+    ).process()
+    with open(metrics, 'r') as f:
+        records = [json.loads(line) for line in f]
+    calls = sum(record['stages'].get('DetectOrientationScript', {}).get('calls', 0)
+                for record in records)
+    regions = dict()
+    for output_file in workspace.mets.find_files(fileGrp=output_file_grp):
+        page = page_from_file(workspace.download_file(output_file)).get_Page()
+        for region in page.get_TextRegion() + page.get_TableRegion():
+            regions[output_file.pageId, region.id] = (region.get_primaryScript(),
+                                                      region.get_orientation())
+    return regions, calls
+
+class TestTesserocrDeskewPageOSD(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        TesserocrSegmentRegion(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-SEG-BLOCK"
+        ).process()
+        pages = len(list(workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK")))
+        each, each_calls = deskew_regions(workspace, "OCR-D-DESKEW-REGION", {})
+        once, once_calls = deskew_regions(workspace, "OCR-D-DESKEW-PAGE", {'page_osd': True})
+        self.assertTrue(each)
+        self.assertEqual(each_calls, len(each))
+        # OSD only ran on the pages:
+        self.assertEqual(once_calls, pages)
+        self.assertEqual(set(once), set(each))
+        # (regions too small for a confident script of their own
+        #  get the page's, so only compare the others)
+        for region, (script, orientation) in each.items():
+            if script:
+                self.assertEqual(once[region], (script, orientation), region)
+        workspace.save_mets()
+
+class TestTesserocrDeskewPageOSDFallback(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        TesserocrSegmentRegion(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-SEG-BLOCK"
+        ).process()
+        pages = len(list(workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK")))
+        # no orientation result is ever confident enough:
+        parameter = {'min_orientation_confidence': 1000}
+        each, each_calls = deskew_regions(workspace, "OCR-D-DESKEW-REGION", parameter)
+        fallback, fallback_calls = deskew_regions(workspace, "OCR-D-DESKEW-PAGE",
+                                                  dict(parameter, page_osd=True))
+        self.assertTrue(each)
+        # OSD ran on the pages, and then on each region again:
+        self.assertEqual(fallback_calls, pages + each_calls)
+        self.assertEqual(fallback, each)
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import threading
+
+from test.base import TestCase, main
+
+from ocrd_tesserocr.executor import WriteBehindWorkspace, WRITE_QUEUE_SIZE
+
+WORKSPACE_DIR = '/tmp/pyocrd-test-executor-tesserocr'
+
+class StubWorkspace(object):
+    """Records ``add_file`` calls (without content) and creates the directories like ``Workspace``."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = list()
+
+    def add_file(self, file_grp, content=None, **kwargs):
+        assert content is None
+        os.makedirs(os.path.join(self.directory, file_grp), exist_ok=True)
+        self.files.append(dict(kwargs, file_grp=file_grp))
+        return kwargs['ID']
+
+def add(writer, n, content):
+    return writer.add_file('OCR-D-TEST', ID='FILE_%04d' % n,
+                           local_filename=os.path.join('OCR-D-TEST', 'FILE_%04d.xml' % n),
+                           mimetype='application/vnd.prima.page+xml',
+                           content=content)
+
+def read(n):
+    with open(os.path.join(WORKSPACE_DIR, 'OCR-D-TEST', 'FILE_%04d.xml' % n), 'rb') as f:
+        return f.read()
+
+class TestWriteBehindWorkspace(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        workspace = StubWorkspace(WORKSPACE_DIR)
+        writer = WriteBehindWorkspace(workspace)
+        # more files than fit into the queue, of all kinds of content:
+        for n in range(2 * WRITE_QUEUE_SIZE):
+            content = [b'bytes %d' % n, 'str %d' % n, lambda n=n: 'callable %d' % n][n % 3]
+            self.assertEqual(add(writer, n, content), 'FILE_%04d' % n)
+        # referenced right away, by the calling thread:
+        self.assertEqual(len(workspace.files), 2 * WRITE_QUEUE_SIZE)
+        self.assertEqual(len(writer.added), 2 * WRITE_QUEUE_SIZE)
+        writer.flush()
+        for n in range(2 * WRITE_QUEUE_SIZE):
+            self.assertEqual(read(n), [b'bytes %d', b'str %d', b'callable %d'][n % 3] % n)
+        # close writes what has been added after the last flush, too:
+        add(writer, 2 * WRITE_QUEUE_SIZE, 'last')
+        writer.close()
+        self.assertEqual(read(2 * WRITE_QUEUE_SIZE), b'last')
+
+class TestWriteBehindWorkspaceError(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        workspace = StubWorkspace(WORKSPACE_DIR)
+        writer = WriteBehindWorkspace(workspace)
+        def fail():
+            raise ValueError('cannot serialise')
+        add(writer, 0, 'good')
+        add(writer, 1, fail)
+        add(writer, 2, 'after the error')
+        with self.assertRaisesRegex(ValueError, 'cannot serialise'):
+            writer.flush()
+        self.assertEqual(read(0), b'good')
+        # (the queue gets drained, but nothing more written)
+        self.assertFalse(os.path.exists(os.path.join(WORKSPACE_DIR, 'OCR-D-TEST', 'FILE_0002.xml')))
+        # the error also reaches the next caller:
+        with self.assertRaisesRegex(ValueError, 'cannot serialise'):
+            add(writer, 3, 'too late')
+        with self.assertRaisesRegex(ValueError, 'cannot serialise'):
+            writer.close()
+
+class TestWriteBehindWorkspaceBackpressure(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        workspace = StubWorkspace(WORKSPACE_DIR)
+        writer = WriteBehindWorkspace(workspace)
+        started = threading.Event()
+        release = threading.Event()
+        def slow():
+            started.set()
+            release.wait()
+            return 'slow'
+        add(writer, 0, slow)
+        # the writer is now stuck in the first file:
+        self.assertTrue(started.wait(10))
+        adder = threading.Thread(target=lambda: [add(writer, n, 'fast %d' % n)
+                                                 for n in range(1, WRITE_QUEUE_SIZE + 2)])
+        adder.start()
+        # the queue fills up, and the last file cannot be queued:
+        adder.join(1)
+        self.assertTrue(adder.is_alive())
+        self.assertEqual(len(workspace.files), WRITE_QUEUE_SIZE + 2)
+        self.assertFalse(os.path.exists(os.path.join(WORKSPACE_DIR, 'OCR-D-TEST', 'FILE_0001.xml')))
+        # once the writer catches up, adding continues:
+        release.set()
+        adder.join(10)
+        self.assertFalse(adder.is_alive())
+        writer.close()
+        self.assertEqual(read(0), b'slow')
+        for n in range(1, WRITE_QUEUE_SIZE + 2):
+            self.assertEqual(read(n), b'fast %d' % n)
+
+if __name__ == '__main__':
+    main()
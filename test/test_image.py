@@ -0,0 +1,97 @@
+from PIL import Image, ImageDraw
+import numpy as np
+
+from test.base import TestCase, main
+
+from tesserocr import PyTessBaseAPI
+from ocrd_tesserocr.config import TESSDATA_PREFIX
+from ocrd_utils import coordinates_for_segment
+from ocrd_tesserocr.image import set_image, is_blank, downscale_image, projection_border
+
+class TestSetImage(TestCase):
+
+    def runTest(self):
+        image = Image.new('L', (300, 100), 220)
+        draw = ImageDraw.Draw(image)
+        for x in range(10, 280, 30):
+            draw.rectangle([x, 20, x + 17, 70], fill=20)
+        with PyTessBaseAPI(path=TESSDATA_PREFIX) as tessapi:
+            for mode in ['RGB', 'RGBA', 'L', '1', 'P']:
+                converted = image.convert(mode)
+                tessapi.SetImage(converted)
+                expected = np.array(tessapi.GetThresholdedImage())
+                set_image(tessapi, converted)
+                self.assertTrue(np.array_equal(np.array(tessapi.GetThresholdedImage()), expected), mode)
+            tessapi.SetImage(image)
+            expected = np.array(tessapi.GetThresholdedImage())
+            set_image(tessapi, np.array(image))
+            self.assertTrue(np.array_equal(np.array(tessapi.GetThresholdedImage()), expected))
+            binary = image.convert('1', dither=Image.NONE)
+            tessapi.SetImage(binary)
+            expected = np.array(tessapi.GetThresholdedImage())
+            set_image(tessapi, np.array(binary))
+            self.assertTrue(np.array_equal(np.array(tessapi.GetThresholdedImage()), expected))
+            with self.assertRaises(Exception):
+                set_image(tessapi, np.zeros((10, 10), dtype=np.float32))
+
+class TestIsBlank(TestCase):
+
+    def runTest(self):
+        image = Image.new('L', (2000, 3000), 230)
+        self.assertTrue(is_blank(image, 0.001))
+        self.assertFalse(is_blank(image, 0))
+        self.assertTrue(is_blank(Image.new('L', (0, 0)), 0.001))
+        # speckles are not enough:
+        draw = ImageDraw.Draw(image)
+        for x in range(100, 1900, 400):
+            draw.point((x, 1500), fill=0)
+        self.assertTrue(is_blank(image, 0.001))
+        self.assertTrue(is_blank(image.convert('1', dither=Image.NONE), 0.001))
+        # but a few lines of text are:
+        for y in range(200, 400, 40):
+            draw.rectangle([100, y, 1900, y + 20], fill=30)
+        self.assertFalse(is_blank(image, 0.001))
+        self.assertFalse(is_blank(image.convert('RGB'), 0.001))
+
+class TestDownscaleImage(TestCase):
+
+    def runTest(self):
+        image = Image.new('1', (2000, 3000), 1)
+        coords = {'transform': np.eye(3), 'features': ''}
+        self.assertIs(downscale_image(image, coords, 0, 150)[0], image)
+        self.assertIs(downscale_image(image, coords, 150, 300)[0], image)
+        small, small_coords = downscale_image(image, coords, 600, 150)
+        self.assertEqual(small.size, (500, 750))
+        self.assertEqual(small.mode, 'L')
+        self.assertEqual(small_coords['features'], '')
+        # results on the small image map back to the page:
+        self.assertEqual(coordinates_for_segment([[0, 0], [500, 750], [100, 10]], small, small_coords).tolist(),
+                         [[0, 0], [2000, 3000], [400, 40]])
+
+class TestProjectionBorder(TestCase):
+
+    def runTest(self):
+        # paper with a dark scanner margin on the left and at the bottom:
+        image = Image.new('L', (2000, 3000), 220)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, 149, 2999], fill=10)
+        draw.rectangle([0, 2900, 1999, 2999], fill=10)
+        self.assertEqual(projection_border(image), (None, "no text"))
+        # text lines, a page number (in a few glyphs) and some speckles:
+        for y in range(400, 2000, 80):
+            draw.rectangle([400, y, 1700, y + 25], fill=30)
+        for x in range(980, 1040, 20):
+            draw.rectangle([x, 2600, x + 15, 2640], fill=30)
+        for x in range(300, 1900, 250):
+            draw.point((x, 250), fill=0)
+        bbox, decision = projection_border(image)
+        self.assertIn("paper", decision)
+        left, top, right, bottom = bbox
+        self.assertTrue(380 <= left <= 400 and 1700 <= right <= 1720, bbox)
+        self.assertTrue(380 <= top <= 400 and 2640 <= bottom <= 2660, bbox)
+        # a photo is ambiguous:
+        draw.rectangle([150, 0, 1999, 2899], fill=60)
+        self.assertEqual(projection_border(image)[0], None)
+
+if __name__ == '__main__':
+    main()
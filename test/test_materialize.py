@@ -0,0 +1,53 @@
+import os
+import shutil
+
+from test.base import TestCase, main, assets
+
+from ocrd.resolver import Resolver
+from ocrd_modelfactory import page_from_file
+from ocrd_tesserocr import TesserocrCrop, TesserocrMaterialize
+
+METS_HEROLD_SMALL = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
+
+WORKSPACE_DIR = '/tmp/pyocrd-test-materialize-tesserocr'
+
+class TestTesserocrMaterialize(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_HEROLD_SMALL, dst_dir=WORKSPACE_DIR)
+        TesserocrCrop(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-CROP",
+            parameter={'write_images': False}
+        ).process()
+        workspace.save_mets()
+        # only the Border gets annotated:
+        self.assertNotIn('OCR-D-IMG-CROP', workspace.mets.file_groups)
+        for input_file in workspace.mets.find_files(fileGrp="OCR-D-CROP"):
+            page = page_from_file(workspace.download_file(input_file)).get_Page()
+            self.assertTrue(page.get_Border())
+            self.assertFalse(page.get_AlternativeImage())
+        TesserocrMaterialize(
+            workspace,
+            input_file_grp="OCR-D-CROP",
+            output_file_grp="OCR-D-MAT,OCR-D-IMG-MAT",
+            parameter={'binarize': True}
+        ).process()
+        workspace.save_mets()
+        for input_file in workspace.mets.find_files(fileGrp="OCR-D-MAT"):
+            page = page_from_file(workspace.download_file(input_file)).get_Page()
+            images = page.get_AlternativeImage()
+            self.assertEqual(len(images), 1)
+            self.assertEqual(set(images[0].get_comments().split(',')) - {''},
+                             {'cropped', 'binarized'})
+            self.assertTrue(os.path.exists(os.path.join(WORKSPACE_DIR, images[0].get_filename())))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+from unittest import mock
+
+from test.base import TestCase, main, assets
+
+from ocrd import Workspace
+from ocrd.resolver import Resolver
+from ocrd_modelfactory import page_from_file
+from ocrd_tesserocr import TesserocrPipeline
+
+METS_HEROLD_SMALL = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
+
+WORKSPACE_DIR = '/tmp/pyocrd-test-pipeline-tesserocr'
+
+class TestTesserocrPipeline(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_HEROLD_SMALL, dst_dir=WORKSPACE_DIR)
+        TesserocrPipeline(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-OCR-TESS",
+            parameter={
+                'steps': 'crop,deskew,segment-region,segment-line,recognize',
+                'step_parameters': json.dumps({
+                    'deskew': {'operation_level': 'page'},
+                    'recognize': {'textequiv_level': 'line'}}),
+                'file_grps': json.dumps({
+                    'deskew': 'OCR-D-DESKEW,OCR-D-IMG-DESKEW'})}
+        ).process()
+        workspace.save_mets()
+        # only the final and selected intermediate results get written:
+        for grp in ['OCR-D-DESKEW', 'OCR-D-IMG-DESKEW', 'OCR-D-OCR-TESS']:
+            self.assertIn(grp, workspace.mets.file_groups)
+        for grp in workspace.mets.file_groups:
+            self.assertFalse(grp.startswith('OCR-D-OCR-TESS-'))
+            self.assertNotIn('CROP', grp)
+        for input_file in workspace.mets.find_files(fileGrp="OCR-D-OCR-TESS"):
+            pcgts = page_from_file(workspace.download_file(input_file))
+            page = pcgts.get_Page()
+            self.assertTrue(page.get_Border())
+            self.assertTrue(page.get_TextRegion())
+            self.assertTrue(page.get_TextRegion()[0].get_TextLine())
+            # no references to images that have not been written:
+            for image in page.get_AlternativeImage():
+                self.assertTrue(image.get_filename().startswith('OCR-D-IMG-DESKEW'))
+                self.assertTrue(os.path.exists(os.path.join(WORKSPACE_DIR, image.get_filename())))
+
+class TestTesserocrPipelineImages(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_HEROLD_SMALL, dst_dir=WORKSPACE_DIR)
+        image_from_page = Workspace.image_from_page
+        with mock.patch.object(Workspace, 'image_from_page', autospec=True,
+                               side_effect=image_from_page) as resolved:
+            TesserocrPipeline(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp="OCR-D-OCR-TESS",
+                parameter={
+                    'steps': 'segment-region,binarize,segment-line'}
+            ).process()
+        # the page image gets decoded only once, and the binarized region
+        # images (which have not been written) get passed on in memory:
+        pages = len(list(workspace.mets.find_files(fileGrp="OCR-D-IMG")))
+        self.assertEqual(resolved.call_count, pages)
+        self.assertNotIn('OCR-D-OCR-TESS-BINARIZE-IMG', workspace.mets.file_groups)
+        for input_file in workspace.mets.find_files(fileGrp="OCR-D-OCR-TESS"):
+            pcgts = page_from_file(workspace.download_file(input_file))
+            regions = pcgts.get_Page().get_TextRegion()
+            self.assertTrue(regions)
+            self.assertTrue(any(region.get_TextLine() for region in regions))
+            self.assertFalse(any(region.get_AlternativeImage() for region in regions))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+from test.base import main
+from test.recognize_base import RecognizeTestCase, segment, segments
+
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeThreads(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        segment(workspace)
+        results = []
+        for threads in [1, 3]:
+            output_file_grp = "OCR-D-OCR-TESS-%d" % threads
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-LINE",
+                output_file_grp=output_file_grp,
+                parameter={'textequiv_level': 'word', 'threads': threads}
+            ).process()
+            results.append([(word.id, word.get_Coords().points, word.get_TextEquiv()[0].Unicode)
+                            for word in segments(workspace, output_file_grp)])
+        self.assertTrue(results[0])
+        self.assertEqual(results[0], results[1])
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,20 @@
 import os
-import shutil
+import json
 
-from test.base import TestCase, main, assets, skip
+from test.base import main
+from test.recognize_base import RecognizeTestCase, WORKSPACE_DIR, segment, segments
 
-from ocrd.resolver import Resolver
+from tesserocr import get_languages
 from ocrd_tesserocr import TesserocrSegmentWord
 from ocrd_tesserocr import TesserocrSegmentLine
 from ocrd_tesserocr import TesserocrSegmentRegion
 from ocrd_tesserocr import TesserocrRecognize
 
-#METS_HEROLD_SMALL = assets.url_of('SBB0000F29300010000/data/mets_one_file.xml')
-# as long as #96 remains, we cannot use workspaces which have local relative files:
-METS_HEROLD_SMALL = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
-
-WORKSPACE_DIR = '/tmp/pyocrd-test-recognizer'
-
-class TestTesserocrRecognize(TestCase):
-
-    def setUp(self):
-        if os.path.exists(WORKSPACE_DIR):
-            shutil.rmtree(WORKSPACE_DIR)
-        os.makedirs(WORKSPACE_DIR)
+class TestTesserocrRecognize(RecognizeTestCase):
 
     #skip("Takes too long")
     def runTest(self):
-        resolver = Resolver()
-        workspace = resolver.workspace_from_url(METS_HEROLD_SMALL, dst_dir=WORKSPACE_DIR)
+        workspace = self.workspace
         TesserocrSegmentRegion(
             workspace,
             input_file_grp="OCR-D-IMG",
@@ -63,5 +52,46 @@ class TestTesserocrRecognize(TestCase):
         ).process()
         workspace.save_mets()
 
+class TestTesserocrRecognizeCascade(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        segment(workspace)
+        # fall back to a different model if one is installed:
+        _, models = get_languages()
+        fallback = next((model for model in sorted(models)
+                         if model not in ['eng', 'osd', 'equ']), 'eng')
+        cascade = 'eng,' + fallback
+        results = []
+        fallbacks = []
+        # single model, cascade never falling back, cascade always falling back:
+        for n, parameter in enumerate([{'model': 'eng'},
+                                       {'model_cascade': cascade, 'cascade_threshold': 0},
+                                       {'model_cascade': cascade, 'cascade_threshold': 1.01,
+                                        'threads': 2}]):
+            output_file_grp = "OCR-D-OCR-TESS-%d" % n
+            metrics = os.path.join(WORKSPACE_DIR, output_file_grp + '.metrics.json')
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-LINE",
+                output_file_grp=output_file_grp,
+                parameter=dict(parameter, textequiv_level='word', metrics=metrics)
+            ).process()
+            with open(metrics, 'r') as f:
+                records = [json.loads(line) for line in f]
+            fallbacks.append(sum(record['counts'].get('cascade', 0) for record in records))
+            results.append([(word.id, word.get_TextEquiv()[0].Unicode)
+                            for word in segments(workspace, output_file_grp)])
+        self.assertTrue(results[0])
+        self.assertEqual(fallbacks[:2], [0, 0])
+        self.assertEqual(results[0], results[1])
+        # the fallback model really ran:
+        self.assertGreater(fallbacks[2], 0)
+        self.assertTrue(results[2])
+        if fallback == 'eng':
+            # (the same model never gives a better result)
+            self.assertEqual(results[0], results[2])
+        workspace.save_mets()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,32 @@
+from test.base import main
+from test.recognize_base import RecognizeTestCase, segment, segments
+
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeAdaptiveChoices(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        segment(workspace)
+        def choices(output_file_grp, threshold):
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-LINE",
+                output_file_grp=output_file_grp,
+                parameter={'textequiv_level': 'glyph', 'adaptive_choices': threshold}
+            ).process()
+            return [len(glyph.get_TextEquiv())
+                    for glyph in segments(workspace, output_file_grp, 'glyph')]
+        # no word uncertain enough: only the best glyph everywhere
+        counts = choices("OCR-D-OCR-TESS-CERTAIN", 0.001)
+        self.assertTrue(counts)
+        self.assertEqual(set(counts), {1})
+        # all words recognized again: alternatives for some glyphs
+        counts = choices("OCR-D-OCR-TESS-UNCERTAIN", 1.01)
+        self.assertTrue(counts)
+        self.assertTrue(all(counts))
+        self.assertGreater(max(counts), 1)
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+from test.base import main
+from test.recognize_base import RecognizeTestCase, descendants, segments
+
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeProfile(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        TesserocrRecognize(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-OCR-TESS-FAST",
+            parameter={'segmentation_level': 'region',
+                       'textequiv_level': 'line',
+                       'profile': 'fast',
+                       # overrides the profile:
+                       'tesseract_variables': '{"tessedit_enable_bigram_correction": 1}'}
+        ).process()
+        for page in segments(workspace, "OCR-D-OCR-TESS-FAST", 'page'):
+            self.assertTrue(any(line.get_TextEquiv()[0].Unicode
+                                for line in descendants(page, 'line')))
+        with self.assertRaisesRegex(Exception, "unknown Tesseract variable"):
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp="OCR-D-OCR-TESS-BAD",
+                parameter={'segmentation_level': 'region',
+                           'tesseract_variables': '{"no_such_variable": 1}'}
+            ).process()
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
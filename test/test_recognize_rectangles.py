@@ -0,0 +1,30 @@
+from test.base import main
+from test.recognize_base import RecognizeTestCase, segment, segments
+
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeRectangles(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        segment(workspace, words=True)
+        results = []
+        for rectangles in [False, True]:
+            output_file_grp = "OCR-D-OCR-TESS-%s" % rectangles
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-WORD",
+                output_file_grp=output_file_grp,
+                parameter={'textequiv_level': 'glyph', 'rectangles': rectangles}
+            ).process()
+            words = []
+            for word in segments(workspace, output_file_grp):
+                self.assertTrue(word.get_Glyph())
+                words.append(word.id)
+            results.append(words)
+        self.assertTrue(results[0])
+        self.assertEqual(results[0], results[1])
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+import json
+
+from tesserocr import get_languages
+
+from test.base import main
+from test.recognize_base import RecognizeTestCase, WORKSPACE_DIR, segment, segments
+
+from ocrd_modelfactory import page_from_file
+from ocrd_models.ocrd_page import to_xml
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeRouting(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        segment(workspace)
+        # annotate the script (like ocrd-tesserocr-deskew would):
+        for input_file in workspace.mets.find_files(fileGrp="OCR-D-SEG-LINE"):
+            pcgts = page_from_file(workspace.download_file(input_file))
+            for region in pcgts.get_Page().get_TextRegion():
+                region.set_primaryScript("Latn - Latin")
+            with open(input_file.local_filename, 'w') as f:
+                f.write(to_xml(pcgts))
+        # route to a different model if one is installed:
+        _, models = get_languages()
+        routed = next((model for model in sorted(models)
+                       if model not in ['eng', 'osd', 'equ']), 'eng')
+        results = []
+        counts = []
+        # no routing, routing all lines away from the default model:
+        for n, parameter in enumerate([{'model': 'eng'},
+                                       {'model': 'eng', 'model_routing': json.dumps({"Latn": routed})}]):
+            output_file_grp = "OCR-D-OCR-TESS-%d" % n
+            metrics = os.path.join(WORKSPACE_DIR, output_file_grp + '.metrics.json')
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-LINE",
+                output_file_grp=output_file_grp,
+                parameter=dict(parameter, textequiv_level='line', metrics=metrics)
+            ).process()
+            with open(metrics, 'r') as f:
+                records = [json.loads(line) for line in f]
+            counts.append([sum(record['counts'].get(name, 0) for record in records)
+                           for name in ['lines', 'routed']])
+            results.append([(line.id, line.get_TextEquiv()[0].Unicode)
+                            for line in segments(workspace, output_file_grp, 'line')])
+        self.assertTrue(results[0])
+        self.assertEqual(counts[0][1], 0)
+        # every line really ran on the routed model:
+        self.assertGreater(counts[1][0], 0)
+        self.assertEqual(counts[1][0], counts[1][1])
+        self.assertEqual([line_id for line_id, _ in results[0]],
+                         [line_id for line_id, _ in results[1]])
+        if routed == 'eng':
+            # (the same model gives the same result)
+            self.assertEqual(results[0], results[1])
+        with self.assertRaisesRegex(Exception, "not installed"):
+            TesserocrRecognize(
+                workspace,
+                input_file_grp="OCR-D-SEG-LINE",
+                output_file_grp="OCR-D-OCR-TESS-FAIL",
+                parameter={'model_routing': '{"Latn": "nonexistent"}'}
+            ).process()
+        workspace.save_mets()
+
+if __name__ == '__main__':
+    main()
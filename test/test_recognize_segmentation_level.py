@@ -0,0 +1,28 @@
+from test.base import main
+from test.recognize_base import RecognizeTestCase, descendants, segments
+
+from ocrd_tesserocr import TesserocrRecognize
+
+class TestTesserocrRecognizeSegmentationLevel(RecognizeTestCase):
+
+    def runTest(self):
+        workspace = self.workspace
+        TesserocrRecognize(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-OCR-TESS",
+            parameter={'segmentation_level': 'region', 'textequiv_level': 'glyph'}
+        ).process()
+        workspace.save_mets()
+        for page in segments(workspace, "OCR-D-OCR-TESS", 'page'):
+            self.assertTrue(page.get_ReadingOrder())
+            for line in descendants(page, 'line'):
+                self.assertTrue(line.get_TextEquiv())
+            words = descendants(page, 'word')
+            self.assertTrue(words)
+            for word in words:
+                self.assertTrue(word.get_TextEquiv())
+                self.assertTrue(word.get_Glyph())
+
+if __name__ == '__main__':
+    main()
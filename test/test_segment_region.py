@@ -1,12 +1,21 @@
 import os
+import json
 import shutil
 
+from PIL import Image
+
 from test.base import TestCase, main, assets
 
+from tesserocr import PT
+
 from ocrd.resolver import Resolver
-from ocrd_tesserocr import TesserocrSegmentRegion
+from ocrd_utils import bbox_from_points
+from ocrd_modelfactory import page_from_file
+from ocrd_tesserocr import TesserocrCrop, TesserocrSegmentRegion
+from ocrd_tesserocr.segment_region import tile_offsets, merge_tile_blocks, sort_blocks
 
 METS_HEROLD_SMALL = assets.url_of('SBB0000F29300010000/data/mets_one_file.xml')
+METS_KANT = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
 
 WORKSPACE_DIR = '/tmp/pyocrd-test-segment-region-tesserocr'
 
@@ -27,5 +36,315 @@ class TestTesserocrSegmentRegionTesseract(TestCase):
         ).process()
         workspace.save_mets()
 
+class TestTesserocrSegmentRegionJobs(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        results = []
+        # serial without and with prefetching, and parallel:
+        for n, parameter in enumerate([{'prefetch': 0}, {'prefetch': 2}, {'jobs': 2}]):
+            output_file_grp = "OCR-D-SEG-BLOCK-%d" % n
+            TesserocrSegmentRegion(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp=output_file_grp,
+                parameter=parameter
+            ).process()
+            regions = []
+            for output_file in workspace.mets.find_files(fileGrp=output_file_grp):
+                page = page_from_file(workspace.download_file(output_file)).get_Page()
+                regions.append((output_file.pageId,
+                                [(region.id, region.get_Coords().points)
+                                 for region in page.get_TextRegion()]))
+            results.append(regions)
+        self.assertEqual(len(results[0]), 2)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        workspace.save_mets()
+
+class TestTesserocrSegmentRegionIncremental(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        def run(parameter):
+            TesserocrSegmentRegion(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp="OCR-D-SEG-BLOCK",
+                parameter=dict(parameter, incremental=True)
+            ).process()
+            workspace.save_mets()
+            return dict((output_file.ID, os.stat(output_file.local_filename).st_mtime_ns)
+                        for output_file in workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK"))
+        first = run({})
+        self.assertEqual(len(first), 2)
+        # nothing changed, so nothing gets reprocessed:
+        self.assertEqual(run({'jobs': 2}), first)
+        # changed parameters replace all outputs:
+        third = run({'padding': 5})
+        self.assertEqual(set(third), set(first))
+        for file_id in first:
+            self.assertNotEqual(third[file_id], first[file_id])
+
+class TestTesserocrSegmentRegionIncrementalImages(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        TesserocrCrop(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-CROP,OCR-D-IMG-CROP"
+        ).process()
+        workspace.save_mets()
+        def run():
+            TesserocrSegmentRegion(
+                workspace,
+                input_file_grp="OCR-D-CROP",
+                output_file_grp="OCR-D-SEG-BLOCK",
+                parameter={'incremental': True}
+            ).process()
+            workspace.save_mets()
+            return dict((output_file.ID, os.stat(output_file.local_filename).st_mtime_ns)
+                        for output_file in workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK"))
+        first = run()
+        self.assertEqual(len(first), 2)
+        self.assertEqual(run(), first)
+        # a changed AlternativeImage of the input PAGE replaces the output of its page only:
+        input_file = list(workspace.mets.find_files(fileGrp="OCR-D-CROP"))[0]
+        page = page_from_file(workspace.download_file(input_file)).get_Page()
+        path = os.path.join(WORKSPACE_DIR, page.get_AlternativeImage()[-1].get_filename())
+        Image.open(path).transpose(Image.ROTATE_180).save(path)
+        third = run()
+        self.assertEqual(set(third), set(first))
+        self.assertEqual(sum(third[file_id] != first[file_id] for file_id in first), 1)
+
+class TestTesserocrSegmentRegionCheckpoint(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        parameter = {'incremental': True, 'checkpoint_pages': 1}
+        TesserocrSegmentRegion(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-SEG-BLOCK",
+            parameter=parameter
+        ).process()
+        # the METS has been saved without calling save_mets:
+        workspace = resolver.workspace_from_url(os.path.join(WORKSPACE_DIR, 'mets.xml'))
+        output_files = list(workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK"))
+        self.assertEqual(len(output_files), 2)
+        mtimes = dict((output_file.ID, os.stat(output_file.local_filename).st_mtime_ns)
+                      for output_file in output_files)
+        # simulate a crash before the METS reference to the last page was saved:
+        workspace.remove_file(output_files[-1].ID, keep_file=True)
+        workspace.save_mets()
+        # resuming adopts the file instead of processing the page again:
+        TesserocrSegmentRegion(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-SEG-BLOCK",
+            parameter=parameter
+        ).process()
+        self.assertEqual(dict((output_file.ID, os.stat(output_file.local_filename).st_mtime_ns)
+                              for output_file in workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK")),
+                         mtimes)
+
+class TestTesserocrSegmentRegionSupervised(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        def run(output_file_grp, parameter):
+            TesserocrSegmentRegion(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp=output_file_grp,
+                parameter=parameter
+            ).process()
+            return [len(page_from_file(workspace.download_file(output_file)).get_Page().get_TextRegion())
+                    for output_file in workspace.mets.find_files(fileGrp=output_file_grp)]
+        # within budget:
+        regions = run("OCR-D-SEG-BLOCK-OK", {'page_timeout': 600, 'page_memory': 4096, 'jobs': 2})
+        self.assertEqual(len(regions), 2)
+        self.assertTrue(all(regions))
+        # over budget even when retrying: pages get passed through unchanged
+        regions = run("OCR-D-SEG-BLOCK-FAIL", {'page_timeout': 0.001,
+                                               'page_retry_parameters': '{"find_tables": false}'})
+        self.assertEqual(regions, [0, 0])
+        workspace.save_mets()
+
+class TestTesserocrSegmentRegionMetrics(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        metrics = os.path.join(WORKSPACE_DIR, 'metrics.jsonl')
+        textfile = os.path.join(WORKSPACE_DIR, 'metrics.prom')
+        for n, parameter in enumerate([{}, {'jobs': 2}]):
+            TesserocrSegmentRegion(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp="OCR-D-SEG-BLOCK-%d" % n,
+                parameter=dict(parameter, metrics=metrics, metrics_textfile=textfile)
+            ).process()
+        with open(metrics, 'r') as f:
+            records = [json.loads(line) for line in f]
+        # one record per page and run (also from worker processes):
+        self.assertEqual(len(records), 4)
+        for record in records:
+            self.assertEqual(record['processor'], 'ocrd-tesserocr-segment-region')
+            self.assertIn('AnalyseLayout', record['stages'])
+            self.assertGreater(record['stages']['AnalyseLayout']['wall'], 0)
+            self.assertGreater(record['counts']['regions'], 0)
+            self.assertGreater(record['peak_rss'], 0)
+        with open(textfile, 'r') as f:
+            prometheus = f.read()
+        self.assertIn('ocrd_tesserocr_pages_total{processor="ocrd-tesserocr-segment-region"} 2', prometheus)
+        self.assertIn('stage="AnalyseLayout"', prometheus)
+        workspace.save_mets()
+
+class TestTesserocrSegmentRegionTiles(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        self.assertEqual(tile_offsets(900, 1000, 200), [0])
+        offsets = tile_offsets(2500, 1000, 200)
+        self.assertEqual(offsets[0], 0)
+        self.assertEqual(offsets[-1], 1500)
+        self.assertTrue(all(start + 1000 - 200 >= end for start, end in zip(offsets, offsets[1:])))
+        # a block cut at the seam of two tiles, and a separator seen by both:
+        tiles = [(0, 0, 1000, 1000), (800, 0, 1800, 1000)]
+        merged = merge_tile_blocks(tiles, [
+            [(PT.FLOWING_TEXT, (100, 100, 1000, 300), None),
+             (PT.HORZ_LINE, (100, 400, 1000, 410), None)],
+            [(PT.FLOWING_TEXT, (800, 100, 1200, 300), None),
+             (PT.HEADING_TEXT, (1300, 100, 1700, 150), None),
+             (PT.HORZ_LINE, (800, 400, 1700, 410), None)]])
+        self.assertEqual(merged, [(PT.FLOWING_TEXT, (100, 100, 1200, 300), None),
+                                  (PT.HORZ_LINE, (100, 400, 1700, 410), None),
+                                  (PT.HEADING_TEXT, (1300, 100, 1700, 150), None)])
+        # polygons get merged into their convex hull:
+        merged = merge_tile_blocks(tiles, [
+            [(PT.FLOWING_TEXT, (100, 100, 1000, 300),
+              [(100, 100), (1000, 100), (1000, 300), (100, 300)])],
+            [(PT.FLOWING_TEXT, (800, 100, 1200, 300),
+              [(800, 100), (1200, 100), (1200, 300), (800, 300)])]])
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0][1], (100, 100, 1200, 300))
+        self.assertEqual(set(merged[0][2]), {(100, 100), (1200, 100), (1200, 300), (100, 300)})
+        # two columns in one tile do not get joined via a block spanning both in the other:
+        merged = merge_tile_blocks(tiles, [
+            [(PT.FLOWING_TEXT, (100, 500, 880, 700), None),
+             (PT.FLOWING_TEXT, (920, 500, 1000, 700), None)],
+            [(PT.FLOWING_TEXT, (800, 500, 1700, 700), None)]])
+        self.assertEqual(len(merged), 3)
+        # two columns (under a heading, above a footer) cut by a horizontal seam
+        # get read column by column, not tile by tile:
+        tiles = [(0, 0, 1000, 1000), (0, 800, 1000, 1800)]
+        heading = (PT.HEADING_TEXT, (100, 20, 900, 80), None)
+        footer = (PT.FLOWING_TEXT, (100, 1750, 900, 1790), None)
+        merged = merge_tile_blocks(tiles, [
+            [heading,
+             (PT.FLOWING_TEXT, (100, 100, 450, 500), None),
+             (PT.FLOWING_TEXT, (550, 100, 900, 500), None),
+             (PT.FLOWING_TEXT, (100, 600, 450, 1000), None)],
+            [(PT.FLOWING_TEXT, (100, 800, 450, 1050), None),
+             (PT.FLOWING_TEXT, (100, 1100, 450, 1700), None),
+             (PT.FLOWING_TEXT, (550, 1100, 900, 1700), None),
+             footer]])
+        self.assertEqual([bbox for _, bbox, _ in sort_blocks(merged)],
+                         [heading[1],
+                          (100, 100, 450, 500), (100, 600, 450, 1050), (100, 1100, 450, 1700),
+                          (550, 100, 900, 500), (550, 1100, 900, 1700),
+                          footer[1]])
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        results = []
+        for n, parameter in enumerate([{'tile_size': 1000, 'tile_overlap': 300},
+                                       {'tile_size': 1000, 'tile_overlap': 300, 'threads': 3}]):
+            output_file_grp = "OCR-D-SEG-BLOCK-%d" % n
+            TesserocrSegmentRegion(
+                workspace,
+                input_file_grp="OCR-D-IMG",
+                output_file_grp=output_file_grp,
+                parameter=parameter
+            ).process()
+            regions = []
+            for output_file in workspace.mets.find_files(fileGrp=output_file_grp):
+                page = page_from_file(workspace.download_file(output_file)).get_Page()
+                regions.append([(region.id, region.get_Coords().points)
+                                for region in page.get_TextRegion()])
+                refs = [ref.regionRef for ref in page.get_ReadingOrder().get_OrderedGroup().get_RegionRefIndexed()]
+                self.assertEqual(len(refs), len(set(refs)))
+            results.append(regions)
+        self.assertTrue(all(results[0]))
+        # concurrency does not change the result:
+        self.assertEqual(results[0], results[1])
+        workspace.save_mets()
+
+class TestTesserocrSegmentRegionAnalysisDpi(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_KANT, dst_dir=WORKSPACE_DIR)
+        TesserocrSegmentRegion(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-SEG-BLOCK",
+            parameter={'dpi': 300, 'analysis_dpi': 100}
+        ).process()
+        for output_file in workspace.mets.find_files(fileGrp="OCR-D-SEG-BLOCK"):
+            pcgts = page_from_file(workspace.download_file(output_file))
+            page = pcgts.get_Page()
+            regions = page.get_TextRegion()
+            self.assertTrue(regions)
+            # coordinates are at full resolution again:
+            self.assertGreater(max(bbox_from_points(region.get_Coords().points)[2] for region in regions),
+                               page.get_imageWidth() / 2)
+        workspace.save_mets()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import threading
+
+from test.base import TestCase, main, assets
+
+from ocrd.resolver import Resolver
+from ocrd_tesserocr import TesserocrSegmentRegion
+from ocrd_tesserocr import TesserocrSegmentLine
+from ocrd_tesserocr.server import RecognizeServer, submit
+
+METS_HEROLD_SMALL = assets.url_of('kant_aufklaerung_1784-binarized/data/mets.xml')
+
+WORKSPACE_DIR = '/tmp/pyocrd-test-recognize-server'
+SOCKET_PATH = '/tmp/pyocrd-test-recognize-server.sock'
+
+class TestTesserocrRecognizeServer(TestCase):
+
+    def setUp(self):
+        if os.path.exists(WORKSPACE_DIR):
+            shutil.rmtree(WORKSPACE_DIR)
+        os.makedirs(WORKSPACE_DIR)
+
+    def runTest(self):
+        resolver = Resolver()
+        workspace = resolver.workspace_from_url(METS_HEROLD_SMALL, dst_dir=WORKSPACE_DIR)
+        TesserocrSegmentRegion(
+            workspace,
+            input_file_grp="OCR-D-IMG",
+            output_file_grp="OCR-D-SEG-BLOCK"
+        ).process()
+        TesserocrSegmentLine(
+            workspace,
+            input_file_grp="OCR-D-SEG-BLOCK",
+            output_file_grp="OCR-D-SEG-LINE"
+        ).process()
+        workspace.save_mets()
+        mets = os.path.join(WORKSPACE_DIR, 'mets.xml')
+
+        server = RecognizeServer(SOCKET_PATH)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            for output_file_grp in ["OCR-D-OCR-TESS-1", "OCR-D-OCR-TESS-2"]:
+                submit(SOCKET_PATH,
+                       mets=mets,
+                       input_file_grp="OCR-D-SEG-LINE",
+                       output_file_grp=output_file_grp,
+                       parameter={'textequiv_level': 'line'})
+            # the same configuration must not be loaded twice:
+            self.assertEqual(len(server.api_cache), 1)
+            # existing output fileGrp must be refused:
+            with self.assertRaisesRegex(Exception, 'Invalid input/output file grps'):
+                submit(SOCKET_PATH,
+                       mets=mets,
+                       input_file_grp="OCR-D-SEG-LINE",
+                       output_file_grp="OCR-D-OCR-TESS-1")
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+        workspace = resolver.workspace_from_url(mets)
+        self.assertTrue(list(workspace.mets.find_files(fileGrp="OCR-D-OCR-TESS-2")))
+
+if __name__ == '__main__':
+    main()